@@ -3,31 +3,50 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from loguru import logger
+from pathlib import Path
+import asyncio
 import os
-from backend.routers import auth, session, message, file, tool
-from backend.database import init_db
+from backend.routers import auth, session, message, file, tool, metrics
+from backend.database import init_db, close_pool
+from backend.http_client import open_http_client, close_http_client
+from backend.configs.config import config
+from backend.log import configure_logging, RequestContextMiddleware
+from backend.core.tools.search_tool import shutdown_search_pool
+from backend.passwords import shutdown_password_hasher
+from backend.turn_writer import get_turn_writer
+from backend.loop_monitor import get_loop_monitor
+from backend.core.files import shutdown_file_index
+from backend.core.agents.chat_agent import ChatAgent
+from backend.core.agents.context_window import warm_tokenizer
 
 
 log_path = os.path.join(os.path.dirname(__file__), "logs")
-os.makedirs(log_path, exist_ok=True)
-logger.add(
-    os.path.join(log_path, "api.log"),
-    rotation="50 MB",  # Rotate when file reaches 50MB
-    retention="7 days",  # Keep logs for 7 days
-    level="DEBUG",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}",
-    encoding="utf-8"
-)
+# LOG_LEVEL takes per-module overrides, e.g. "INFO,backend.core.tools=DEBUG"
+configure_logging(config.log_level, Path(log_path))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    get_loop_monitor().start()
     logger.info("Initializing database...")
     await init_db()
     logger.info("Database initialized")
+    await open_http_client()
+    get_turn_writer().start()
+    ChatAgent().sessions.start()
+    # Building the tokenizer takes ~200ms of CPU; do it off the loop before serving
+    await asyncio.to_thread(warm_tokenizer, config.llm.model_name)
     yield
     # Shutdown
     logger.info("Shutting down...")
+    await ChatAgent().sessions.stop()
+    await get_turn_writer().stop()
+    shutdown_search_pool()
+    shutdown_password_hasher()
+    shutdown_file_index()
+    await close_http_client()
+    await close_pool()
+    await get_loop_monitor().stop()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -42,6 +61,7 @@ app.add_middleware(
     expose_headers=["*"],
     max_age=3600,
 )
+app.add_middleware(RequestContextMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
@@ -50,6 +70,7 @@ app.include_router(auth.router, prefix="/api/auth")
 app.include_router(session.router, prefix="/api/sessions")
 app.include_router(message.router, prefix="/api/messages", tags=["messages"])
 app.include_router(file.router, prefix="/api/files")
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
 
 if __name__ == "__main__":
@@ -15,7 +15,134 @@ class LLMConfig:
     api_key: str = os.getenv("OPENAI_API_KEY", "")
     max_tokens: Optional[int] = int(os.getenv("LLM_MAX_TOKENS", "2000")) if os.getenv("LLM_MAX_TOKENS") else None
     timeout: int = int(os.getenv("LLM_TIMEOUT", "60"))
+    # Split out of the overall timeout: connection setup fails fast, reads may take longer
+    connect_timeout: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    read_timeout: float = float(os.getenv("LLM_READ_TIMEOUT", os.getenv("LLM_TIMEOUT", "60")))
     retry_attempts: int = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+    retry_base_delay: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    retry_max_delay: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    retry_budget_ratio: float = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+    retry_budget_min: int = int(os.getenv("LLM_RETRY_BUDGET_MIN", "10"))
+    context_budget_tokens: int = int(os.getenv("LLM_CONTEXT_BUDGET_TOKENS", "6000"))
+    context_summary_ratio: float = float(os.getenv("LLM_CONTEXT_SUMMARY_RATIO", "0.75"))
+    max_tool_steps: int = int(os.getenv("LLM_MAX_TOOL_STEPS", "3"))
+    # Deployments to route between: JSON list of {"model", "weight", "api_base", "api_key",
+    # "max_concurrency"} objects, or "model=weight,model=weight". Empty uses model_name alone.
+    deployments: str = os.getenv("LLM_DEPLOYMENTS", "")
+    max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    first_token_timeout: float = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "20"))
+    ttft_ewma_alpha: float = float(os.getenv("LLM_TTFT_EWMA_ALPHA", "0.2"))
+    breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    breaker_cooldown: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+@dataclass
+class SessionConfig:
+    """Configuration for the in-memory chat session store"""
+    max_sessions: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    max_bytes: int = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+    idle_ttl: int = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+    # How often idle sessions are expired when no request touches the store
+    sweep_interval: float = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+    spill_to_disk: bool = os.getenv("SESSION_SPILL_TO_DISK", "False").lower() == "true"
+    spill_ttl: int = int(os.getenv("SESSION_SPILL_TTL", "86400"))
+
+@dataclass
+class ToolConfig:
+    """Configuration for tool execution"""
+    max_concurrency: int = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+    timeout: float = float(os.getenv("TOOL_TIMEOUT", "20"))
+    search_workers: int = int(os.getenv("TOOL_SEARCH_WORKERS", "4"))
+    block_threshold_ms: float = float(os.getenv("TOOL_BLOCK_THRESHOLD_MS", "100"))
+    cache_ttl: float = float(os.getenv("TOOL_CACHE_TTL", "600"))
+    cache_max_entries: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+    cache_persist: bool = os.getenv("TOOL_CACHE_PERSIST", "False").lower() == "true"
+
+@dataclass
+class ResponseCacheConfig:
+    """Configuration for the opt-in LLM response cache"""
+    enabled: bool = os.getenv("LLM_CACHE_ENABLED", "False").lower() == "true"
+    max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+    ttl: float = float(os.getenv("LLM_CACHE_TTL", "3600"))
+    semantic: bool = os.getenv("LLM_CACHE_SEMANTIC", "False").lower() == "true"
+    similarity_threshold: float = float(os.getenv("LLM_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+    embedding_model: str = os.getenv("LLM_CACHE_EMBEDDING_MODEL", "")
+    replay_chunk_chars: int = int(os.getenv("LLM_CACHE_REPLAY_CHUNK_CHARS", "16"))
+
+@dataclass
+class SSEConfig:
+    """Configuration for server-sent event streams"""
+    flush_interval_ms: float = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "50"))
+    flush_bytes: int = int(os.getenv("SSE_FLUSH_BYTES", "512"))
+    heartbeat_interval: float = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+    disconnect_poll_interval: float = float(os.getenv("SSE_DISCONNECT_POLL_INTERVAL", "0.5"))
+    queue_size: int = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+
+@dataclass
+class DatabaseConfig:
+    """Configuration for the SQLite connection pool"""
+    readers: int = int(os.getenv("DB_POOL_READERS", "4"))
+    acquire_timeout: float = float(os.getenv("DB_ACQUIRE_TIMEOUT", "5"))
+    busy_timeout_ms: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    cache_size_kb: int = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+    mmap_size: int = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+    statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+@dataclass
+class AuthConfig:
+    """Configuration for password hashing"""
+    bcrypt_rounds: int = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+    hash_workers: int = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+    hash_queue_size: int = int(os.getenv("AUTH_HASH_QUEUE_SIZE", "32"))
+    retry_after: int = int(os.getenv("AUTH_RETRY_AFTER", "1"))
+
+@dataclass
+class PersistenceConfig:
+    """Configuration for the write-behind queue of chat turns"""
+    batch_size: int = int(os.getenv("PERSIST_BATCH_SIZE", "64"))
+    flush_interval: float = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.5"))
+    max_queue: int = int(os.getenv("PERSIST_MAX_QUEUE", "10000"))
+    max_retries: int = int(os.getenv("PERSIST_MAX_RETRIES", "3"))
+    drain_timeout: float = float(os.getenv("PERSIST_DRAIN_TIMEOUT", "10"))
+
+@dataclass
+class FileConfig:
+    """Configuration for file uploads and ingestion"""
+    upload_dir: str = os.getenv("UPLOAD_DIR", "uploads")
+    max_upload_bytes: int = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+    chunk_size: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    index_dir: str = os.getenv("FILE_INDEX_DIR", "file_index")
+    ingest_workers: int = int(os.getenv("FILE_INGEST_WORKERS", "2"))
+    chunk_chars: int = int(os.getenv("FILE_CHUNK_CHARS", "1200"))
+    chunk_overlap: int = int(os.getenv("FILE_CHUNK_OVERLAP", "200"))
+    max_chunks: int = int(os.getenv("FILE_MAX_CHUNKS", "5000"))
+    embedding_model: str = os.getenv("FILE_EMBEDDING_MODEL", "")
+    embed_batch_size: int = int(os.getenv("FILE_EMBED_BATCH_SIZE", "64"))
+    index_segment_capacity: int = int(os.getenv("FILE_INDEX_SEGMENT_CAPACITY", "4096"))
+    index_compact_threshold: float = float(os.getenv("FILE_INDEX_COMPACT_THRESHOLD", "0.3"))
+    rrf_k: int = int(os.getenv("FILE_SEARCH_RRF_K", "60"))
+    search_candidates: int = int(os.getenv("FILE_SEARCH_CANDIDATES", "50"))
+    bm25_k1: float = float(os.getenv("FILE_SEARCH_BM25_K1", "1.2"))
+    bm25_b: float = float(os.getenv("FILE_SEARCH_BM25_B", "0.75"))
+
+@dataclass
+class HTTPConfig:
+    """Configuration for the shared outbound HTTP client"""
+    max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    http2: bool = os.getenv("HTTP_HTTP2", "True").lower() == "true"
+    write_timeout: float = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+    pool_timeout: float = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+
+@dataclass
+class LoopMonitorConfig:
+    """Configuration for the event-loop lag monitor"""
+    enabled: bool = os.getenv("LOOP_MONITOR_ENABLED", "True").lower() == "true"
+    interval: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))
+    threshold: float = float(os.getenv("LOOP_MONITOR_THRESHOLD", "0.1"))
+    # Capturing stacks of blocking code; defaults to on in debug mode
+    capture_stacks: bool = os.getenv("LOOP_MONITOR_STACKS", os.getenv("APP_DEBUG", "False")).lower() == "true"
+    max_sites: int = int(os.getenv("LOOP_MONITOR_MAX_SITES", "50"))
 
 @dataclass
 class AppConfig:
@@ -27,6 +154,36 @@ class AppConfig:
     # LLM Configuration
     llm: LLMConfig = field(default_factory=LLMConfig)
 
+    # Session store configuration
+    session: SessionConfig = field(default_factory=SessionConfig)
+
+    # Tool execution configuration
+    tools: ToolConfig = field(default_factory=ToolConfig)
+
+    # LLM response cache configuration
+    response_cache: ResponseCacheConfig = field(default_factory=ResponseCacheConfig)
+
+    # Server-sent events configuration
+    sse: SSEConfig = field(default_factory=SSEConfig)
+
+    # Database connection pool configuration
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
+
+    # Password hashing configuration
+    auth: AuthConfig = field(default_factory=AuthConfig)
+
+    # Chat history persistence configuration
+    persistence: PersistenceConfig = field(default_factory=PersistenceConfig)
+
+    # File upload configuration
+    files: FileConfig = field(default_factory=FileConfig)
+
+    # Outbound HTTP client configuration
+    http: HTTPConfig = field(default_factory=HTTPConfig)
+
+    # Event-loop lag monitoring
+    loop_monitor: LoopMonitorConfig = field(default_factory=LoopMonitorConfig)
+
     def __post_init__(self):
         """Validate configuration after initialization"""
         if not self.llm.api_key:
@@ -39,4 +196,4 @@ class AppConfig:
 config = AppConfig()
 
 # Export the configuration
-__all__ = ["config", "AppConfig", "LLMConfig"]
+__all__ = ["config", "AppConfig", "LLMConfig", "SessionConfig", "ToolConfig", "ResponseCacheConfig", "SSEConfig", "DatabaseConfig", "AuthConfig", "PersistenceConfig", "FileConfig", "HTTPConfig", "LoopMonitorConfig"]
@@ -59,6 +59,26 @@ Always be helpful, accurate, and concise in your responses."""
         }
     )
 
+    FILE_SEARCH_TOOL = ToolDescription(
+        name="search_files",
+        description="Search the files the user has uploaded to this conversation. Use this tool when the question may be answered by the user's own documents. Matches both meaning and exact terms such as names, error codes or IDs.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What to look for in the uploaded files"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of passages to return",
+                    "default": 5
+                }
+            },
+            "required": ["query"]
+        }
+    )
+
     # Role-specific prompts
     ROLE_PROMPTS = {
         AgentRole.ASSISTANT: """You are a helpful AI assistant. Your goal is to provide accurate and useful information to users.
@@ -102,7 +122,7 @@ Consider all necessary steps and potential challenges."""
         if include_tools:
             tools_description = "\n".join([
                 f"- {tool.name}: {tool.description}"
-                for tool in [cls.SEARCH_TOOL]  # Add more tools here as needed
+                for tool in [cls.SEARCH_TOOL, cls.FILE_SEARCH_TOOL]  # Add more tools here as needed
             ])
             return cls.SYSTEM_WITH_TOOLS.format(
                 model_name=model_name,
@@ -126,7 +146,7 @@ Consider all necessary steps and potential challenges."""
     @classmethod
     def get_tool_descriptions(cls) -> List[ToolDescription]:
         """Get all available tool descriptions"""
-        return [cls.SEARCH_TOOL]  # Add more tools here as needed
+        return [cls.SEARCH_TOOL, cls.FILE_SEARCH_TOOL]  # Add more tools here as needed
 
 class PromptManager:
     """Manager class for handling prompts in the application"""
@@ -1,24 +1,30 @@
-from typing import List, Dict, Any, AsyncGenerator, Optional
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple
 from uuid import uuid4
 from datetime import datetime
 from loguru import logger
-from ..generator.llm import LLMInstance
-from ...configs.config import LLMConfig
+from ..generator.llm import LLMInstance, StreamStats
+from ..generator.response_cache import get_response_cache
+from ...configs.config import LLMConfig, config as app_config
 from ...configs.prompt import PromptManager, AgentRole
-from ..tools.tool_registry import ToolRegistry
+from ..tools.tool_registry import ToolRegistry, ToolResult
 from ..tools import initialize_tools
-from ...types import Message, ToolCall
+from ..session import SessionState, create_session_store
+from .context_window import ContextWindow
+from .trace import AgentStep, TurnTrace
+from ..events import AgentEvent, TextDelta, ToolCallEvent, ToolResultEvent, DoneEvent, ErrorEvent
+from ...types import ToolCall
+from ...turn_writer import TurnRecord, get_turn_writer
+from ...log import preview
+from ...metrics import CHAT_TURN_DURATION
+from ...tracing import start_span, end_span
 import threading
-import logging
 import json
+import time
 
-logger = logging.getLogger(__name__)
 
 class ChatAgent:
     _instance = None
     _lock = threading.Lock()
-    _sessions: Dict[str, LLMInstance] = {}
-    _message_history: Dict[str, List[Dict[str, str]]] = {}
     
     def __new__(cls):
         if cls._instance is None:
@@ -30,15 +36,14 @@ class ChatAgent:
     def __init__(self):
         if not hasattr(self, 'initialized'):
             self.initialized = True
-            self.tool_registry = ToolRegistry()
+            self.tool_registry = ToolRegistry(app_config.tools)
             initialize_tools(self.tool_registry)
-            self.messages = []
-            self.tool_calls = []
-            self.session_id = None
             self.llm = LLMInstance(LLMConfig())
+            self.sessions = create_session_store(app_config.session)
             self.prompt_manager = PromptManager(self.llm.config.model_name)
+            self.context = ContextWindow(self.llm.config, self.prompt_manager)
     
-    def get_session(self, session_id: str, config: Optional[LLMConfig] = None) -> LLMInstance:
+    async def get_session(self, session_id: str, config: Optional[LLMConfig] = None) -> LLMInstance:
         """
         Get or create an LLM instance for a specific session
         
@@ -49,219 +54,333 @@ class ChatAgent:
         Returns:
             LLMInstance: The LLM instance for the session
         """
-        if session_id not in self._sessions:
-            with self._lock:
-                if session_id not in self._sessions:
-                    if config is None:
-                        config = LLMConfig()
-                    self._sessions[session_id] = LLMInstance(config)
-                    self._message_history[session_id] = []
-        return self._sessions[session_id]
+        state = await self._get_state(session_id, config)
+        return state.llm
+
+    async def _get_state(self, session_id: str, config: Optional[LLMConfig] = None, pin: bool = False) -> SessionState:
+        """Get the session state from the store, rehydrating or creating it as needed"""
+        def create() -> SessionState:
+            return SessionState(session_id=session_id, llm=LLMInstance(config if config is not None else LLMConfig()))
+
+        return await self.sessions.get_or_create(session_id, create, pin=pin)
     
-    def remove_session(self, session_id: str):
+    async def remove_session(self, session_id: str):
         """Remove a session and its associated LLM instance"""
-        with self._lock:
-            if session_id in self._sessions:
-                del self._sessions[session_id]
-            if session_id in self._message_history:
-                del self._message_history[session_id]
+        await self.sessions.remove(session_id)
     
-    def update_session_config(self, session_id: str, config: LLMConfig):
+    async def update_session_config(self, session_id: str, config: LLMConfig):
         """Update the configuration for an existing session"""
-        if session_id in self._sessions:
-            with self._lock:
-                if session_id in self._sessions:
-                    self._sessions[session_id] = LLMInstance(config)
+        state = await self.sessions.get(session_id)
+        if state is not None:
+            state.llm = LLMInstance(config)
     
-    def add_message(self, session_id: str, message: Dict[str, str]):
+    async def add_message(self, session_id: str, message: Dict[str, str]):
         """Add a message to the session's history"""
-        if session_id in self._message_history:
-            self._message_history[session_id].append(message)
+        state = await self.sessions.get(session_id)
+        if state is not None:
+            await self._append_messages(state, [message])
+
+    async def _append_messages(self, state: SessionState, messages: List[Dict[str, str]]):
+        """Append messages to a session's history under the session lock"""
+        async with state.lock:
+            state.messages.extend(messages)
+        await self.sessions.update(state)
     
-    def get_messages(self, session_id: str) -> List[Dict[str, str]]:
+    async def get_messages(self, session_id: str) -> List[Dict[str, str]]:
         """Get the message history for a session"""
-        return self._message_history.get(session_id, [])
+        state = await self.sessions.get(session_id)
+        return list(state.messages) if state is not None else []
     
-    def clear_messages(self, session_id: str):
+    async def clear_messages(self, session_id: str):
         """Clear the message history for a session"""
-        if session_id in self._message_history:
-            self._message_history[session_id] = []
+        state = await self.sessions.get(session_id)
+        if state is not None:
+            async with state.lock:
+                state.messages = []
+                state.summary = ""
+                state.summarized_upto = 0
+            await self.sessions.update(state)
 
-    def _format_messages(self) -> List[Dict[str, str]]:
-        """Format messages for LLM input"""
-        formatted_messages = [
-            {"role": msg.role, "content": msg.content}
-            for msg in self.messages
+    def _tool_definitions(self) -> List[Dict[str, Any]]:
+        """Build the tool definitions advertised to the LLM"""
+        return [
+            {
+                "type": "function",
+                "function": {"name": tool.name, "description": tool.description, "parameters": tool.parameters}
+            }
+            for tool in self.prompt_manager.get_tool_descriptions()
         ]
-        logger.debug(f"Formatted messages for LLM: {formatted_messages}")
-        return formatted_messages
 
-    async def _handle_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[ToolCall]:
-        """Handle tool calls and store results"""
-        results = []
+    async def _handle_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        session_id: Optional[str] = None
+    ) -> Tuple[List[ToolCall], List[ToolResult]]:
+        """Run tool calls concurrently and store results"""
         logger.info(f"Processing {len(tool_calls)} tool calls")
+        outcomes = await self.tool_registry.run_tools(tool_calls, session_id=session_id)
         
-        for tool_call in tool_calls:
-            tool_name = tool_call["name"]
-            parameters = tool_call["parameters"]
-            logger.info(f"Processing tool call: {tool_name}")
-            logger.debug(f"Tool parameters: {json.dumps(parameters, indent=2)}")
-            
+        results = []
+        for outcome in outcomes:
             # Create tool call record
             tool_call_record = ToolCall(
                 id=uuid4(),
-                message_id=uuid4(),  # This should be linked to the message that triggered the tool call
-                tool_name=tool_name,
-                parameters=parameters,
+                message_id=uuid4(),  # Linked to the turn's assistant message once it exists
+                tool_name=outcome.tool_name,
+                parameters=outcome.parameters,
                 result=None,
                 status="pending",
                 created_at=datetime.utcnow()
             )
             
-            try:
-                # Execute tool
-                logger.info(f"Executing tool: {tool_name}")
-                result = await self.tool_registry.run_tool(tool_name, parameters)
-                tool_call_record.result = str(result)
+            if outcome.ok:
+                result = outcome.result
+                tool_call_record.result = result if isinstance(result, str) else json.dumps(result, default=str)
                 tool_call_record.status = "completed"
-                logger.info(f"Tool {tool_name} executed successfully")
-                logger.debug(f"Tool result: {json.dumps(result, indent=2)}")
-            except Exception as e:
-                logger.error(f"Tool call failed for {tool_name}: {str(e)}", exc_info=True)
-                tool_call_record.result = str(e)
+                logger.info(f"Tool {outcome.tool_name} executed successfully in {outcome.latency:.3f}s")
+            elif outcome.timed_out:
+                tool_call_record.result = f"Tool {outcome.tool_name} timed out"
+                tool_call_record.status = "timeout"
+            else:
+                logger.error(f"Tool call failed for {outcome.tool_name}: {str(outcome.error)}")
+                tool_call_record.result = str(outcome.error)
                 tool_call_record.status = "failed"
             
             results.append(tool_call_record)
         
         logger.info(f"Completed processing {len(results)} tool calls")
-        return results
+        return results, outcomes
 
-    async def chat(self, content: str, role: AgentRole = AgentRole.ASSISTANT, session_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+    async def chat(
+        self,
+        content: str,
+        role: AgentRole = AgentRole.ASSISTANT,
+        session_id: Optional[str] = None,
+        use_cache: bool = True,
+        user_id: str = ""
+    ) -> AsyncGenerator[AgentEvent, None]:
         """
-        Process a chat message and stream the response
+        Process a chat message and stream the response as typed events
         
         Args:
             content: The message content
             role: The role the agent should take (default: ASSISTANT)
-            session_id: Optional session ID to use a specific LLM instance
+            session_id: Optional session ID whose history and LLM instance are used
+            use_cache: Set to False to bypass the LLM response cache for this turn
+            user_id: Owner recorded on the session when its first turn is persisted
+            
+        Yields:
+            TextDelta, ToolCallEvent and ToolResultEvent events, then a DoneEvent, or an
+            ErrorEvent if the turn failed
         """
+        pinned: Optional[SessionState] = None
         try:
-            # Use session-specific LLM if session_id is provided
-            llm_instance = self.get_session(session_id) if session_id else self.llm
-            self.session_id = session_id
-
-            logger.info(f"Starting chat processing for session {self.session_id}")
-            logger.debug(f"Received content: {content}")
+            # Use session-specific state if session_id is provided, otherwise a throwaway one.
+            # The session stays in memory until the turn ends, so its updates cannot be lost
+            if session_id:
+                state = pinned = await self._get_state(session_id, pin=True)
+            else:
+                state = SessionState(session_id=str(uuid4()), llm=self.llm)
+            llm_instance = state.llm
 
-            # Add user message
-            user_message = Message(
-                id=uuid4(),
-                session_id=self.session_id,
-                role="user",
-                content=content,
-                created_at=datetime.utcnow(),
-                tool_calls=[]
-            )
-            self.messages.append(user_message)
-            logger.info(f"Added user message to history. Total messages: {len(self.messages)}")
+            logger.info("Starting chat processing for session {}", session_id)
+            logger.opt(lazy=True).debug("Received content: {}", lambda: preview(content))
 
-            # Get LLM response with streaming
-            logger.debug("Starting LLM streaming")
-            try:
-                # Get appropriate prompts
-                system_prompt = self.prompt_manager.get_chat_prompt(include_tools=True)
-                role_prompt = self.prompt_manager.get_role_prompt(role)
-                
-                # Combine prompts with explicit instruction to use search
-                combined_system_prompt = f"""{system_prompt}
+            # Get appropriate prompts
+            system_prompt = self.prompt_manager.get_chat_prompt(include_tools=True)
+            role_prompt = self.prompt_manager.get_role_prompt(role)
+            
+            # Combine prompts with explicit instruction to use search
+            combined_system_prompt = f"""{system_prompt}
 
 {role_prompt}
 
 IMPORTANT: For this specific query, you MUST use the search tool to find up-to-date information. Do not rely on your training data alone."""
+
+            user_record = {"id": uuid4(), "role": "user", "content": content, "created_at": datetime.utcnow()}
+            turn_tool_calls: List[ToolCall] = []
+
+            # Add user message and build the budgeted prompt this turn is based on
+            async with state.lock:
+                state.messages.append({"role": "user", "content": content})
+                messages = self.context.build(state, combined_system_prompt)
+            await self.sessions.update(state)
+            logger.debug("Added user message to history. Total messages: {}", len(state.messages))
+
+            # Run the agent loop: stream, execute requested tools, re-invoke with their results
+            logger.debug("Starting LLM streaming")
+            trace = TurnTrace(session_id=state.session_id)
+            state.last_trace = trace
+            turn_span = start_span("chat.turn", session_id=state.session_id, role=role.value)
+            turn_error: Optional[BaseException] = None
+            tools = self._tool_definitions()
+            max_steps = llm_instance.config.max_tool_steps
+            response_parts = []
+
+            # Whole turns are cached by their prompt, so a near-duplicate question in the same
+            # context gets the final answer without re-running the tool loop
+            cache = get_response_cache() if use_cache else None
+            cached = None
+            if cache is not None:
+                turn_params = {"agent_turn": llm_instance.config.model_name, "tools": tools}
+                cache_key = cache.make_key(turn_params, messages)
+                cache_scope = cache.make_scope(turn_params, messages)
+                cached = await cache.lookup(cache_key, cache_scope, content)
+            try:
+                logger.debug("Starting LLM chat with {} messages", len(messages))
+                logger.debug("System prompt: {} chars", len(combined_system_prompt))
                 
-                # Prepare messages
-                messages = [
-                    {"role": "system", "content": combined_system_prompt}
-                ] + self._format_messages()
-                
-                logger.info(f"Starting LLM chat with {len(messages)} messages")
-                logger.debug(f"System prompt: {combined_system_prompt}")
-                
-                async for chunk in llm_instance.stream_acomplete(
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=1000
-                ):
-                    # Check if the chunk contains a tool call
-                    if chunk.startswith("TOOL_CALL:"):
-                        try:
-                            logger.info("Detected tool call in LLM response")
-                            tool_data = json.loads(chunk[10:])
-                            tool_name = tool_data["name"]
-                            tool_args = tool_data["args"]
-                            
-                            logger.info(f"Executing tool: {tool_name}")
-                            logger.debug(f"Tool arguments: {json.dumps(tool_args, indent=2)}")
-                            
-                            # Execute the tool
-                            result = await self.tool_registry.run_tool(tool_name, tool_args)
-                            
-                            logger.info(f"Tool {tool_name} execution completed")
-                            logger.debug(f"Tool result: {json.dumps(result, indent=2)}")
-                            
-                            # Add tool result to messages
-                            messages.append({
-                                "role": "function",
-                                "name": tool_name,
-                                "content": json.dumps(result)
-                            })
-                            
-                            # Yield the tool result
-                            yield f"\nSearch results:\n{json.dumps(result, indent=2)}\n"
-                            
-                            # Continue the conversation with the search results
-                            continue
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Failed to parse tool call data: {str(e)}")
-                            logger.debug(f"Raw tool call data: {chunk}")
-                        except Exception as e:
-                            logger.error(f"Error executing tool: {str(e)}", exc_info=True)
+                for step_index in range(max_steps + 1):
+                    if cached is not None:
+                        logger.info("Answering turn from the response cache")
+                        async for chunk in cache.replay(cached):
+                            response_parts.append(chunk)
+                            yield TextDelta(chunk)
+                        break
+
+                    if step_index == max_steps:
+                        tool_choice = "none"  # Step limit reached, the model has to answer now
+                    elif step_index == 0:
+                        tool_choice = "required"  # Force the LLM to use search first, possibly several in parallel
                     else:
-                        logger.debug(f"Received chunk from LLM: {chunk}")
-                        yield chunk
+                        tool_choice = "auto"
+                    
+                    step = AgentStep(index=step_index)
+                    stats = StreamStats()
+                    step_parts = []
+                    tool_calls = []
+                    llm_span = start_span("llm.stream", parent=turn_span, step=step_index, tool_choice=tool_choice)
+                    try:
+                        async for chunk in llm_instance.stream_acomplete(
+                            messages=messages,
+                            stats=stats,
+                            tools=tools,
+                            tool_choice=tool_choice,
+                            use_cache=use_cache,
+                            temperature=0.7,
+                            max_tokens=1000
+                        ):
+                            # Collect tool calls until the stream has finished
+                            if isinstance(chunk, ToolCallEvent):
+                                if not chunk.id:
+                                    chunk.id = f"call_{uuid4().hex[:24]}"
+                                tool_calls.append(chunk)
+                            else:
+                                step_parts.append(chunk)
+                                yield TextDelta(chunk)
+                    except BaseException as e:
+                        end_span(llm_span, error=e if isinstance(e, Exception) else None)
+                        raise
+                    end_span(
+                        llm_span,
+                        time_to_first_token=stats.time_to_first_token,
+                        prompt_tokens=stats.prompt_tokens,
+                        completion_tokens=stats.completion_tokens,
+                        tool_calls=len(tool_calls)
+                    )
+                    step.record_stream(stats)
+                    trace.steps.append(step)
+                    response_parts.extend(step_parts)
+                    
+                    if not tool_calls:
+                        break
+                    
+                    logger.info(f"Step {step_index}: model requested {len(tool_calls)} tool call(s)")
+                    messages.append({
+                        "role": "assistant",
+                        "content": "".join(step_parts) or None,
+                        "tool_calls": [
+                            {
+                                "id": tool_call.id,
+                                "type": "function",
+                                "function": {"name": tool_call.name, "arguments": json.dumps(tool_call.args)}
+                            }
+                            for tool_call in tool_calls
+                        ]
+                    })
+                    for tool_call in tool_calls:
+                        yield tool_call
+                    
+                    # All calls of a step run concurrently, so the step costs the slowest call
+                    tool_started = time.perf_counter()
+                    tools_span = start_span("tools.run", parent=turn_span, step=step_index, tools=",".join(call.name for call in tool_calls))
+                    records, outcomes = await self._handle_tool_calls(
+                        [{"name": tool_call.name, "parameters": tool_call.args} for tool_call in tool_calls],
+                        session_id=session_id
+                    )
+                    end_span(tools_span, failed=sum(1 for outcome in outcomes if not outcome.ok))
+                    step.tool_latency = time.perf_counter() - tool_started
+                    step.tool_calls = [record.tool_name for record in records]
+                    turn_tool_calls.extend(records)
+                    step.tool_latencies = [outcome.latency for outcome in outcomes]
+                    
+                    # Feed the results back to the model for the next step
+                    for tool_call, record in zip(tool_calls, records):
+                        messages.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call.id,
+                            "content": record.result
+                        })
+                        yield ToolResultEvent(id=tool_call.id, name=record.tool_name, result=record.result, status=record.status)
             except Exception as e:
-                logger.error(f"Error during LLM streaming: {str(e)}", exc_info=True)
-                yield f"Error during LLM processing: {str(e)}"
+                turn_error = e
+                logger.exception("Error during LLM streaming: {}", e)
+                yield ErrorEvent(f"Error during LLM processing: {str(e)}")
                 return
+            finally:
+                trace.finish()
+                CHAT_TURN_DURATION.observe(trace.total_latency, status="error" if turn_error is not None else "ok")
+                end_span(
+                    turn_span,
+                    error=turn_error,
+                    steps=len(trace.steps),
+                    prompt_tokens=trace.prompt_tokens,
+                    completion_tokens=trace.completion_tokens
+                )
+                logger.opt(lazy=True).info("Turn trace: {}", trace.summary)
 
             # Add assistant message
-            assistant_message = Message(
-                id=uuid4(),
-                session_id=self.session_id,
-                role="assistant",
-                content=chunk,
-                created_at=datetime.utcnow(),
-                tool_calls=[]
+            response = "".join(response_parts)
+            if cache is not None and cached is None and response:
+                await cache.store(cache_key, response, [], scope=cache_scope, text=content)
+            await self._append_messages(state, [{"role": "assistant", "content": response}])
+            logger.debug("Added assistant message to history. Total messages: {}", len(state.messages))
+            if session_id:
+                assistant_record = {"id": uuid4(), "role": "assistant", "content": response, "created_at": datetime.utcnow()}
+                for record in turn_tool_calls:
+                    record.message_id = assistant_record["id"]
+                # Write-behind: the turn is batched and persisted off the streaming path
+                get_turn_writer().submit(TurnRecord(
+                    session_id=session_id,
+                    messages=[user_record, assistant_record],
+                    tool_calls=[record.model_dump() for record in turn_tool_calls],
+                    user_id=user_id
+                ))
+            logger.info("Completed message processing for session {}", session_id)
+            yield DoneEvent(
+                latency=trace.total_latency,
+                steps=len(trace.steps),
+                prompt_tokens=trace.prompt_tokens,
+                completion_tokens=trace.completion_tokens
             )
-            self.messages.append(assistant_message)
-            logger.info(f"Added assistant message to history. Total messages: {len(self.messages)}")
-            logger.info(f"Completed message processing for session {self.session_id}")
 
         except Exception as e:
-            logger.error(f"Error in chat processing: {str(e)}", exc_info=True)
-            yield f"Error: {str(e)}"
+            logger.exception("Error in chat processing: {}", e)
+            yield ErrorEvent(f"Error: {str(e)}")
+        finally:
+            if pinned is not None:
+                self.sessions.unpin(pinned)
 
     def register_tool(self, name: str, func: callable):
         """Register a new tool with the agent"""
         logger.info(f"Registering tool: {name}")
         self.tool_registry.register(name, func)
 
-    def get_history(self) -> List[Message]:
-        """Get chat history"""
-        return self.messages
+    async def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        """Get chat history for a session"""
+        return await self.get_messages(session_id)
 
-    def clear_history(self):
-        """Clear chat history"""
-        logger.info(f"Clearing history for session {self.session_id}")
-        self.messages = []
-        self.tool_calls = []
+    async def clear_history(self, session_id: str):
+        """Clear chat history for a session"""
+        logger.info(f"Clearing history for session {session_id}")
+        await self.clear_messages(session_id)
@@ -0,0 +1,147 @@
+from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from loguru import logger
+from ...configs.config import LLMConfig
+from ...configs.prompt import PromptManager
+from ..session import SessionState
+import asyncio
+import litellm
+
+# Role/separator tokens the chat format adds around every message
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=256)
+def _count_text_tokens(model_name: str, text: str) -> int:
+    return litellm.token_counter(model=model_name, text=text)
+
+
+def warm_tokenizer(model_name: str):
+    """Load the model's tokenizer, which otherwise happens inside the first turn on the event loop"""
+    litellm.token_counter(model=model_name, text="")
+
+
+class ContextWindow:
+    """
+    Token-budgeted view over a session's history.
+
+    Each message's token count is computed once and cached on the message itself, so building
+    a prompt only walks the unsummarized tail of the conversation. When that tail grows past
+    ``context_summary_ratio`` of the budget, its oldest turns are folded into the session's
+    rolling summary in the background.
+    """
+
+    def __init__(self, config: LLMConfig, prompt_manager: PromptManager):
+        self.budget = config.context_budget_tokens
+        self.summary_ratio = config.context_summary_ratio
+        self.prompt_manager = prompt_manager
+        self._summarizing: Dict[str, asyncio.Task] = {}
+
+    def count_tokens(self, message: Dict[str, Any], model_name: str) -> int:
+        """Get the token count of a message, computing and caching it on first use"""
+        tokens = message.get("tokens")
+        if tokens is None:
+            tokens = _count_text_tokens(model_name, message.get("content") or "") + _MESSAGE_OVERHEAD_TOKENS
+            message["tokens"] = tokens
+        return tokens
+
+    def build(self, state: SessionState, system_prompt: str) -> List[Dict[str, Any]]:
+        """
+        Build the prompt for the next turn of a session
+
+        Must be called while holding ``state.lock``.
+
+        Args:
+            state: The session whose history is used
+            system_prompt: The system prompt for this turn
+
+        Returns:
+            The system message, followed by as many recent messages as fit in the budget
+        """
+        model_name = state.llm.config.model_name
+        if state.summary:
+            system_prompt = f"{system_prompt}\n\nSummary of the earlier conversation:\n{state.summary}"
+        available = self.budget - _count_text_tokens(model_name, system_prompt) - _MESSAGE_OVERHEAD_TOKENS
+
+        # Walk back from the newest message; the latest message is always kept
+        start = len(state.messages)
+        used = 0
+        for index in range(len(state.messages) - 1, state.summarized_upto - 1, -1):
+            tokens = self.count_tokens(state.messages[index], model_name)
+            if start < len(state.messages) and used + tokens > available:
+                break
+            used += tokens
+            start = index
+
+        pending = sum(
+            self.count_tokens(message, model_name)
+            for message in state.messages[state.summarized_upto:start]
+        ) + used
+        if pending > available * self.summary_ratio:
+            self._schedule_summary(state, self._fold_boundary(state, available // 2, model_name))
+
+        if start > state.summarized_upto:
+            logger.info(
+                f"Context budget reached for session {state.session_id}: "
+                f"dropped {start - state.summarized_upto} message(s) pending summarization"
+            )
+
+        return [{"role": "system", "content": system_prompt}] + [
+            {key: value for key, value in message.items() if key != "tokens"}
+            for message in state.messages[start:]
+        ]
+
+    def _fold_boundary(self, state: SessionState, keep_tokens: int, model_name: str) -> int:
+        """Find the index up to which history should be summarized, keeping whole turns"""
+        end = len(state.messages) - 1
+        kept = self.count_tokens(state.messages[end], model_name)
+        while end > state.summarized_upto:
+            tokens = self.count_tokens(state.messages[end - 1], model_name)
+            if kept + tokens > keep_tokens:
+                break
+            kept += tokens
+            end -= 1
+        while end > state.summarized_upto and state.messages[end]["role"] != "user":
+            end -= 1
+        return end
+
+    def _schedule_summary(self, state: SessionState, end: int):
+        if end <= state.summarized_upto:
+            return
+        task = self._summarizing.get(state.session_id)
+        if task is not None and not task.done():
+            return
+        self._summarizing[state.session_id] = asyncio.create_task(self._summarize(state, end))
+
+    async def _summarize(self, state: SessionState, end: int):
+        """Fold ``messages[summarized_upto:end]`` into the session's rolling summary"""
+        messages = state.messages
+        start = state.summarized_upto
+        try:
+            transcript = "\n".join(
+                f"{message['role']}: {message.get('content') or ''}"
+                for message in messages[start:end]
+            )
+            content = f"{state.summary}\n\n{transcript}" if state.summary else transcript
+            prompt = self.prompt_manager.get_task_prompt("summarize", content=content)
+            summary = await state.llm.acomplete([{"role": "user", "content": prompt}])
+
+            async with state.lock:
+                # The history may have been cleared or folded while we were waiting
+                if state.messages is messages and state.summarized_upto == start:
+                    state.summary = summary or ""
+                    state.summarized_upto = end
+                    logger.info(f"Folded {end - start} message(s) into summary for session {state.session_id}")
+        except Exception as e:
+            logger.error(f"Failed to summarize session {state.session_id}: {str(e)}", exc_info=True)
+        finally:
+            self._summarizing.pop(state.session_id, None)
+
+    async def wait(self, session_id: Optional[str] = None):
+        """Wait for pending summarization of one or all sessions"""
+        if session_id is not None:
+            tasks = [self._summarizing[session_id]] if session_id in self._summarizing else []
+        else:
+            tasks = list(self._summarizing.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,56 @@
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field, asdict
+from ..generator.llm import StreamStats
+import time
+
+
+@dataclass
+class AgentStep:
+    """Timing and token usage for one LLM round of an agent turn"""
+    index: int
+    llm_latency: float = 0.0
+    time_to_first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tool_calls: List[str] = field(default_factory=list)
+    tool_latency: float = 0.0
+    tool_latencies: List[float] = field(default_factory=list)
+
+    def record_stream(self, stats: StreamStats):
+        self.llm_latency = stats.latency
+        self.time_to_first_token = stats.time_to_first_token
+        self.prompt_tokens = stats.prompt_tokens
+        self.completion_tokens = stats.completion_tokens
+
+
+@dataclass
+class TurnTrace:
+    """Per-step breakdown of where the wall time of one agent turn went"""
+    session_id: str
+    started_at: float = field(default_factory=time.perf_counter)
+    total_latency: float = 0.0
+    steps: List[AgentStep] = field(default_factory=list)
+
+    def finish(self):
+        self.total_latency = time.perf_counter() - self.started_at
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(step.prompt_tokens for step in self.steps)
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(step.completion_tokens for step in self.steps)
+
+    def summary(self) -> str:
+        parts = [
+            f"step {step.index}: llm {step.llm_latency:.3f}s"
+            + (f" (ttft {step.time_to_first_token:.3f}s)" if step.time_to_first_token is not None else "")
+            + f", tokens {step.prompt_tokens}/{step.completion_tokens}"
+            + (f", tools {','.join(step.tool_calls)} {step.tool_latency:.3f}s" if step.tool_calls else "")
+            for step in self.steps
+        ]
+        return f"{self.total_latency:.3f}s total, {len(self.steps)} step(s) [" + "; ".join(parts) + "]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
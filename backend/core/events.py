@@ -0,0 +1,84 @@
+"""
+Typed events streamed from the generator and agent layers to the API.
+"""
+from typing import Dict, Any, ClassVar, Union
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class TextDelta:
+    """A piece of the assistant's answer"""
+    content: str
+    type: ClassVar[str] = "text"
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"type": self.type, "content": self.content}
+
+
+@dataclass(slots=True)
+class ToolCallEvent:
+    """A tool call requested by the model"""
+    id: str
+    name: str
+    args: Dict[str, Any]
+    type: ClassVar[str] = "tool_call"
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "id": self.id,
+            "tool_name": self.name,
+            "tool_args": self.args,
+            "content": f"Calling tool: {self.name}",
+        }
+
+
+@dataclass(slots=True)
+class ToolResultEvent:
+    """The outcome of a tool call"""
+    id: str
+    name: str
+    result: str
+    status: str
+    type: ClassVar[str] = "tool_result"
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "id": self.id,
+            "tool_name": self.name,
+            "tool_result": self.result,
+            "status": self.status,
+        }
+
+
+@dataclass(slots=True)
+class DoneEvent:
+    """End of a turn, with its cost"""
+    latency: float
+    steps: int
+    prompt_tokens: int
+    completion_tokens: int
+    type: ClassVar[str] = "done"
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {
+            "type": self.type,
+            "latency": round(self.latency, 4),
+            "steps": self.steps,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+
+@dataclass(slots=True)
+class ErrorEvent:
+    """A failure that ended the turn"""
+    message: str
+    type: ClassVar[str] = "error"
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"type": self.type, "content": self.message}
+
+
+AgentEvent = Union[TextDelta, ToolCallEvent, ToolResultEvent, DoneEvent, ErrorEvent]
@@ -0,0 +1,16 @@
+"""
+Files module for the backend.
+"""
+from .uploads import (
+    ReceivedUpload,
+    UploadError,
+    UploadTooLargeError,
+    receive_upload,
+    commit_upload,
+    discard_upload,
+    blob_path,
+    blob_lock,
+)
+from .extract import iter_text, chunk_text
+from .lexical import BM25Index, tokenize, reciprocal_rank_fusion
+from .index import FileIndex, SessionIndex, get_file_index, shutdown_file_index
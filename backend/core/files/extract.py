@@ -0,0 +1,82 @@
+from typing import Iterable, Iterator, List
+from pathlib import Path
+from loguru import logger
+import codecs
+
+_BLOCK_SIZE = 64 * 1024
+
+# Extensions read as UTF-8 text regardless of the declared content type
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".csv", ".tsv", ".json", ".jsonl", ".yaml", ".yml", ".toml",
+    ".xml", ".html", ".htm", ".log", ".ini", ".cfg", ".py", ".js", ".ts", ".java", ".c", ".h", ".cpp",
+    ".go", ".rs", ".rb", ".sh", ".sql",
+}
+TEXT_CONTENT_TYPES = {"application/json", "application/xml", "application/x-yaml", "application/csv"}
+
+
+def is_text(filename: str, content_type: str) -> bool:
+    return (
+        Path(filename).suffix.lower() in TEXT_EXTENSIONS
+        or content_type.startswith("text/")
+        or content_type.split(";")[0].strip() in TEXT_CONTENT_TYPES
+    )
+
+
+def iter_text(path: Path, filename: str, content_type: str) -> Iterator[str]:
+    """
+    Yield the text of a stored file piece by piece
+
+    Text files are decoded incrementally, so memory use does not grow with the file size.
+    PDFs are read page by page if the optional ``pypdf`` package is installed. Anything else
+    yields nothing.
+    """
+    if is_text(filename, content_type):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with open(path, "rb") as handle:
+            while True:
+                block = handle.read(_BLOCK_SIZE)
+                if not block:
+                    break
+                yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+    elif Path(filename).suffix.lower() == ".pdf" or content_type == "application/pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            logger.warning(f"Skipping text extraction for {filename}: pypdf is not installed")
+            return
+        for page in PdfReader(str(path)).pages:
+            yield (page.extract_text() or "") + "\n"
+    else:
+        logger.info(f"Skipping text extraction for {filename}: unsupported type {content_type}")
+
+
+def chunk_text(pieces: Iterable[str], chunk_chars: int = 1200, overlap: int = 200, max_chunks: int = 0) -> List[str]:
+    """
+    Split streamed text into overlapping chunks of about ``chunk_chars`` characters
+
+    Chunks end at whitespace where possible, and each one repeats the last ``overlap``
+    characters of the previous chunk so that passages cut in two stay findable.
+    """
+    overlap = max(0, min(overlap, chunk_chars // 2))
+    chunks: List[str] = []
+    buffer, start = "", 0
+    for piece in pieces:
+        buffer = buffer[start:] + piece
+        start = 0
+        while len(buffer) - start >= chunk_chars:
+            end = start + chunk_chars
+            lowest = start + chunk_chars // 2
+            cut = max(buffer.rfind(" ", lowest, end), buffer.rfind("\n", lowest, end))
+            if cut <= start:
+                cut = end
+            chunk = buffer[start:cut].strip()
+            if chunk:
+                chunks.append(chunk)
+                if max_chunks and len(chunks) >= max_chunks:
+                    return chunks
+            start = max(cut - overlap, start + 1)
+    tail = buffer[start:].strip()
+    if tail and (not chunks or not chunks[-1].endswith(tail)):
+        chunks.append(tail)
+    return chunks[:max_chunks] if max_chunks else chunks
@@ -0,0 +1,405 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from loguru import logger
+from ...configs.config import FileConfig, config
+from ..generator.embedding import Embedder, HashingEmbedder, create_embedder
+from ..vectors import VectorStore
+from .extract import iter_text, chunk_text
+from .lexical import BM25Index, reciprocal_rank_fusion
+import numpy as np
+import asyncio
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+@dataclass
+class FileIndexMetrics:
+    """Counters exposed by the file index"""
+    ingested_files: int = 0
+    ingested_chunks: int = 0
+    skipped_files: int = 0
+    failed_files: int = 0
+    pending: int = 0
+    searches: int = 0
+    ingest_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class SessionIndex:
+    """
+    Hybrid vector and keyword index of the chunks of one session's files.
+
+    Embeddings go to an append-only memory-mapped VectorStore and chunk metadata to an
+    append-only ``chunks.jsonl``, so ingesting a file never rewrites what is already indexed.
+    A BM25 inverted index over the same chunks is kept in memory, updated on every ingestion
+    and rebuilt from ``chunks.jsonl`` when the index is opened. Removing a file tombstones its
+    vectors and postings; ``compact()`` reclaims the space.
+    """
+
+    def __init__(self, directory: Path, segment_capacity: int = 4096, bm25_k1: float = 1.2, bm25_b: float = 0.75):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.store = VectorStore(directory / "vectors", segment_capacity=segment_capacity)
+        self.lexical = BM25Index(k1=bm25_k1, b=bm25_b)
+        self._chunks: Dict[int, Dict[str, Any]] = {}
+        self._destroyed = False
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def has_content(self, sha256: str) -> bool:
+        return any(chunk["sha256"] == sha256 for chunk in list(self._chunks.values()))
+
+    def add(self, file_id: str, filename: str, sha256: str, texts: List[str], vectors: np.ndarray) -> int:
+        """Index a file's chunks, unless a file with the same content already is; returns chunks added"""
+        with self._lock:
+            # Checked again under the lock: concurrent uploads of the same bytes index it once
+            if self._destroyed or self.has_content(sha256):
+                return 0
+            ids = self.store.add(vectors)
+            chunks = {
+                int(chunk_id): {"file_id": file_id, "filename": filename, "sha256": sha256, "ordinal": ordinal, "text": text}
+                for ordinal, (chunk_id, text) in enumerate(zip(ids, texts))
+            }
+            with open(self.directory / "chunks.jsonl", "a", encoding="utf-8") as handle:
+                handle.writelines(json.dumps({"id": chunk_id, **chunk}) + "\n" for chunk_id, chunk in chunks.items())
+            self.lexical.add(list(chunks), texts)
+            self._chunks = {**self._chunks, **chunks}
+            return len(chunks)
+
+    def remove_file(self, file_id: str) -> int:
+        with self._lock:
+            if self._destroyed:
+                return 0
+            ids = [chunk_id for chunk_id, chunk in self._chunks.items() if chunk["file_id"] == file_id]
+            if ids:
+                self.store.delete(ids)
+                self.lexical.delete(ids)
+                self._chunks = {chunk_id: chunk for chunk_id, chunk in self._chunks.items() if chunk["file_id"] != file_id}
+            return len(ids)
+
+    def compact(self, threshold: float = 0.3) -> int:
+        """Compact the vector segments and drop metadata of deleted chunks"""
+        with self._lock:
+            if self._destroyed:
+                return 0
+            compacted = self.store.compact(threshold)
+            if compacted:
+                temp = self.directory / ".chunks.jsonl.tmp"
+                with open(temp, "w", encoding="utf-8") as handle:
+                    handle.writelines(json.dumps({"id": chunk_id, **chunk}) + "\n" for chunk_id, chunk in self._chunks.items())
+                os.replace(temp, self.directory / "chunks.jsonl")
+                self.lexical.rebuild((chunk_id, chunk["text"]) for chunk_id, chunk in self._chunks.items())
+            return compacted
+
+    def destroy(self):
+        """Delete the index from disk; requests still holding it find it empty"""
+        with self._lock:
+            self._destroyed = True
+            self._chunks = {}
+            self.lexical.rebuild([])
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def search(self, query: str, query_vector: np.ndarray, k: int, candidates: int = 50, rrf_k: int = 60) -> List[Dict[str, Any]]:
+        """
+        Hybrid search: the top ``candidates`` of the vector and BM25 rankings, fused by
+        reciprocal rank
+
+        Exact identifiers such as error codes or SKUs are found by the keyword ranking even
+        when their embeddings are not close to the query's.
+        """
+        chunks = self._chunks
+        if not chunks or k <= 0:
+            return []
+        candidates = max(k, candidates)
+        ids, scores = self.store.search(query_vector, candidates)
+        semantic = {int(chunk_id): float(score) for chunk_id, score in zip(ids[0], scores[0]) if int(chunk_id) in chunks}
+        lexical = {chunk_id: score for chunk_id, score in self.lexical.search(query, candidates) if chunk_id in chunks}
+        fused = reciprocal_rank_fusion([list(semantic), list(lexical)], k=rrf_k, limit=k)
+        return [
+            {
+                **chunks[chunk_id],
+                "score": score,
+                "semantic_score": semantic.get(chunk_id),
+                "lexical_score": lexical.get(chunk_id)
+            }
+            for chunk_id, score in fused
+        ]
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        chunks_path = self.directory / "chunks.jsonl"
+        if not chunks_path.exists():
+            return
+        live = set(self.store.live_ids())
+        with open(chunks_path, encoding="utf-8") as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                chunk_id = chunk.pop("id")
+                # Vectors are written before their metadata, so a crash can only leave vectors behind
+                if chunk_id in live:
+                    self._chunks[chunk_id] = chunk
+        self.lexical.rebuild((chunk_id, chunk["text"]) for chunk_id, chunk in self._chunks.items())
+
+
+class FileIndex:
+    """
+    Ingestion pipeline and per-session hybrid indexes for uploaded files.
+
+    Ingestion (text extraction, chunking, local embedding and index writes) runs on a
+    dedicated worker pool, so uploads return immediately and the event loop never does the
+    heavy lifting. Searches embed the query, then rank the session's chunks by vector
+    similarity and BM25 on the same pool and fuse both rankings.
+    """
+
+    def __init__(self, files_config: Optional[FileConfig] = None, embedder: Optional[Embedder] = None, max_open: int = 128):
+        self.config = files_config if files_config is not None else FileConfig()
+        self.embedder = embedder if embedder is not None else create_embedder(self.config.embedding_model)
+        self.max_open = max_open
+        self._indexes: "OrderedDict[str, SessionIndex]" = OrderedDict()
+        self._indexes_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        # Number of requests using each open index; pinned indexes are not evicted
+        self._pins: Dict[str, int] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._metrics = FileIndexMetrics()
+
+    def _acquire(self, session_id: str, open_missing: bool = True) -> Optional[SessionIndex]:
+        """
+        Get the index of a session, opening it from disk if needed, and pin it until
+        ``_release``
+
+        At most ``max_open`` indexes are kept open; the least recently used unpinned ones are
+        closed first. A pinned index is never dropped, since opening a second SessionIndex on
+        the same directory would give its vector store and chunk file two writers.
+        """
+        index = self._pin(session_id)
+        if index is not None or not open_missing:
+            return index
+        # Opening does disk reads; it holds only the open lock, so the loop can still pin
+        # and release other indexes meanwhile
+        with self._open_lock:
+            index = self._pin(session_id)
+            if index is not None:
+                return index
+            index = SessionIndex(
+                self._directory(session_id),
+                segment_capacity=self.config.index_segment_capacity,
+                bm25_k1=self.config.bm25_k1,
+                bm25_b=self.config.bm25_b
+            )
+            return self._pin(session_id, opened=index)
+
+    def _directory(self, session_id: str) -> Path:
+        return Path(self.config.index_dir) / _SAFE_NAME.sub("_", session_id)
+
+    def _pin(self, session_id: str, opened: Optional[SessionIndex] = None) -> Optional[SessionIndex]:
+        with self._indexes_lock:
+            if opened is not None:
+                # Added and pinned in one step, so it cannot be evicted before its first use
+                self._indexes[session_id] = opened
+            index = self._indexes.get(session_id)
+            if index is not None:
+                self._indexes.move_to_end(session_id)
+                self._pins[session_id] = self._pins.get(session_id, 0) + 1
+                self._evict()
+            return index
+
+    def _release(self, session_id: str):
+        with self._indexes_lock:
+            pins = self._pins.pop(session_id, 1) - 1
+            if pins > 0:
+                self._pins[session_id] = pins
+            self._evict()
+
+    def _evict(self):
+        for session_id in list(self._indexes):
+            if len(self._indexes) <= self.max_open:
+                break
+            if session_id not in self._pins:
+                del self._indexes[session_id]
+
+    @asynccontextmanager
+    async def _session_index(self, session_id: str) -> AsyncIterator[SessionIndex]:
+        index = self._acquire(session_id, open_missing=False)
+        if index is None:
+            # Opening reads the chunk metadata from disk and rebuilds the keyword index
+            loop = asyncio.get_running_loop()
+            index = await loop.run_in_executor(self._get_executor(), self._acquire, session_id)
+        try:
+            yield index
+        finally:
+            self._release(session_id)
+
+    def schedule(self, record: Dict[str, Any]) -> asyncio.Task:
+        """Ingest a stored file in the background"""
+        task = asyncio.ensure_future(self.ingest(record))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def ingest(self, record: Dict[str, Any]) -> int:
+        """
+        Extract, chunk, embed and index one stored file
+
+        Args:
+            record: The file's FileRecord fields
+
+        Returns:
+            Number of chunks indexed
+        """
+        session_id, file_id = str(record["session_id"]), str(record["id"])
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self._metrics.pending += 1
+        try:
+            async with self._session_index(session_id) as index:
+                if index.has_content(record["sha256"]):
+                    self._metrics.skipped_files += 1
+                    logger.info(f"File {record['filename']} is already indexed for session {session_id}")
+                    return 0
+
+                texts = await loop.run_in_executor(self._get_executor(), self._extract, record)
+                if not texts:
+                    self._metrics.skipped_files += 1
+                    return 0
+
+                batches = []
+                size = max(1, self.config.embed_batch_size)
+                for start in range(0, len(texts), size):
+                    batches.append(await self._embed(texts[start:start + size]))
+                vectors = np.concatenate(batches)
+
+                added = await loop.run_in_executor(
+                    self._get_executor(), index.add, file_id, record["filename"], record["sha256"], texts, vectors
+                )
+            if not added:
+                self._metrics.skipped_files += 1
+                logger.info(f"File {record['filename']} was indexed for session {session_id} meanwhile")
+                return 0
+            self._metrics.ingested_files += 1
+            self._metrics.ingested_chunks += added
+            logger.info(f"Indexed {added} chunks of {record['filename']} in {time.perf_counter() - started:.2f}s")
+            return added
+        except Exception as e:
+            self._metrics.failed_files += 1
+            logger.error(f"Failed to ingest file {record.get('filename')}: {str(e)}", exc_info=True)
+            return 0
+        finally:
+            self._metrics.pending -= 1
+            self._metrics.ingest_seconds += time.perf_counter() - started
+
+    async def remove_file(self, session_id: str, file_id: str) -> int:
+        loop = asyncio.get_running_loop()
+        async with self._session_index(session_id) as index:
+            removed = await loop.run_in_executor(self._get_executor(), index.remove_file, file_id)
+            if removed:
+                # Reclaim tombstoned vectors in the background once enough of a segment is dead;
+                # compaction rewrites files, so the index stays pinned until it finishes
+                self._acquire(session_id)
+                future = loop.run_in_executor(self._get_executor(), index.compact, self.config.index_compact_threshold)
+                future.add_done_callback(_log_compaction_error)
+                future.add_done_callback(lambda _: self._release(session_id))
+        return removed
+
+    async def remove_session(self, session_id: str):
+        """Close a session's index and delete it from disk"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._get_executor(), self._remove_session, session_id)
+
+    def _remove_session(self, session_id: str):
+        # Under the open lock, so the index cannot be reopened while its files are deleted
+        with self._open_lock:
+            with self._indexes_lock:
+                index = self._indexes.pop(session_id, None)
+            if index is not None:
+                index.destroy()
+            else:
+                shutil.rmtree(self._directory(session_id), ignore_errors=True)
+        logger.info(f"Removed file index of session {session_id}")
+
+    async def search(self, session_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the ``k`` chunks of the session's files that best match ``query``"""
+        self._metrics.searches += 1
+        loop = asyncio.get_running_loop()
+        async with self._session_index(session_id) as index:
+            if not len(index):
+                return []
+            query_vector = (await self._embed([query]))[0]
+            return await loop.run_in_executor(
+                self._get_executor(), index.search, query, query_vector, k,
+                self.config.search_candidates, self.config.rrf_k
+            )
+
+    async def wait(self):
+        """Wait for scheduled ingestions to finish"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return self._metrics.to_dict()
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _extract(self, record: Dict[str, Any]) -> List[str]:
+        pieces = iter_text(Path(record["filepath"]), record["filename"], record.get("content_type", ""))
+        return chunk_text(pieces, self.config.chunk_chars, self.config.chunk_overlap, self.config.max_chunks)
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        if isinstance(self.embedder, HashingEmbedder) and len(texts) > 1:
+            # Local embedding is CPU work; keep large batches off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), self.embedder.embed_batch, texts)
+        return await self.embedder.embed(texts)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, self.config.ingest_workers),
+                thread_name_prefix="file-ingest"
+            )
+        return self._executor
+
+
+def _log_compaction_error(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"File index compaction failed: {str(future.exception())}")
+
+
+_file_index: Optional[FileIndex] = None
+
+
+def get_file_index() -> FileIndex:
+    """Get the process-wide file index"""
+    global _file_index
+    if _file_index is None:
+        _file_index = FileIndex(config.files)
+    return _file_index
+
+
+def shutdown_file_index():
+    global _file_index
+    if _file_index is not None:
+        _file_index.shutdown()
+        _file_index = None
@@ -0,0 +1,172 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from array import array
+from collections import Counter
+import numpy as np
+import math
+import re
+import threading
+
+# Words plus compound identifiers such as ERR-4012, SKU_77.1 or v2.3.1
+_TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[-_.:/#][^\W_]+)*")
+_SEPARATORS = re.compile(r"[-_.:/#]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Case-folded terms of ``text``
+
+    Compound identifiers are kept whole and also split into their parts, so "ERR-4012"
+    matches both the exact code and a bare "4012".
+    """
+    terms = []
+    for match in _TOKEN_PATTERN.finditer(text.casefold()):
+        token = match.group()
+        terms.append(token)
+        if _SEPARATORS.search(token):
+            terms.extend(part for part in _SEPARATORS.split(token) if part)
+    return terms
+
+
+class _Postings:
+    """
+    Postings list of one term: delta-encoded document numbers and term frequencies.
+
+    Documents are numbered in insertion order, so appending keeps the list sorted and each
+    entry only stores the gap to the previous one, in a typed array rather than Python ints.
+    """
+
+    __slots__ = ("gaps", "frequencies", "last")
+
+    def __init__(self):
+        self.gaps = array("I")
+        self.frequencies = array("H")
+        self.last = -1
+
+    def append(self, document: int, frequency: int):
+        self.gaps.append(document - self.last if self.last >= 0 else document)
+        self.frequencies.append(min(frequency, 0xFFFF))
+        self.last = document
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        documents = np.cumsum(np.frombuffer(self.gaps, dtype=np.uint32), dtype=np.int64)
+        return documents, np.frombuffer(self.frequencies, dtype=np.uint16)
+
+    def nbytes(self) -> int:
+        return self.gaps.itemsize * len(self.gaps) + self.frequencies.itemsize * len(self.frequencies)
+
+
+class BM25Index:
+    """
+    Incremental in-memory BM25 index over chunks identified by integer ids.
+
+    Chunks get dense internal document numbers as they are added; deletions only mark
+    documents, and ``rebuild()`` drops them from the postings. A lock keeps searches from
+    reading the typed arrays while an ingestion thread grows them.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._postings: Dict[str, _Postings] = {}
+        self._ids = array("q")
+        self._lengths = array("I")
+        self._deleted = bytearray()
+        self._positions: Dict[int, int] = {}
+        self._live = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        tokenized = [(int(chunk_id), tokenize(text)) for chunk_id, text in zip(ids, texts)]
+        with self._lock:
+            self._add(tokenized)
+
+    def _add(self, tokenized: Sequence[Tuple[int, List[str]]]):
+        for chunk_id, terms in tokenized:
+            document = len(self._ids)
+            self._ids.append(chunk_id)
+            self._lengths.append(len(terms))
+            self._deleted.append(0)
+            self._positions[chunk_id] = document
+            self._live += 1
+            self._total_length += len(terms)
+            for term, frequency in Counter(terms).items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.append(document, frequency)
+
+    def delete(self, ids: Iterable[int]):
+        with self._lock:
+            for chunk_id in ids:
+                document = self._positions.pop(int(chunk_id), None)
+                if document is not None and not self._deleted[document]:
+                    self._deleted[document] = 1
+                    self._live -= 1
+                    self._total_length -= self._lengths[document]
+
+    def rebuild(self, chunks: Iterable[Tuple[int, str]]):
+        """Re-index only the given live chunks, reclaiming the space of deleted ones"""
+        tokenized = [(int(chunk_id), tokenize(text)) for chunk_id, text in chunks]
+        with self._lock:
+            self._reset()
+            self._add(tokenized)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (chunk id, BM25 score) pairs, best first"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._live or k <= 0 or not terms:
+                return []
+            return self._search(terms, k)
+
+    def _search(self, terms: Set[str], k: int) -> List[Tuple[int, float]]:
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        average_length = self._total_length / self._live or 1.0
+        normalization = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            documents, frequencies = postings.decode()
+            document_frequency = len(documents)
+            idf = math.log(1 + (self._live - document_frequency + 0.5) / (document_frequency + 0.5))
+            frequencies = frequencies.astype(np.float32)
+            scores[documents] += idf * frequencies * (self.k1 + 1) / (frequencies + normalization[documents])
+
+        scores[np.frombuffer(self._deleted, dtype=np.uint8).astype(bool)] = 0
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return []
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self._ids[document], float(scores[document])) for document in matched]
+
+    def nbytes(self) -> int:
+        """Approximate size of the postings, excluding Python object overhead of the term dict"""
+        return sum(postings.nbytes() for postings in self._postings.values()) + (
+            self._ids.itemsize * len(self._ids) + self._lengths.itemsize * len(self._lengths) + len(self._deleted)
+        )
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60, limit: Optional[int] = None) -> List[Tuple[int, float]]:
+    """
+    Merge ranked id lists by reciprocal rank fusion
+
+    Each list contributes 1 / (k + rank) for every id it contains, so ids ranked well by
+    several retrievers rise to the top without having to calibrate their raw scores.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return ordered[:limit] if limit is not None else ordered
@@ -0,0 +1,239 @@
+from typing import AsyncIterator, Dict, List, Optional
+from dataclasses import dataclass
+from pathlib import Path
+from loguru import logger
+from ...configs.config import FileConfig
+import asyncio
+import hashlib
+import os
+import tempfile
+import weakref
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# Multipart boundaries and part headers on top of the file itself
+_ENVELOPE_ALLOWANCE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Raised for malformed upload requests"""
+
+
+class UploadTooLargeError(Exception):
+    """Raised as soon as an upload grows past the configured limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the limit of {limit} bytes")
+        self.limit = limit
+
+
+@dataclass
+class ReceivedUpload:
+    """A fully received upload sitting in a temporary file next to its final location"""
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+    temp_path: Path
+
+
+class _FilePart:
+    """Collects the file part of a multipart body as the parser emits it"""
+
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self.headers: Dict[bytes, bytes] = {}
+        self.filename: Optional[str] = None
+        self.content_type = "application/octet-stream"
+        self.pending: List[bytes] = []
+        self.pending_bytes = 0
+        self.size = 0
+        self.found = False
+        self._field = b""
+        self._value = b""
+        self._active = False
+
+    def callbacks(self):
+        def on_part_begin():
+            self.headers = {}
+            self._active = False
+
+        def on_header_field(data, start, end):
+            self._field += data[start:end]
+
+        def on_header_value(data, start, end):
+            self._value += data[start:end]
+
+        def on_header_end():
+            self.headers[self._field.lower()] = self._value
+            self._field = b""
+            self._value = b""
+
+        def on_headers_finished():
+            _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+            name = options.get(b"name", b"").decode("utf-8", "replace")
+            # Only the first part of the expected field is kept; other form fields are ignored
+            if name == self.field_name and b"filename" in options and not self.found:
+                self.found = self._active = True
+                self.filename = options[b"filename"].decode("utf-8", "replace")
+                content_type = self.headers.get(b"content-type")
+                if content_type:
+                    self.content_type = content_type.decode("latin-1")
+
+        def on_part_data(data, start, end):
+            if self._active:
+                chunk = bytes(data[start:end])
+                self.pending.append(chunk)
+                self.pending_bytes += len(chunk)
+                self.size += len(chunk)
+
+        def on_part_end():
+            self._active = False
+
+        return {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        }
+
+    def take(self) -> List[bytes]:
+        chunks, self.pending, self.pending_bytes = self.pending, [], 0
+        return chunks
+
+
+def _write_chunks(handle, hasher, chunks: List[bytes]):
+    for chunk in chunks:
+        hasher.update(chunk)
+        handle.write(chunk)
+
+
+def _safe_filename(filename: str) -> str:
+    # Browsers may send a full client path; keep the base name only
+    name = os.path.basename(filename.replace("\\", "/")).strip()
+    return name or "upload"
+
+
+async def receive_upload(
+    content_type: str,
+    body: AsyncIterator[bytes],
+    files_config: FileConfig,
+    content_length: Optional[int] = None,
+    field_name: str = "file"
+) -> ReceivedUpload:
+    """
+    Stream a multipart/form-data body into a temporary file
+
+    The body is parsed incrementally, buffered up to ``chunk_size`` bytes at a time and
+    written (and hashed) on a worker thread, so neither the whole file nor the disk I/O
+    ever sits on the event loop. The size limit is enforced while streaming.
+
+    Args:
+        content_type: The request's Content-Type header
+        body: The raw request body
+        files_config: Upload directory, size limit and write chunk size
+        content_length: The declared body size, if any, used to reject oversized uploads early
+        field_name: Name of the form field carrying the file
+
+    Returns:
+        The received upload; the caller must commit or discard its temporary file
+    """
+    mime_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if mime_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data body")
+    limit = files_config.max_upload_bytes
+    if content_length is not None and content_length > limit + _ENVELOPE_ALLOWANCE:
+        raise UploadTooLargeError(limit)
+
+    directory = Path(files_config.upload_dir)
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    temp_path = Path(temp_name)
+    handle = os.fdopen(fd, "wb")
+    hasher = hashlib.sha256()
+    part = _FilePart(field_name)
+    parser = MultipartParser(boundary, part.callbacks())
+
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            if part.size > limit:
+                raise UploadTooLargeError(limit)
+            if part.pending_bytes >= files_config.chunk_size:
+                await asyncio.to_thread(_write_chunks, handle, hasher, part.take())
+        parser.finalize()
+        if not part.found:
+            raise UploadError(f"No file found in form field '{field_name}'")
+        await asyncio.to_thread(_write_chunks, handle, hasher, part.take())
+        await asyncio.to_thread(handle.close)
+    except BaseException:
+        handle.close()
+        await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+        raise
+
+    logger.info(f"Received upload {part.filename} ({part.size} bytes)")
+    return ReceivedUpload(
+        filename=_safe_filename(part.filename),
+        content_type=part.content_type,
+        size=part.size,
+        sha256=hasher.hexdigest(),
+        temp_path=temp_path
+    )
+
+
+def blob_path(files_config: FileConfig, sha256: str) -> Path:
+    """Content-addressed location of a stored file"""
+    return Path(files_config.upload_dir) / sha256[:2] / sha256
+
+
+# Held while a blob gains a reference or is unlinked; entries go away with their last user
+_blob_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def blob_lock(sha256: str) -> asyncio.Lock:
+    """
+    Lock serializing references to a stored blob with its removal
+
+    An upload commits its blob and saves its file record under the lock, and a delete
+    removes a record, checks whether the blob is still referenced and unlinks it under the
+    same lock. A deduplicated upload therefore never ends up pointing at a blob that a
+    concurrent delete is removing.
+    """
+    lock = _blob_locks.get(sha256)
+    if lock is None:
+        lock = _blob_locks[sha256] = asyncio.Lock()
+    return lock
+
+
+def _commit(temp_path: Path, target: Path) -> bool:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        temp_path.unlink(missing_ok=True)
+        return False
+    # Same directory tree and filesystem, so the rename is atomic
+    os.replace(temp_path, target)
+    return True
+
+
+async def commit_upload(upload: ReceivedUpload, files_config: FileConfig) -> Path:
+    """
+    Move a received upload to its content-addressed location
+
+    Identical content is stored once: if the blob already exists the temporary file is
+    simply discarded.
+    """
+    target = blob_path(files_config, upload.sha256)
+    if not await asyncio.to_thread(_commit, upload.temp_path, target):
+        logger.info(f"Deduplicated upload {upload.filename} ({upload.sha256[:12]})")
+    return target
+
+
+async def discard_upload(upload: ReceivedUpload):
+    await asyncio.to_thread(upload.temp_path.unlink, missing_ok=True)
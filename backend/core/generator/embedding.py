@@ -0,0 +1,78 @@
+from typing import List
+from loguru import logger
+import numpy as np
+import litellm
+import re
+import zlib
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale every row to unit length so that dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32, copy=False)
+
+
+class Embedder:
+    """Turns texts into unit-length float32 vectors"""
+    dim: int
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+    Dependency-free local embedder based on feature hashing.
+
+    Word unigrams and bigrams are hashed (with a stable CRC32) into a fixed number of signed
+    buckets. It captures lexical overlap only, which is what near-duplicate detection needs,
+    and costs microseconds per text with no network round trip.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = _TOKEN_PATTERN.findall(text.casefold())
+        features = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+        for feature in features:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        return vector
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Synchronous embedding, for callers that batch large inputs on a worker thread"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return normalize_rows(np.stack([self.embed_one(text) for text in texts]))
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return self.embed_batch(texts)
+
+
+class LiteLLMEmbedder(Embedder):
+    """Embedder backed by an embedding model reachable through LiteLLM"""
+
+    def __init__(self, model_name: str, dim: int = 0):
+        self.model_name = model_name
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        response = await litellm.aembedding(model=self.model_name, input=texts)
+        vectors = np.array([item["embedding"] for item in response.data], dtype=np.float32)
+        self.dim = vectors.shape[1]
+        return normalize_rows(vectors)
+
+
+def create_embedder(model_name: str = "", dim: int = 512) -> Embedder:
+    """Build a LiteLLM embedder for ``model_name``, or the local hashing embedder if it is empty"""
+    if model_name:
+        logger.info(f"Using embedding model: {model_name}")
+        return LiteLLMEmbedder(model_name)
+    return HashingEmbedder(dim)
@@ -1,25 +1,99 @@
 import os
 import litellm
-from litellm import _should_retry, acompletion
-from typing import List, Dict, Any, Optional, AsyncGenerator
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple, Union
+from dataclasses import dataclass
 from loguru import logger
 from dotenv import load_dotenv
 from ...types import Message
 from ...configs.config import config
+from .response_cache import get_response_cache
+from .router import get_llm_router
+from .retry import RetryPolicy
+from ..events import ToolCallEvent
+from ...log import LogSampler, preview
+from ...metrics import LLM_INTER_TOKEN_GAP, LLM_TIME_TO_FIRST_TOKEN, LLM_TOKENS_PER_SECOND
+import asyncio
 import json
+import time
 
 load_dotenv()
 
+# Per-chunk debug lines are sampled; logging every token would dominate streaming cost
+_chunk_log = LogSampler(interval=1.0)
+
 # Set the API key from config
 litellm.api_key = config.llm.api_key
 if not litellm.api_key:
     logger.error("OPENAI_API_KEY not found in environment variables")
 
+# Tool definitions sent when the caller does not supply its own
+DEFAULT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_duckduckgo",
+            "description": "Search the web using DuckDuckGo. Use this tool whenever you need to verify information, find recent developments, or when you're unsure about any details.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The search query"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Maximum number of results to return",
+                        "default": 5
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+    }
+]
+
+
+def _count_usage(model: str, messages: List[Dict[str, Any]], completion: str) -> Tuple[int, int]:
+    """Count prompt and completion tokens locally, for providers that do not report usage"""
+    return (
+        litellm.token_counter(model=model, messages=messages),
+        litellm.token_counter(model=model, text=completion)
+    )
+
+
+@dataclass
+class StreamStats:
+    """Timing and token usage collected while streaming a completion"""
+    started_at: float = 0.0
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def mark_first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def latency(self) -> float:
+        if self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
 class LLMInstance:
     def __init__(self, config=None):
         self.config = config if config is not None else config.llm
+        self.router = get_llm_router(self.config)
+        self.retry = RetryPolicy(self.config)
         self._initialize_llm()
-        logger.info(f"INIT LLM: {self.config.model_name}")
+        logger.debug("INIT LLM: {}", self.config.model_name)
     
     def _initialize_llm(self):
         """Initialize the LLM with the given configuration"""
@@ -44,7 +118,8 @@ class LLMInstance:
         messages.append({"role": "user", "content": prompt})
         
         try:
-            response = litellm.completion(
+            response = self.retry.call_sync(
+                self.router.completion,
                 model=self.config.model_name,
                 messages=messages,
                 temperature=self.config.temperature,
@@ -54,121 +129,213 @@ class LLMInstance:
             )
             return response.choices[0].message.content
         except Exception as e:
-            if _should_retry(e):
-                return self.generate(prompt, messages)
             logger.error(f"Error in generate: {str(e)}", exc_info=True)
             raise e
 
-    async def chat(self, content: str) -> AsyncGenerator[str, None]:
+    async def acomplete(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """
-        Stream chat responses with the given content
+        Complete a chat completion with the given messages without streaming
         
         Args:
-            content: The message content
+            messages: The messages to send
             
-        Yields:
-            str: Chunks of the response
+        Returns:
+            str: The generated response
         """
         try:
-            messages = [{"role": "user", "content": content}]
-            response = await litellm.acompletion(
+            response = await self.retry.call(
+                self.router.acompletion,
                 model=self.config.model_name,
                 messages=messages,
                 temperature=self.config.temperature,
                 top_p=self.config.top_p,
                 max_tokens=self.config.max_tokens,
                 timeout=self.config.timeout,
-                stream=True
+                **kwargs
             )
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"Error in acomplete: {str(e)}", exc_info=True)
+            raise e
+
+    async def chat(self, content: str, use_cache: bool = True) -> AsyncGenerator[str, None]:
+        """
+        Stream chat responses with the given content
+        
+        Args:
+            content: The message content
+            use_cache: Set to False to bypass the response cache for this request
             
+        Yields:
+            str: Chunks of the response
+        """
+        try:
+            messages = [{"role": "user", "content": content}]
+            params = {
+                "model": self.config.model_name,
+                "temperature": self.config.temperature,
+                "top_p": self.config.top_p,
+                "max_tokens": self.config.max_tokens,
+                "timeout": self.config.timeout,
+            }
+            
+            cache = get_response_cache() if use_cache else None
+            if cache is not None:
+                key = cache.make_key(params, messages)
+                scope = cache.make_scope(params, messages)
+                cached = await cache.lookup(key, scope, messages[-1].get("content") or "")
+                if cached is not None:
+                    async for piece in cache.replay(cached):
+                        yield piece
+                    return
+            
+            response = self.retry.stream(lambda: self.router.stream(messages=messages, **params))
+            
+            content_parts = []
             async for chunk in response:
-                if chunk.choices[0].delta.content:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content_parts.append(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
+            
+            if cache is not None:
+                await cache.store(key, "".join(content_parts), [], scope=scope, text=content)
                     
         except Exception as e:
             logger.error(f"Error in chat: {str(e)}", exc_info=True)
             raise e
 
-    async def stream_acomplete(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
+    async def stream_acomplete(
+        self,
+        messages: List[Dict[str, Any]],
+        stats: Optional[StreamStats] = None,
+        use_cache: bool = True,
+        **kwargs
+    ) -> AsyncGenerator[Union[str, ToolCallEvent], None]:
         """
         Stream a chat completion with the given messages
+        
+        Content is yielded as plain strings as it arrives. Tool calls requested by the model
+        (possibly several in parallel) are assembled over the whole stream and yielded once
+        each, as ToolCallEvent objects, after the stream ends. When the response cache is
+        enabled, a cached response is replayed in the same shape.
+        
+        Args:
+            messages: The messages to send
+            stats: Optional StreamStats that is filled with timing and token usage
+            use_cache: Set to False to bypass the response cache for this request
+            **kwargs: Overrides for the completion parameters (e.g. tools, tool_choice)
         """
+        stats = stats if stats is not None else StreamStats()
         try:
-            logger.debug(f"Starting stream completion with messages: {messages}")
+            logger.debug("Starting stream completion with {} messages", len(messages))
             
-            # Add function definitions for available tools
-            functions = [
-                {
-                    "name": "search_duckduckgo",
-                    "description": "Search the web using DuckDuckGo. Use this tool whenever you need to verify information, find recent developments, or when you're unsure about any details.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The search query"
-                            },
-                            "max_results": {
-                                "type": "integer",
-                                "description": "Maximum number of results to return",
-                                "default": 5
-                            }
-                        },
-                        "required": ["query"]
-                    }
-                }
-            ]
+            params = {
+                "model": self.config.model_name,
+                "temperature": self.config.temperature,
+                "top_p": self.config.top_p,
+                "max_tokens": self.config.max_tokens,
+                "timeout": self.config.timeout,
+                "tools": DEFAULT_TOOLS,
+                "tool_choice": "required",  # Force the LLM to use search when appropriate
+                "stream_options": {"include_usage": True},
+            }
+            params.update(kwargs)
             
-            response = await litellm.acompletion(
-                model=self.config.model_name,
-                messages=messages,
-                temperature=self.config.temperature,
-                top_p=self.config.top_p,
-                max_tokens=self.config.max_tokens,
-                timeout=self.config.timeout,
-                stream=True,
-                functions=functions,
-                function_call={"name": "search_duckduckgo"},  # Force the LLM to use search when appropriate
-                **kwargs
-            )
+            stats.started_at = time.perf_counter()
+            cache = get_response_cache() if use_cache else None
+            if cache is not None:
+                key = cache.make_key(params, messages)
+                scope = cache.make_scope(params, messages)
+                cached = await cache.lookup(key, scope, messages[-1].get("content") or "")
+                if cached is not None:
+                    async for piece in cache.replay(cached):
+                        stats.mark_first_token()
+                        yield piece
+                    stats.finished_at = time.perf_counter()
+                    return
+            
+            response = self.retry.stream(lambda: self.router.stream(messages=messages, **params))
             
-            logger.info("Starting to process LLM response stream")
-            current_function_call = None
+            logger.debug("Starting to process LLM response stream")
+            tool_calls: Dict[int, Dict[str, str]] = {}
+            content_parts = []
+            tool_events = []
+            model = params["model"]
+            last_chunk_at = None
             
             async for chunk in response:
-                if hasattr(chunk.choices[0].delta, 'function_call') and chunk.choices[0].delta.function_call:
-                    function_call = chunk.choices[0].delta.function_call
-                    if not current_function_call:
-                        current_function_call = {"name": "", "arguments": ""}
-                    
-                    if hasattr(function_call, 'name'):
-                        current_function_call["name"] = function_call.name
-                    if hasattr(function_call, 'arguments'):
-                        current_function_call["arguments"] += function_call.arguments
-                    
-                    if current_function_call["name"] and current_function_call["arguments"]:
-                        try:
-                            # Try to parse the arguments as JSON
-                            args = json.loads(current_function_call["arguments"])
-                            yield f"TOOL_CALL:{json.dumps({'name': current_function_call['name'], 'args': args})}\n"
-                            current_function_call = None
-                        except json.JSONDecodeError:
-                            # If not complete JSON yet, continue collecting
-                            continue
-                elif chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    logger.debug(f"Received content chunk from LLM: {content}")
+                usage = getattr(chunk, "usage", None)
+                if usage:
+                    stats.prompt_tokens = usage.prompt_tokens or 0
+                    stats.completion_tokens = usage.completion_tokens or 0
+                if not chunk.choices:
+                    continue
+                
+                now = time.perf_counter()
+                if last_chunk_at is not None:
+                    LLM_INTER_TOKEN_GAP.observe(now - last_chunk_at, model=model)
+                last_chunk_at = now
+                delta = chunk.choices[0].delta
+                for tool_call in getattr(delta, "tool_calls", None) or []:
+                    stats.mark_first_token()
+                    current = tool_calls.setdefault(tool_call.index or 0, {"id": "", "name": "", "arguments": ""})
+                    if tool_call.id:
+                        current["id"] = tool_call.id
+                    function = tool_call.function
+                    if function is not None:
+                        if function.name:
+                            current["name"] = function.name
+                        if function.arguments:
+                            current["arguments"] += function.arguments
+                if delta.content:
+                    stats.mark_first_token()
+                    content = delta.content
+                    content_parts.append(content)
+                    if _chunk_log.allow():
+                        logger.debug("Received content chunk from LLM: {!r} (+{} chunks not logged)", content, _chunk_log.take_suppressed())
                     yield content
-            logger.info("Finished processing LLM response stream")
+            
+            for index in sorted(tool_calls):
+                tool_call = tool_calls[index]
+                if not tool_call["name"]:
+                    continue
+                try:
+                    args = json.loads(tool_call["arguments"] or "{}")
+                except json.JSONDecodeError:
+                    logger.error(f"Discarding tool call with malformed arguments: {tool_call}")
+                    continue
+                tool_event = ToolCallEvent(id=tool_call["id"], name=tool_call["name"], args=args)
+                tool_events.append(tool_event)
+                yield tool_event
+            
+            stats.finished_at = time.perf_counter()
+            if not stats.completion_tokens:
+                # Provider did not report usage; fall back to local token counts. Tokenizing
+                # the whole prompt takes milliseconds, so it runs off the event loop
+                stats.prompt_tokens, stats.completion_tokens = await asyncio.to_thread(
+                    _count_usage,
+                    params["model"],
+                    messages,
+                    "".join(content_parts) + "".join(call["arguments"] for call in tool_calls.values())
+                )
+            if stats.first_token_at is not None:
+                LLM_TIME_TO_FIRST_TOKEN.observe(stats.time_to_first_token, model=model)
+                generating = stats.finished_at - stats.first_token_at
+                if generating > 0 and stats.completion_tokens:
+                    LLM_TOKENS_PER_SECOND.observe(stats.completion_tokens / generating, model=model)
+            if cache is not None:
+                await cache.store(
+                    key,
+                    "".join(content_parts),
+                    tool_events,
+                    scope=scope,
+                    text=messages[-1].get("content") if scope is not None else None
+                )
+            logger.debug("Finished processing LLM response stream")
             
         except Exception as e:
             logger.error(f"Error in stream_acomplete: {str(e)}", exc_info=True)
-            if _should_retry(e):
-                logger.info("Retrying stream completion...")
-                async for chunk in self.stream_acomplete(messages, **kwargs):
-                    yield chunk
-            else:
-                raise e
+            raise e
 
 class LiteLLM:
     _instance = None
@@ -189,7 +356,8 @@ class LiteLLM:
         Complete a chat completion with the given messages
         """
         try:
-            response = litellm.completion(
+            response = RetryPolicy(self.config).call_sync(
+                get_llm_router(self.config).completion,
                 model=self.config.model_name,
                 messages=messages,
                 temperature=self.config.temperature,
@@ -200,8 +368,7 @@ class LiteLLM:
             )
             return response.choices[0].message.content
         except Exception as e:
-            if _should_retry(e):
-                return self.complete(messages, **kwargs)
+            logger.error(f"Error in complete: {str(e)}", exc_info=True)
             raise e
 
 
@@ -209,15 +376,16 @@ class AsyncLiteLLM:
     def __init__(self):
         self.config = config.llm
         self.messages = []
-        logger.info(f"Initialized AsyncLiteLLM with model: {self.config.model_name}")
+        logger.info("Initialized AsyncLiteLLM with model: {}", self.config.model_name)
 
     async def acomplete(self, messages: List[Dict[str, str]], **kwargs) -> str:
         """
         Asynchronously complete a chat completion with the given messages
         """
         try:
-            logger.debug(f"Sending completion request with messages: {messages}")
-            response = await acompletion(
+            logger.debug("Sending completion request with {} messages", len(messages))
+            response = await RetryPolicy(self.config).call(
+                get_llm_router(self.config).acompletion,
                 model=self.config.model_name,
                 messages=messages,
                 temperature=self.config.temperature,
@@ -226,13 +394,10 @@ class AsyncLiteLLM:
                 timeout=self.config.timeout,
                 **kwargs
             )
-            logger.debug(f"Received completion response: {response}")
+            logger.opt(lazy=True).debug("Received completion response: {}", lambda: preview(response.choices[0].message.content))
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"Error in acomplete: {str(e)}", exc_info=True)
-            if _should_retry(e):
-                logger.info("Retrying completion request...")
-                return await self.acomplete(messages, **kwargs)
             raise e
     
     async def stream_acomplete(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
@@ -240,27 +405,23 @@ class AsyncLiteLLM:
         Stream a chat completion with the given messages
         """
         try:
-            logger.debug(f"Starting stream completion with messages: {messages}")
-            response = await litellm.acompletion(
+            logger.debug("Starting stream completion with {} messages", len(messages))
+            router = get_llm_router(self.config)
+            response = RetryPolicy(self.config).stream(lambda: router.stream(
                 model=self.config.model_name,
                 messages=messages,
                 temperature=self.config.temperature,
                 top_p=self.config.top_p,
                 max_tokens=self.config.max_tokens,
                 timeout=self.config.timeout,
-                stream=True,
                 **kwargs
-            )
+            ))
             async for chunk in response:
                 if chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
-                    logger.debug(f"Received stream chunk: {content}")
+                    if _chunk_log.allow():
+                        logger.debug("Received stream chunk: {!r} (+{} chunks not logged)", content, _chunk_log.take_suppressed())
                     yield content
         except Exception as e:
             logger.error(f"Error in stream_acomplete: {str(e)}", exc_info=True)
-            if _should_retry(e):
-                logger.info("Retrying stream completion...")
-                async for chunk in self.stream_acomplete(messages, **kwargs):
-                    yield chunk
-            else:
-                raise e
\ No newline at end of file
+            raise e
\ No newline at end of file
@@ -0,0 +1,198 @@
+from typing import List, Dict, Any, Optional, AsyncGenerator, Union
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from loguru import logger
+from ...configs.config import ResponseCacheConfig, config
+from .embedding import Embedder, create_embedder
+from ..events import ToolCallEvent
+import numpy as np
+import asyncio
+import hashlib
+import json
+import time
+
+
+@dataclass
+class CachedResponse:
+    """A completed LLM response as it was streamed"""
+    content: str
+    tool_calls: List[ToolCallEvent] = field(default_factory=list)
+    expires_at: float = 0.0
+    row: Optional[int] = None
+
+
+@dataclass
+class ResponseCacheMetrics:
+    """Counters exposed by the response cache"""
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    entries: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def _digest(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of LLM responses.
+
+    The exact tier is keyed by a hash of the model, the completion parameters and the full
+    prompt. The optional semantic tier matches the last user message by cosine similarity of
+    embeddings held in a preallocated NumPy matrix, restricted to entries whose earlier
+    context (system prompt, history, tools) hashes identically. Responses that request tool
+    calls are only cached exactly: their arguments belong to the question that was asked.
+    """
+
+    def __init__(self, config: ResponseCacheConfig, embedder: Optional[Embedder] = None):
+        self.config = config
+        self.embedder = embedder if embedder is not None else create_embedder(config.embedding_model)
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._metrics = ResponseCacheMetrics()
+        # Semantic tier: one matrix row per cached entry, recycled through a free list
+        self._matrix: Optional[np.ndarray] = None
+        self._row_keys: List[Optional[str]] = [None] * config.max_entries
+        self._row_scopes: List[Optional[str]] = [None] * config.max_entries
+        self._free_rows = list(range(config.max_entries - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(params: Dict[str, Any], messages: List[Dict[str, Any]]) -> str:
+        """Exact-match key: every completion parameter plus the full prompt"""
+        return _digest({"params": params, "messages": messages})
+
+    @staticmethod
+    def make_scope(params: Dict[str, Any], messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Semantic scope: everything except the final user message, or None if there is none"""
+        if not messages or messages[-1].get("role") != "user":
+            return None
+        return _digest({"params": params, "messages": messages[:-1]})
+
+    async def lookup(self, key: str, scope: Optional[str], text: str) -> Optional[CachedResponse]:
+        """Look a prompt up in the exact tier, then in the semantic tier"""
+        cached = self.get(key)
+        if cached is None and scope is not None:
+            cached = await self.get_similar(scope, text)
+        if cached is None:
+            self.record_miss()
+        return cached
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        self._metrics.exact_hits += 1
+        return entry
+
+    async def get_similar(self, scope: Optional[str], text: str) -> Optional[CachedResponse]:
+        """Find the cached response whose question is most similar to ``text`` within ``scope``"""
+        if not self.config.semantic or scope is None or self._matrix is None:
+            return None
+        if scope not in self._row_scopes:
+            return None
+
+        vector = (await self.embedder.embed([text]))[0]
+        # Rows are collected after the await, since concurrent stores may have recycled some
+        candidates = [row for row, row_scope in enumerate(self._row_scopes) if row_scope == scope]
+        if not candidates:
+            return None
+        similarities = self._matrix[candidates] @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.config.similarity_threshold:
+            return None
+
+        key = self._row_keys[candidates[best]]
+        entry = self.get(key) if key is not None else None
+        if entry is not None:
+            # get() counted an exact hit; reattribute it to the semantic tier
+            self._metrics.exact_hits -= 1
+            self._metrics.semantic_hits += 1
+            logger.info(f"Semantic cache hit (similarity {similarities[best]:.3f})")
+        return entry
+
+    def record_miss(self):
+        self._metrics.misses += 1
+
+    async def store(
+        self,
+        key: str,
+        content: str,
+        tool_calls: List[ToolCallEvent],
+        scope: Optional[str] = None,
+        text: Optional[str] = None
+    ):
+        """Cache a completed response, evicting the least recently used entries if full"""
+        vector = None
+        if self.config.semantic and scope is not None and text and not tool_calls:
+            try:
+                vector = (await self.embedder.embed([text]))[0]
+            except Exception as e:
+                logger.error(f"Failed to embed response cache entry: {str(e)}", exc_info=True)
+
+        # Nothing below awaits, so concurrent stores cannot interleave between making room
+        # and taking it: the entry count stays within max_entries and a free row always exists
+        if key in self._entries:
+            self._evict(key)
+        while len(self._entries) >= self.config.max_entries:
+            self._evict(next(iter(self._entries)))
+            self._metrics.evictions += 1
+
+        entry = CachedResponse(content=content, tool_calls=list(tool_calls), expires_at=time.time() + self.config.ttl)
+        if vector is not None:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.config.max_entries, vector.shape[0]), dtype=np.float32)
+            row = self._free_rows.pop()
+            self._matrix[row] = vector
+            self._row_keys[row] = key
+            self._row_scopes[row] = scope
+            entry.row = row
+
+        self._entries[key] = entry
+        self._metrics.stores += 1
+
+    async def replay(self, entry: CachedResponse) -> AsyncGenerator[Union[str, ToolCallEvent], None]:
+        """Replay a cached response as a simulated token stream"""
+        size = max(1, self.config.replay_chunk_chars)
+        for start in range(0, len(entry.content), size):
+            yield entry.content[start:start + size]
+            # Give other streams a turn, as a real network stream would
+            await asyncio.sleep(0)
+        for tool_call in entry.tool_calls:
+            # Fresh copies, since the agent fills in missing call ids
+            yield ToolCallEvent(id=tool_call.id, name=tool_call.name, args=tool_call.args)
+
+    def metrics(self) -> Dict[str, int]:
+        self._metrics.entries = len(self._entries)
+        return self._metrics.to_dict()
+
+    def _evict(self, key: str):
+        entry = self._entries.pop(key)
+        if entry.row is not None:
+            self._row_keys[entry.row] = None
+            self._row_scopes[entry.row] = None
+            self._free_rows.append(entry.row)
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None if caching is disabled"""
+    global _response_cache
+    if not config.response_cache.enabled:
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(config.response_cache)
+    return _response_cache
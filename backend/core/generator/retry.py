@@ -0,0 +1,221 @@
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional, TypeVar
+from collections import deque
+from dataclasses import dataclass, asdict
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from loguru import logger
+from litellm.exceptions import (
+    APIConnectionError,
+    InternalServerError,
+    RateLimitError,
+    ServiceUnavailableError,
+    Timeout,
+)
+from ...configs.config import LLMConfig, config
+import asyncio
+import random
+import threading
+import time
+
+T = TypeVar("T")
+
+# Status codes worth retrying or sending to another deployment
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+_TRANSIENT_ERRORS = (
+    asyncio.TimeoutError, TimeoutError, Timeout, RateLimitError, ServiceUnavailableError,
+    InternalServerError, APIConnectionError
+)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Timeouts, rate limits and server-side failures; anything else is the request's fault"""
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    return getattr(error, "status_code", None) in TRANSIENT_STATUS_CODES
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a ``Retry-After`` header or attribute"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(error, "litellm_response_headers", None)
+        if headers is None:
+            headers = getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None:
+            try:
+                value = headers.get("retry-after") or headers.get("Retry-After")
+            except Exception:
+                value = None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        # HTTP-date form
+        return max(0.0, (parsedate_to_datetime(str(value)) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests, so an outage cannot multiply traffic.
+
+    Over a sliding window, retries are allowed while
+    ``retries < min_retries + ratio * requests``; ``min_retries`` keeps a quiet process able
+    to retry at all.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Account for one retry if the budget allows it"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+    def _prune(self, now: float):
+        cutoff = now - self.window
+        for times in (self._requests, self._retries):
+            while times and times[0] < cutoff:
+                times.popleft()
+
+
+@dataclass
+class RetryMetrics:
+    """Counters of the shared retry policy"""
+    calls: int = 0
+    retries: int = 0
+    exhausted: int = 0
+    budget_rejections: int = 0
+    retry_after_honored: int = 0
+    mid_stream_failures: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RetryPolicy:
+    """
+    Retries transient LLM failures with capped exponential backoff and full jitter.
+
+    ``retry_attempts`` is the number of retries after the first attempt. A ``Retry-After``
+    hint replaces the backoff when it is longer, and errors asking for more than
+    ``retry_max_delay`` are raised instead of blocking the request. Every retry also has to
+    fit in the process-wide RetryBudget. Streams are only retried while nothing has been
+    yielded; after that, an error is raised so the caller never sees output twice.
+    """
+
+    def __init__(self, llm_config: LLMConfig, budget: Optional[RetryBudget] = None, metrics: Optional[RetryMetrics] = None):
+        self.attempts = max(0, llm_config.retry_attempts)
+        self.base_delay = llm_config.retry_base_delay
+        self.max_delay = llm_config.retry_max_delay
+        self.budget = budget if budget is not None else get_retry_budget()
+        self.metrics = metrics if metrics is not None else _metrics
+
+    def next_delay(self, error: BaseException, retry: int) -> Optional[float]:
+        """Delay before retry number ``retry`` (0-based), or None to give up"""
+        if retry >= self.attempts or not is_transient_error(error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        requested = retry_after(error)
+        if requested is not None:
+            if requested > self.max_delay:
+                return None
+            if requested > delay:
+                self.metrics.retry_after_honored += 1
+                delay = requested
+        if not self.budget.try_spend():
+            self.metrics.budget_rejections += 1
+            logger.warning("Retry budget exhausted, not retrying LLM request")
+            return None
+        return delay
+
+    async def call(self, function: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        self._start()
+        retry = 0
+        while True:
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                delay = self._give_up_or_delay(e, retry)
+                await asyncio.sleep(delay)
+                retry += 1
+
+    def call_sync(self, function: Callable[..., T], *args, **kwargs) -> T:
+        self._start()
+        retry = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                delay = self._give_up_or_delay(e, retry)
+                time.sleep(delay)
+                retry += 1
+
+    async def stream(self, factory: Callable[[], AsyncGenerator[Any, None]]) -> AsyncGenerator[Any, None]:
+        """Iterate ``factory()``, starting over on transient errors raised before the first item"""
+        self._start()
+        retry = 0
+        while True:
+            yielded = False
+            try:
+                async for item in factory():
+                    yielded = True
+                    yield item
+                return
+            except Exception as e:
+                if yielded:
+                    self.metrics.mid_stream_failures += 1
+                    raise
+                delay = self._give_up_or_delay(e, retry)
+                await asyncio.sleep(delay)
+                retry += 1
+
+    def _start(self):
+        self.metrics.calls += 1
+        self.budget.record_request()
+
+    def _give_up_or_delay(self, error: Exception, retry: int) -> float:
+        delay = self.next_delay(error, retry)
+        if delay is None:
+            if retry and is_transient_error(error):
+                self.metrics.exhausted += 1
+            raise error
+        self.metrics.retries += 1
+        logger.info(f"Retrying LLM request in {delay:.2f}s after {type(error).__name__} (retry {retry + 1}/{self.attempts})")
+        return delay
+
+
+_budget: Optional[RetryBudget] = None
+_metrics = RetryMetrics()
+
+
+def get_retry_budget() -> RetryBudget:
+    """Get the process-wide retry budget"""
+    global _budget
+    if _budget is None:
+        _budget = RetryBudget(config.llm.retry_budget_ratio, config.llm.retry_budget_min)
+    return _budget
+
+
+def retry_metrics() -> Dict[str, Any]:
+    return _metrics.to_dict()
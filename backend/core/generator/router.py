@@ -0,0 +1,377 @@
+from typing import Any, AsyncGenerator, Dict, List, Optional, Set, Tuple
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from loguru import logger
+from ...configs.config import LLMConfig
+from ...http_client import llm_timeout
+from ...metrics import LLM_QUEUE_WAIT
+from .retry import is_transient_error
+import litellm
+import asyncio
+import json
+import random
+import threading
+import time
+
+
+class NoDeploymentAvailableError(RuntimeError):
+    """Every deployment's circuit breaker is open"""
+    status_code = 503
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"No LLM deployment available, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class _SlotTimeoutError(asyncio.TimeoutError):
+    """No concurrency slot freed up in time; the deployment is busy, not unhealthy"""
+
+
+@dataclass
+class Deployment:
+    """One model endpoint the router may send requests to"""
+    model: str
+    name: str = ""
+    weight: float = 1.0
+    api_base: Optional[str] = None
+    api_key: Optional[str] = None
+    max_concurrency: int = 0  # 0 uses LLMConfig.max_concurrency
+
+    def __post_init__(self):
+        self.name = self.name or self.model
+
+
+def parse_deployments(llm_config: LLMConfig) -> List[Deployment]:
+    """
+    Read the deployment list from ``LLMConfig.deployments``
+
+    Accepts a JSON list of Deployment fields, or the shorthand ``model=weight,model=weight``.
+    """
+    raw = (llm_config.deployments or "").strip()
+    if not raw:
+        return [Deployment(model=llm_config.model_name)]
+    if raw.startswith("["):
+        return [Deployment(**entry) for entry in json.loads(raw)]
+    deployments = []
+    for item in raw.split(","):
+        model, _, weight = item.strip().partition("=")
+        if model:
+            deployments.append(Deployment(model=model, weight=float(weight) if weight else 1.0))
+    return deployments
+
+
+@dataclass
+class DeploymentMetrics:
+    """Health and load of one deployment"""
+    name: str = ""
+    model: str = ""
+    state: str = "closed"
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ewma_ttft: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class _DeploymentState:
+    """
+    Runtime state of a deployment: concurrency slots, latency estimate and circuit breaker.
+
+    The breaker opens after ``breaker_failures`` consecutive transient failures and rejects
+    traffic for ``breaker_cooldown`` seconds. After that it is half-open: one probe request
+    is let through, and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, deployment: Deployment, llm_config: LLMConfig):
+        self.deployment = deployment
+        self.config = llm_config
+        self.limit = max(1, deployment.max_concurrency or llm_config.max_concurrency)
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ewma_ttft: Optional[float] = None
+        self.opened_until: Optional[float] = None
+        self.probing = False
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.deployment.name
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.limit
+
+    def state(self, now: float) -> str:
+        if self.opened_until is None:
+            return "closed"
+        return "half-open" if now >= self.opened_until else "open"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        return state == "closed" or (state == "half-open" and not self.probing)
+
+    def begin_probe(self, now: float) -> bool:
+        """Claim the half-open probe; true if this request is it"""
+        with self._lock:
+            if self.state(now) != "half-open" or self.probing:
+                return False
+            self.probing = True
+            return True
+
+    def end_probe(self):
+        """
+        Release the probe once its request is over
+
+        Usually a no-op, since recording the outcome already did. A probe that ends without
+        an outcome, such as one cancelled by a client disconnect, must not keep the
+        deployment unavailable forever; the next request probes again.
+        """
+        with self._lock:
+            self.probing = False
+
+    def record_success(self, ttft: Optional[float] = None):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_until = None
+            self.probing = False
+            if ttft is not None:
+                alpha = self.config.ttft_ewma_alpha
+                self.ewma_ttft = ttft if self.ewma_ttft is None else alpha * ttft + (1 - alpha) * self.ewma_ttft
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            half_open = self.probing
+            self.probing = False
+            if half_open or self.consecutive_failures >= self.config.breaker_failures:
+                self.opened_until = time.monotonic() + self.config.breaker_cooldown
+                logger.warning(
+                    f"Circuit opened for LLM deployment {self.name} after "
+                    f"{self.consecutive_failures} failures; cooling down {self.config.breaker_cooldown:.0f}s"
+                )
+
+    @asynccontextmanager
+    async def slot(self, timeout: float):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started, deployment=self.name)
+        except asyncio.TimeoutError:
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - started, deployment=self.name)
+            raise _SlotTimeoutError(f"All {self.limit} slots of LLM deployment {self.name} stayed busy for {timeout}s")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def metrics(self) -> DeploymentMetrics:
+        return DeploymentMetrics(
+            name=self.name,
+            model=self.deployment.model,
+            state=self.state(time.monotonic()),
+            in_flight=self.in_flight,
+            requests=self.requests,
+            failures=self.failures,
+            consecutive_failures=self.consecutive_failures,
+            ewma_ttft=self.ewma_ttft
+        )
+
+
+@asynccontextmanager
+async def _closing(iterator: Any) -> AsyncGenerator[Any, None]:
+    try:
+        yield iterator
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception as e:
+                logger.debug("Closing an LLM stream failed: {}", e)
+
+
+class LLMRouter:
+    """
+    Routes completions across weighted model deployments.
+
+    Each request goes to a deployment picked at random with probability proportional to
+    ``weight / (ewma_ttft * (1 + in_flight))``, among deployments whose circuit is not open
+    and, preferably, which have a free concurrency slot. A timeout, rate limit or server
+    error before any output fails the request over to another deployment; once a stream has
+    produced output, errors are raised to the caller instead, so nothing is sent twice.
+    """
+
+    def __init__(self, llm_config: LLMConfig, deployments: Optional[List[Deployment]] = None):
+        self.config = llm_config
+        deployments = deployments if deployments is not None else parse_deployments(llm_config)
+        if not deployments:
+            raise ValueError("At least one LLM deployment is required")
+        self._states = [_DeploymentState(deployment, llm_config) for deployment in deployments]
+
+    @property
+    def deployments(self) -> List[Deployment]:
+        return [state.deployment for state in self._states]
+
+    async def acompletion(self, **params) -> Any:
+        """Non-streaming ``litellm.acompletion`` with failover"""
+        tried: Set[str] = set()
+        last_error: Optional[BaseException] = None
+        while True:
+            state, probe = self._choose(tried, last_error)
+            tried.add(state.name)
+            try:
+                async with state.slot(self.config.timeout):
+                    state.requests += 1
+                    response = await litellm.acompletion(**self._params(state, params))
+            except Exception as e:
+                last_error = self._on_error(state, e, tried)
+                continue
+            finally:
+                if probe:
+                    state.end_probe()
+            state.record_success()
+            return response
+
+    def completion(self, **params) -> Any:
+        """Blocking ``litellm.completion`` with failover (no concurrency limit)"""
+        tried: Set[str] = set()
+        last_error: Optional[BaseException] = None
+        while True:
+            state, probe = self._choose(tried, last_error)
+            tried.add(state.name)
+            state.requests += 1
+            try:
+                response = litellm.completion(**self._params(state, params))
+            except Exception as e:
+                last_error = self._on_error(state, e, tried)
+                continue
+            finally:
+                if probe:
+                    state.end_probe()
+            state.record_success()
+            return response
+
+    async def stream(self, **params) -> AsyncGenerator[Any, None]:
+        """
+        Streaming ``litellm.acompletion`` with failover until the first chunk arrives
+
+        The time to the first chunk is bounded by ``first_token_timeout`` and feeds the
+        deployment's latency estimate.
+        """
+        tried: Set[str] = set()
+        last_error: Optional[BaseException] = None
+        while True:
+            state, probe = self._choose(tried, last_error)
+            tried.add(state.name)
+            started = time.perf_counter()
+            yielded = False
+            try:
+                async with state.slot(self.config.timeout):
+                    state.requests += 1
+                    response = await litellm.acompletion(stream=True, **self._params(state, params))
+                    # Closed on every exit, so an abandoned attempt releases its connection
+                    async with _closing(response.__aiter__()) as iterator:
+                        try:
+                            first = await asyncio.wait_for(iterator.__anext__(), self.config.first_token_timeout)
+                        except StopAsyncIteration:
+                            state.record_success(time.perf_counter() - started)
+                            return
+                        state.record_success(time.perf_counter() - started)
+                        yielded = True
+                        yield first
+                        async for chunk in iterator:
+                            yield chunk
+                        return
+            except Exception as e:
+                if yielded:
+                    # Output already reached the caller; failing over would repeat it
+                    if is_transient_error(e):
+                        state.record_failure()
+                    raise
+                last_error = self._on_error(state, e, tried)
+            finally:
+                if probe:
+                    state.end_probe()
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        return [state.metrics().to_dict() for state in self._states]
+
+    def _choose(self, tried: Set[str], last_error: Optional[BaseException]) -> Tuple[_DeploymentState, bool]:
+        """Pick a deployment, and whether this request is its half-open probe"""
+        now = time.monotonic()
+        candidates = [state for state in self._states if state.name not in tried and state.available(now)]
+        if not candidates:
+            if last_error is not None:
+                raise last_error
+            retry_after = min((state.opened_until or now) - now for state in self._states)
+            raise NoDeploymentAvailableError(max(0.0, retry_after))
+
+        # Prefer deployments with a free slot; if all are busy, queue on the best one
+        free = [state for state in candidates if not state.saturated] or candidates
+        known = [state.ewma_ttft for state in free if state.ewma_ttft]
+        # Deployments without measurements get the best known latency, so they are explored
+        prior = min(known) if known else 1.0
+        weights = [
+            state.deployment.weight / (max(state.ewma_ttft or prior, 1e-3) * (1 + state.in_flight))
+            for state in free
+        ]
+        state = random.choices(free, weights=weights)[0] if len(free) > 1 else free[0]
+        return state, state.begin_probe(now)
+
+    def _on_error(self, state: _DeploymentState, error: Exception, tried: Set[str]) -> Exception:
+        """Record a failed attempt; re-raise it unless another deployment should be tried"""
+        if not is_transient_error(error):
+            # The request itself is at fault and another deployment would reject it too;
+            # the deployment did answer, so it counts as healthy
+            state.record_success()
+            raise error
+        if not isinstance(error, _SlotTimeoutError):
+            state.record_failure()
+        if any(other.name not in tried for other in self._states):
+            logger.warning(f"LLM deployment {state.name} failed ({type(error).__name__}), failing over")
+        return error
+
+    def _params(self, state: _DeploymentState, params: Dict[str, Any]) -> Dict[str, Any]:
+        deployment = state.deployment
+        # Connections come from the shared pooled client (litellm.aclient_session)
+        routed = {**params, "model": deployment.model, "timeout": llm_timeout(self.config)}
+        if deployment.api_base:
+            routed["api_base"] = deployment.api_base
+        if deployment.api_key:
+            routed["api_key"] = deployment.api_key
+        return routed
+
+
+_routers: Dict[Tuple[str, str], LLMRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_llm_router(llm_config: LLMConfig) -> LLMRouter:
+    """
+    Get the process-wide router for a configuration's deployments
+
+    Per-session LLMConfig copies with the same deployments share one router, so latency
+    estimates, breakers and concurrency limits cover all traffic to a deployment.
+    """
+    key = (llm_config.deployments or "", llm_config.model_name)
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = LLMRouter(llm_config)
+        return router
+
+
+def all_llm_routers() -> List[LLMRouter]:
+    with _routers_lock:
+        return list(_routers.values())
@@ -0,0 +1,11 @@
+"""
+Session module for the backend.
+"""
+from .store import (
+    SessionState,
+    SessionStore,
+    LRUSessionStore,
+    SessionSpill,
+    SQLiteSessionSpill,
+    create_session_store,
+)
@@ -0,0 +1,475 @@
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from loguru import logger
+from ..generator.llm import LLMInstance
+from ...configs.config import LLMConfig, SessionConfig
+from ... import database
+import asyncio
+import json
+import threading
+import time
+
+# Rough per-entry bookkeeping cost (dict, strings, list slots) used when sizing a session
+_MESSAGE_OVERHEAD_BYTES = 64
+_SESSION_OVERHEAD_BYTES = 1024
+
+
+def _has_credentials(deployments: Optional[str]) -> bool:
+    """Whether an ``LLMConfig.deployments`` string carries per-deployment API keys"""
+    raw = (deployments or "").strip()
+    if not raw.startswith("["):
+        return False
+    try:
+        return any(isinstance(entry, dict) and entry.get("api_key") for entry in json.loads(raw))
+    except ValueError:
+        # Unparseable, so it cannot be checked; never persist it
+        return True
+
+
+@dataclass
+class SessionState:
+    """Everything the agent keeps in memory for one chat session"""
+    session_id: str
+    llm: LLMInstance
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    last_access: float = field(default_factory=time.monotonic)
+    summary: str = ""
+    summarized_upto: int = 0
+    last_trace: Optional[Any] = field(default=None, repr=False, compare=False)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+    # Number of turns running against this state; the store does not evict it while nonzero
+    active_turns: int = field(default=0, repr=False, compare=False)
+
+    @property
+    def in_use(self) -> bool:
+        return self.active_turns > 0 or self.lock.locked()
+
+    def size_bytes(self) -> int:
+        """Approximate memory footprint of the session"""
+        size = _SESSION_OVERHEAD_BYTES
+        for message in self.messages:
+            size += _MESSAGE_OVERHEAD_BYTES + len(message.get("content") or "")
+        return size + len(self.summary)
+
+    def to_record(self) -> Dict[str, Any]:
+        """Serialize the session for the spill tier (credentials are never written to disk)"""
+        config = asdict(self.llm.config)
+        config.pop("api_key", None)
+        if _has_credentials(config.get("deployments")):
+            # Like the top-level key, keyed deployments are taken from the environment on load
+            config.pop("deployments")
+        return {
+            "config": config,
+            "messages": list(self.messages),
+            "summary": self.summary,
+            "summarized_upto": self.summarized_upto
+        }
+
+    @classmethod
+    def from_record(cls, session_id: str, record: Dict[str, Any]) -> "SessionState":
+        """Rebuild a session from a spilled record"""
+        return cls(
+            session_id=session_id,
+            llm=LLMInstance(LLMConfig(**record["config"])),
+            messages=list(record["messages"]),
+            summary=record.get("summary", ""),
+            summarized_upto=record.get("summarized_upto", 0)
+        )
+
+
+@dataclass
+class SessionStoreMetrics:
+    """Counters exposed by the session store"""
+    hits: int = 0
+    misses: int = 0
+    evictions_lru: int = 0
+    evictions_ttl: int = 0
+    evictions_bytes: int = 0
+    spills: int = 0
+    rehydrations: int = 0
+    sessions: int = 0
+    bytes: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class SessionSpill:
+    """Disk tier for evicted sessions"""
+
+    async def save(self, state: SessionState):
+        raise NotImplementedError
+
+    async def load(self, session_id: str) -> Optional[SessionState]:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str):
+        raise NotImplementedError
+
+    async def purge(self, older_than: datetime) -> int:
+        return 0
+
+
+class SQLiteSessionSpill(SessionSpill):
+    """Spill tier backed by the application SQLite database"""
+
+    async def save(self, state: SessionState):
+        record = state.to_record()
+        await database.save_session_state(
+            state.session_id,
+            record["config"],
+            record["messages"],
+            summary=record["summary"],
+            summarized_upto=record["summarized_upto"]
+        )
+
+    async def load(self, session_id: str) -> Optional[SessionState]:
+        record = await database.load_session_state(session_id)
+        if record is None:
+            return None
+        return SessionState.from_record(session_id, record)
+
+    async def delete(self, session_id: str):
+        await database.delete_session_state(session_id)
+
+    async def purge(self, older_than: datetime) -> int:
+        return await database.purge_session_state(older_than)
+
+
+class SessionStore:
+    """Interface for storing chat sessions"""
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        raise NotImplementedError
+
+    async def put(self, state: SessionState):
+        raise NotImplementedError
+
+    async def update(self, state: SessionState):
+        """Re-account a session after its contents changed"""
+        raise NotImplementedError
+
+    async def get_or_create(
+        self,
+        session_id: str,
+        factory: Optional[Callable[[], SessionState]] = None,
+        pin: bool = False
+    ) -> Optional[SessionState]:
+        raise NotImplementedError
+
+    def unpin(self, state: SessionState):
+        """Release a session obtained with ``pin=True``"""
+        state.active_turns = max(0, state.active_turns - 1)
+
+    async def remove(self, session_id: str):
+        raise NotImplementedError
+
+    def start(self):
+        """Start background maintenance, if the store has any"""
+
+    async def stop(self):
+        """Stop background maintenance"""
+
+    def metrics(self) -> Dict[str, int]:
+        return {}
+
+
+class LRUSessionStore(SessionStore):
+    """
+    Bounded in-memory session store with LRU and idle-TTL eviction.
+
+    Sessions are evicted when they sit idle for longer than ``idle_ttl`` seconds or when the
+    store exceeds ``max_sessions`` / ``max_bytes``. If a spill tier is configured, evicted
+    sessions are written to it and rehydrated transparently on the next ``get``. Once
+    started, a background task sweeps idle sessions every ``sweep_interval`` seconds, so
+    they expire even when no new session arrives.
+
+    Sessions that a turn is running against are never evicted. An evicted session stays
+    reachable until its spill has been written: a ``get`` in the meantime takes it back
+    instead of loading an older copy, serialized with the save by a per-session lock.
+    """
+
+    def __init__(self, config: Optional[SessionConfig] = None, spill: Optional[SessionSpill] = None):
+        self.config = config if config is not None else SessionConfig()
+        self.spill = spill
+        self._entries: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = SessionStoreMetrics()
+        self._last_purge = time.monotonic()
+        # Per-session locks serializing misses, spills and removals, with their waiter counts
+        self._pending: Dict[str, asyncio.Lock] = {}
+        self._pending_users: Dict[str, int] = {}
+        # Evicted sessions whose spill has not been written yet
+        self._spilling: Dict[str, SessionState] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+        logger.info(
+            f"Initialized LRUSessionStore (max_sessions={self.config.max_sessions}, "
+            f"max_bytes={self.config.max_bytes}, idle_ttl={self.config.idle_ttl}s, "
+            f"spill={'on' if spill else 'off'})"
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        """
+        Get a session, rehydrating it from the spill tier if it was evicted
+
+        Args:
+            session_id: Unique identifier for the session
+
+        Returns:
+            The session state, or None if the session is unknown
+        """
+        return await self.get_or_create(session_id)
+
+    async def get_or_create(
+        self,
+        session_id: str,
+        factory: Optional[Callable[[], SessionState]] = None,
+        pin: bool = False
+    ) -> Optional[SessionState]:
+        """
+        Get a session, rehydrating it from the spill tier or creating it with ``factory``
+
+        Concurrent misses for the same session are serialized so that only one state object
+        is ever live for a given session id. With ``pin`` the session is held in memory
+        until it is released with ``unpin``.
+        """
+        state = self._lookup(session_id, pin)
+        if state is not None:
+            return state
+
+        evicted: List[SessionState] = []
+        async with self._single_flight(session_id):
+            state = self._lookup(session_id, pin)
+            if state is not None:
+                return state
+
+            self._metrics.misses += 1
+            with self._lock:
+                state = self._spilling.pop(session_id, None)
+            if state is not None:
+                logger.info(f"Reclaimed session {session_id} before it was spilled")
+            elif self.spill is not None:
+                state = await self.spill.load(session_id)
+                if state is not None:
+                    logger.info(f"Rehydrated session {session_id} from spill tier")
+                    self._metrics.rehydrations += 1
+                    await self.spill.delete(session_id)
+
+            if state is None and factory is not None:
+                state = factory()
+            if state is not None:
+                evicted = self._insert(state, pin)
+
+        # Spilling waits on the evicted sessions' locks, so it happens after ours is released
+        await self._spill(evicted)
+        await self._maybe_purge_spill()
+        return state
+
+    async def put(self, state: SessionState):
+        """Insert or replace a session and enforce the store budget"""
+        await self._spill(self._insert(state))
+        await self._maybe_purge_spill()
+
+    async def update(self, state: SessionState):
+        """Re-account a session after its messages changed"""
+        state.last_access = time.monotonic()
+        with self._lock:
+            if state.session_id not in self._entries:
+                return
+            self._entries.move_to_end(state.session_id)
+            self._account(state)
+            evicted = self._enforce_budget(keep=state.session_id)
+        await self._spill(evicted)
+
+    async def remove(self, session_id: str):
+        """Remove a session from memory and from the spill tier"""
+        async with self._single_flight(session_id):
+            with self._lock:
+                if session_id in self._entries:
+                    self._pop(session_id)
+                self._spilling.pop(session_id, None)
+            if self.spill is not None:
+                await self.spill.delete(session_id)
+
+    async def sweep(self) -> int:
+        """Evict every session that has been idle longer than the TTL"""
+        with self._lock:
+            evicted = self._expire(time.monotonic())
+        await self._spill(evicted)
+        await self._maybe_purge_spill()
+        return len(evicted)
+
+    def start(self):
+        if self._sweeper is not None and not self._sweeper.done():
+            return
+        if self.config.sweep_interval <= 0 or (self.config.idle_ttl <= 0 and self.spill is None):
+            return
+        self._sweeper = asyncio.ensure_future(self._sweep_periodically())
+
+    async def stop(self):
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
+
+    async def _sweep_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {str(e)}", exc_info=True)
+
+    def metrics(self) -> Dict[str, int]:
+        self._metrics.sessions = len(self._entries)
+        self._metrics.bytes = self._bytes
+        return self._metrics.to_dict()
+
+    @asynccontextmanager
+    async def _single_flight(self, session_id: str) -> AsyncIterator[None]:
+        lock = self._pending.setdefault(session_id, asyncio.Lock())
+        self._pending_users[session_id] = self._pending_users.get(session_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            # A released lock still has to be handed to its waiters, so only the last user drops it
+            self._pending_users[session_id] -= 1
+            if not self._pending_users[session_id]:
+                del self._pending_users[session_id]
+                del self._pending[session_id]
+
+    def _lookup(self, session_id: str, pin: bool = False) -> Optional[SessionState]:
+        with self._lock:
+            state = self._entries.get(session_id)
+            if state is not None:
+                self._entries.move_to_end(session_id)
+                state.last_access = time.monotonic()
+                if pin:
+                    state.active_turns += 1
+                self._metrics.hits += 1
+            return state
+
+    def _insert(self, state: SessionState, pin: bool = False) -> List[SessionState]:
+        """Make a session resident and return the sessions evicted to stay within budget"""
+        state.last_access = time.monotonic()
+        with self._lock:
+            if state.session_id in self._entries:
+                self._pop(state.session_id)
+            # A pending spill of an older state for this id is now stale
+            self._spilling.pop(state.session_id, None)
+            self._entries[state.session_id] = state
+            if pin:
+                state.active_turns += 1
+            self._account(state)
+            return self._enforce_budget(keep=state.session_id)
+
+    def _is_expired(self, state: SessionState, now: float) -> bool:
+        return self.config.idle_ttl > 0 and now - state.last_access > self.config.idle_ttl
+
+    def _account(self, state: SessionState):
+        size = state.size_bytes()
+        self._bytes += size - self._sizes.get(state.session_id, 0)
+        self._sizes[state.session_id] = size
+
+    def _pop(self, session_id: str) -> SessionState:
+        state = self._entries.pop(session_id)
+        self._bytes -= self._sizes.pop(session_id, 0)
+        return state
+
+    def _expire(self, now: float) -> List[SessionState]:
+        # Entries are kept in access order, so expired sessions are always at the front
+        evicted = []
+        for session_id, state in list(self._entries.items()):
+            if not self._is_expired(state, now):
+                break
+            if state.in_use:
+                continue
+            evicted.append(self._evict(session_id))
+            self._metrics.evictions_ttl += 1
+        return evicted
+
+    def _enforce_budget(self, keep: str) -> List[SessionState]:
+        evicted = self._expire(time.monotonic())
+        # Least recently used first, skipping the session being inserted and those in use
+        candidates = (
+            session_id for session_id, state in list(self._entries.items())
+            if session_id != keep and not state.in_use
+        )
+        while len(self._entries) > 1:
+            over_count = len(self._entries) > self.config.max_sessions
+            if not over_count and self._bytes <= self.config.max_bytes:
+                break
+            session_id = next(candidates, None)
+            if session_id is None:
+                break
+            evicted.append(self._evict(session_id))
+            if over_count:
+                self._metrics.evictions_lru += 1
+            else:
+                self._metrics.evictions_bytes += 1
+        return evicted
+
+    def _evict(self, session_id: str) -> SessionState:
+        state = self._pop(session_id)
+        if self.spill is not None:
+            self._spilling[session_id] = state
+        return state
+
+    async def _spill(self, evicted: List[SessionState]):
+        if not evicted:
+            return
+        logger.info(f"Evicted {len(evicted)} session(s) from memory")
+        if self.spill is None:
+            return
+        for state in evicted:
+            async with self._single_flight(state.session_id):
+                with self._lock:
+                    if self._spilling.get(state.session_id) is not state:
+                        # Taken back or removed before its turn to be written
+                        continue
+                try:
+                    await self.spill.save(state)
+                    self._metrics.spills += 1
+                except Exception as e:
+                    logger.error(f"Failed to spill session {state.session_id}: {str(e)}", exc_info=True)
+                finally:
+                    with self._lock:
+                        if self._spilling.get(state.session_id) is state:
+                            del self._spilling[state.session_id]
+
+    async def _maybe_purge_spill(self):
+        if self.spill is None or self.config.spill_ttl <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_purge < min(self.config.spill_ttl, max(self.config.idle_ttl, 60)):
+            return
+        self._last_purge = now
+        try:
+            purged = await self.spill.purge(datetime.utcnow() - timedelta(seconds=self.config.spill_ttl))
+            if purged:
+                logger.info(f"Purged {purged} stale spilled session(s)")
+        except Exception as e:
+            logger.error(f"Failed to purge spilled sessions: {str(e)}", exc_info=True)
+
+
+def create_session_store(config: Optional[SessionConfig] = None) -> SessionStore:
+    """Build the session store described by the configuration"""
+    config = config if config is not None else SessionConfig()
+    spill = SQLiteSessionSpill() if config.spill_to_disk else None
+    return LRUSessionStore(config, spill=spill)
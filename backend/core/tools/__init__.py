@@ -2,8 +2,11 @@
 Tools module for the backend.
 """
 from .search_tool import search_duckduckgo
+from .file_search_tool import search_files
 from .tool_registry import ToolRegistry
 
 def initialize_tools(tool_registry: ToolRegistry):
     """Initialize and register all available tools"""
-    tool_registry.register("search_duckduckgo", search_duckduckgo)
+    tool_registry.register("search_duckduckgo", search_duckduckgo, cache_ttl=tool_registry.config.cache_ttl)
+    # Not cached: a session's index changes whenever a file is uploaded
+    tool_registry.register("search_files", search_files)
@@ -0,0 +1,34 @@
+from typing import List, Dict, Any, Optional
+from loguru import logger
+from ..files import get_file_index
+
+
+async def search_files(query: str, max_results: int = 5, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Search the files uploaded to the current session, combining semantic similarity with
+    keyword (BM25) matching so exact identifiers like error codes are found too
+    
+    Args:
+        query: What to look for
+        max_results: Maximum number of passages to return (default: 5)
+        session_id: Supplied by the agent, not by the model
+        
+    Returns:
+        List of matching passages, each containing filename, text and score
+    """
+    if not session_id:
+        return []
+    try:
+        matches = await get_file_index().search(session_id, query, max_results)
+    except Exception as e:
+        logger.error(f"Error in file search: {str(e)}", exc_info=True)
+        raise e
+    return [
+        {
+            'filename': match['filename'],
+            'file_id': match['file_id'],
+            'text': match['text'],
+            'score': round(match['score'], 4)
+        }
+        for match in matches
+    ]
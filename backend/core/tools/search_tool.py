@@ -1,6 +1,56 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 from duckduckgo_search import DDGS
 from loguru import logger
+from ...configs.config import config
+import asyncio
+import threading
+
+# DDGS is a blocking HTTP client, so searches run on a dedicated, sized pool instead of the event loop
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+# One client per worker thread: DDGS keeps a session but is not documented as thread-safe
+_clients = threading.local()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.tools.search_workers,
+                    thread_name_prefix="ddg-search"
+                )
+    return _executor
+
+
+def _get_client() -> DDGS:
+    client = getattr(_clients, "client", None)
+    if client is None:
+        client = _clients.client = DDGS()
+    return client
+
+
+def _search_sync(query: str, max_results: int) -> List[Dict[str, Any]]:
+    results = []
+    for r in _get_client().text(query, max_results=max_results) or []:
+        results.append({
+            'title': r.get('title', ''),
+            'link': r.get('href') or r.get('link', ''),
+            'snippet': r.get('body', '')
+        })
+    return results
+
+
+def shutdown_search_pool():
+    """Stop the search worker pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
 
 async def search_duckduckgo(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
     """
@@ -14,15 +64,8 @@ async def search_duckduckgo(query: str, max_results: int = 5) -> List[Dict[str,
         List of search results, each containing title, link, and snippet
     """
     try:
-        with DDGS() as ddgs:
-            results = []
-            for r in ddgs.text(query, max_results=max_results):
-                results.append({
-                    'title': r['title'],
-                    'link': r['link'],
-                    'snippet': r['body']
-                })
-            return results
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _search_sync, query, max_results)
     except Exception as e:
         logger.error(f"Error in DuckDuckGo search: {str(e)}", exc_info=True)
-        raise e 
\ No newline at end of file
+        raise e
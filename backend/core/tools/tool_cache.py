@@ -0,0 +1,153 @@
+from typing import Dict, Any, Awaitable, Callable, Set
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from loguru import logger
+from ... import database
+import asyncio
+import json
+import time
+
+
+def normalize_parameters(parameters: Dict[str, Any]) -> str:
+    """
+    Canonical form of tool parameters used as a cache key
+
+    String values are case-folded and whitespace-collapsed, so "  Python  3.12" and
+    "python 3.12" share one entry. Keys are sorted.
+    """
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.split()).casefold()
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        return value
+
+    return json.dumps(normalize(parameters), sort_keys=True, default=str)
+
+
+@dataclass
+class ToolCacheMetrics:
+    """Counters exposed by the tool cache"""
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    persistent_hits: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class ToolCache:
+    """
+    TTL + LRU cache for tool results with single-flight deduplication.
+
+    Concurrent calls with the same key share one upstream execution. Results can optionally
+    be written through to SQLite so they survive restarts; errors are never cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, persist: bool = False):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._metrics = ToolCacheMetrics()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_run(self, key: str, ttl: float, runner: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for ``key`` or run ``runner`` to produce it
+
+        Args:
+            key: Cache key (tool name plus normalized parameters)
+            ttl: Time to live of a fresh result in seconds
+            runner: Coroutine factory executing the tool
+
+        Returns:
+            The tool result. Cached results are shared between callers and must not be mutated.
+        """
+        found, value = self._lookup(key)
+        if found:
+            self._metrics.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._metrics.coalesced += 1
+            return await asyncio.shield(task)
+
+        self._metrics.misses += 1
+        task = asyncio.ensure_future(self._fill(key, ttl, runner))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        # Shielded so that a caller timing out does not cancel the run other callers wait on
+        return await asyncio.shield(task)
+
+    def metrics(self) -> Dict[str, int]:
+        self._metrics.entries = len(self._entries)
+        return self._metrics.to_dict()
+
+    def clear(self):
+        self._entries.clear()
+
+    def _finished(self, key: str, task: asyncio.Task):
+        # Only the run itself retires its in-flight entry, never one of its waiters
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieve the error here: if every waiter was cancelled, nobody else will
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("Tool run for {} failed: {}", key, task.exception())
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self._metrics.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _store(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._metrics.evictions += 1
+
+    async def _fill(self, key: str, ttl: float, runner: Callable[[], Awaitable[Any]]) -> Any:
+        if self.persist:
+            try:
+                record = await database.load_tool_cache_entry(key)
+                if record is not None and record["expires_at"] >= time.time():
+                    self._metrics.persistent_hits += 1
+                    self._store(key, record["value"], record["expires_at"])
+                    return record["value"]
+            except Exception as e:
+                logger.error(f"Failed to read persistent tool cache: {str(e)}", exc_info=True)
+
+        value = await runner()
+        expires_at = time.time() + ttl
+        self._store(key, value, expires_at)
+
+        if self.persist:
+            # Write-through happens in the background, off the tool's response path
+            task = asyncio.ensure_future(self._persist(key, value, expires_at))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return value
+
+    async def _persist(self, key: str, value: Any, expires_at: float):
+        try:
+            await database.save_tool_cache_entry(key, value, expires_at)
+        except Exception as e:
+            logger.error(f"Failed to write persistent tool cache: {str(e)}", exc_info=True)
@@ -1,59 +1,239 @@
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, Callable, List, Optional, Set
+from dataclasses import dataclass
 import inspect
 import asyncio
+import time
 from loguru import logger
+from ...configs.config import ToolConfig
+from .tool_cache import ToolCache, normalize_parameters
+from ...log import preview
+from ...metrics import TOOL_LATENCY
+
+
+@dataclass
+class ToolResult:
+    """Outcome of one tool call executed by ToolRegistry.run_tools"""
+    tool_name: str
+    parameters: Dict[str, Any]
+    result: Any = None
+    error: Optional[BaseException] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def timed_out(self) -> bool:
+        return isinstance(self.error, asyncio.TimeoutError)
+
+
+class _BlockingWatchdog:
+    """
+    Awaitable wrapper that times every synchronous step of a tool coroutine.
+
+    While a coroutine step runs nothing else on the event loop can, so a long step means the
+    "async" tool is really doing blocking work and stalling every other request.
+    """
+
+    def __init__(self, coro, on_step: Callable[[float], None]):
+        self._coro = coro
+        self._on_step = on_step
+
+    def __await__(self):
+        coro = self._coro
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                yielded = coro.throw(error) if error is not None else coro.send(value)
+            except StopIteration as stop:
+                self._on_step(time.perf_counter() - started)
+                return stop.value
+            except BaseException:
+                self._on_step(time.perf_counter() - started)
+                raise
+            self._on_step(time.perf_counter() - started)
+            try:
+                value, error = (yield yielded), None
+            except GeneratorExit:
+                coro.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
 
 
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, config: Optional[ToolConfig] = None):
         self.tools: Dict[str, Callable] = {}
+        self.config = config if config is not None else ToolConfig()
+        # Longest single event-loop block (seconds) observed per async tool that exceeded the threshold
+        self.blocking_tools: Dict[str, float] = {}
+        self.cache = ToolCache(max_entries=self.config.cache_max_entries, persist=self.config.cache_persist)
+        self._cache_ttls: Dict[str, float] = {}
+        self._defaults: Dict[str, Dict[str, Any]] = {}
+        # Tools taking a session_id parameter get it from the agent rather than from the model
+        self._session_tools: Set[str] = set()
+        # Decided once at registration instead of on every call
+        self._async_tools: Set[str] = set()
         logger.info("Initialized ToolRegistry")
         
-    def register(self, name: str, func: Callable):
+    def register(self, name: str, func: Callable, cache_ttl: Optional[float] = None):
         """
         Register a new tool function
+        
+        Args:
+            name: Name the LLM uses to call the tool
+            func: Sync or async callable implementing the tool
+            cache_ttl: Cache results for this many seconds (default: not cached)
         """
         if not callable(func):
             logger.error(f"Failed to register tool {name}: not callable")
             raise ValueError(f"Tool {name} must be callable")
         
+        signature = inspect.signature(func)
         logger.info(f"Registering tool: {name}")
-        logger.debug(f"Tool function: {func.__name__}, signature: {inspect.signature(func)}")
+        logger.debug("Tool function: {}, signature: {}", func.__name__, signature)
         self.tools[name] = func
+        # Defaults are folded into cache keys so that omitted and explicit defaults share an entry
+        self._defaults[name] = {
+            param.name: param.default
+            for param in signature.parameters.values()
+            if param.default is not inspect.Parameter.empty
+        }
+        if cache_ttl:
+            self._cache_ttls[name] = cache_ttl
+        else:
+            self._cache_ttls.pop(name, None)
+        if "session_id" in signature.parameters:
+            self._session_tools.add(name)
+        else:
+            self._session_tools.discard(name)
+        if inspect.iscoroutinefunction(func):
+            self._async_tools.add(name)
+        else:
+            self._async_tools.discard(name)
     
-    async def run_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Any:
+    async def run_tool(self, tool_name: str, parameters: Dict[str, Any], session_id: Optional[str] = None) -> Any:
         """
         Run a registered tool with the given parameters
+        
+        Args:
+            tool_name: Name of the registered tool
+            parameters: Arguments chosen by the model
+            session_id: Session the call belongs to, passed to tools that accept it
         """
-        logger.info(f"Attempting to run tool: {tool_name}")
-        logger.debug(f"Tool parameters: {parameters}")
+        logger.opt(lazy=True).debug("Running tool {} with {}", lambda: tool_name, lambda: preview(parameters))
         
         if tool_name not in self.tools:
             logger.error(f"Tool {tool_name} not found in registry")
             raise ValueError(f"Tool {tool_name} not found")
             
         tool = self.tools[tool_name]
-        logger.debug(f"Found tool function: {tool.__name__}")
+        if tool_name in self._session_tools:
+            parameters = {**parameters, "session_id": session_id}
         
+        cache_ttl = self._cache_ttls.get(tool_name)
+        started = time.perf_counter()
+        status = "cancelled"
+        try:
+            if cache_ttl:
+                key = f"{tool_name}:{normalize_parameters({**self._defaults[tool_name], **parameters})}"
+                result = await self.cache.get_or_run(key, cache_ttl, lambda: self._execute(tool_name, tool, parameters))
+            else:
+                result = await self._execute(tool_name, tool, parameters)
+            status = "ok"
+            return result
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - started, tool=tool_name, status=status)
+    
+    async def _execute(self, tool_name: str, tool: Callable, parameters: Dict[str, Any]) -> Any:
+        """Execute a tool, off the event loop if it is synchronous"""
         try:
             # Check if tool is async
-            if inspect.iscoroutinefunction(tool):
-                logger.debug(f"Executing async tool: {tool_name}")
-                result = await tool(**parameters)
+            if tool_name in self._async_tools:
+                logger.debug("Executing async tool: {}", tool_name)
+                result = await self._watch(tool_name, tool(**parameters))
             else:
                 # Run sync function in thread pool
-                logger.debug(f"Executing sync tool: {tool_name} in thread pool")
+                logger.debug("Executing sync tool: {} in thread pool", tool_name)
                 loop = asyncio.get_event_loop()
                 result = await loop.run_in_executor(None, lambda: tool(**parameters))
             
-            logger.info(f"Tool {tool_name} executed successfully")
-            logger.debug(f"Tool result: {result}")
+            logger.opt(lazy=True).debug("Tool {} returned {}", lambda: tool_name, lambda: preview(result))
             return result
             
         except Exception as e:
             logger.error(f"Error executing tool {tool_name}: {str(e)}", exc_info=True)
             raise
     
+    def _watch(self, tool_name: str, coro) -> _BlockingWatchdog:
+        """Wrap an async tool call so that blocking steps are detected and reported"""
+        threshold = self.config.block_threshold_ms / 1000
+        
+        def on_step(duration: float):
+            if threshold <= 0 or duration < threshold:
+                return
+            if duration > self.blocking_tools.get(tool_name, 0.0):
+                self.blocking_tools[tool_name] = duration
+            logger.warning(
+                f"Async tool {tool_name} blocked the event loop for {duration * 1000:.0f}ms; "
+                "move its blocking work to a thread pool"
+            )
+        
+        return _BlockingWatchdog(coro, on_step)
+    
+    async def run_tools(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        session_id: Optional[str] = None
+    ) -> List[ToolResult]:
+        """
+        Run several tool calls concurrently
+        
+        Args:
+            tool_calls: Calls to run, each with a "name" and "parameters"
+            max_concurrency: Maximum number of calls in flight (default: config.max_concurrency)
+            timeout: Per-call timeout in seconds (default: config.timeout)
+            session_id: Session the calls belong to, passed to tools that accept it
+            
+        Returns:
+            One ToolResult per call, in the order of ``tool_calls``. A failing or timed out
+            call is reported in its result and does not affect the others.
+        """
+        max_concurrency = max_concurrency or self.config.max_concurrency
+        timeout = timeout if timeout is not None else self.config.timeout
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def run_one(tool_call: Dict[str, Any]) -> ToolResult:
+            outcome = ToolResult(tool_name=tool_call["name"], parameters=tool_call["parameters"])
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    outcome.result = await asyncio.wait_for(
+                        self.run_tool(outcome.tool_name, outcome.parameters, session_id=session_id),
+                        timeout=timeout if timeout > 0 else None
+                    )
+                except asyncio.TimeoutError as e:
+                    logger.error(f"Tool {outcome.tool_name} timed out after {timeout}s")
+                    outcome.error = e
+                except Exception as e:
+                    outcome.error = e
+                outcome.latency = time.perf_counter() - started
+            return outcome
+        
+        logger.info(f"Running {len(tool_calls)} tool call(s) with concurrency {max_concurrency}")
+        return list(await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls)))
+    
+    def cache_metrics(self) -> Dict[str, int]:
+        """Get hit/miss/coalesce counters of the tool result cache"""
+        return self.cache.metrics()
+    
     def get_tool_names(self) -> list[str]:
         """Get list of registered tool names"""
         names = list(self.tools.keys())
@@ -0,0 +1,4 @@
+"""
+Vector storage module for the backend.
+"""
+from .store import VectorStore, Segment
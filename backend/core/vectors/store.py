@@ -0,0 +1,322 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from loguru import logger
+import numpy as np
+import copy
+import json
+import os
+import threading
+
+_MANIFEST = "manifest.json"
+
+
+@dataclass
+class VectorStoreStats:
+    """Size and fragmentation of a vector store"""
+    dim: int = 0
+    segments: int = 0
+    vectors: int = 0
+    live: int = 0
+    deleted: int = 0
+    bytes: int = 0
+    compactions: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class Segment:
+    """
+    One fixed-capacity block of the store, backed by three memory-mapped files.
+
+    ``<name>.f32`` holds unit-length float32 rows, ``<name>.ids`` their int64 ids (ascending,
+    since ids are assigned in append order) and ``<name>.del`` a tombstone flag per row. Rows
+    below ``count`` are written exactly once; only tombstones change afterwards.
+    """
+
+    def __init__(self, directory: Path, name: str, dim: int, capacity: int, count: int = 0, create: bool = False):
+        self.directory = directory
+        self.name = name
+        self.dim = dim
+        self.capacity = capacity
+        self.count = count
+        mode = "w+" if create else "r+"
+        self.vectors = np.memmap(directory / f"{name}.f32", dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self.ids = np.memmap(directory / f"{name}.ids", dtype=np.int64, mode=mode, shape=(capacity,))
+        self.deleted = np.memmap(directory / f"{name}.del", dtype=np.bool_, mode=mode, shape=(capacity,))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def live(self) -> int:
+        return self.count - int(np.count_nonzero(self.deleted[:self.count]))
+
+    @property
+    def first_id(self) -> int:
+        return int(self.ids[0]) if self.count else -1
+
+    @property
+    def last_id(self) -> int:
+        return int(self.ids[self.count - 1]) if self.count else -1
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Rows holding the given ids (ids not in this segment are skipped)"""
+        if not self.count or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        stored = self.ids[:self.count]
+        rows = np.searchsorted(stored, ids)
+        rows = rows[rows < self.count]
+        return rows[np.isin(stored[rows], ids)]
+
+    def extended(self, rows: int) -> "Segment":
+        """A new descriptor covering ``rows`` more rows, sharing this segment's mapped files"""
+        extended = copy.copy(self)
+        extended.count = self.count + rows
+        return extended
+
+    def flush(self):
+        self.vectors.flush()
+        self.ids.flush()
+        self.deleted.flush()
+
+    def files(self) -> List[Path]:
+        return [self.directory / f"{self.name}{suffix}" for suffix in (".f32", ".ids", ".del")]
+
+    def nbytes(self) -> int:
+        return self.capacity * (self.dim * 4 + 8 + 1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorStore:
+    """
+    Append-only, memory-mapped store of float32 embeddings with cosine top-k search.
+
+    Vectors are appended into fixed-capacity segment files, so adding data never rewrites
+    what is already on disk and the corpus only has to fit on disk, not in RAM. Deletions set
+    tombstones; ``compact()`` rewrites segments whose dead fraction exceeds a threshold. A
+    small JSON manifest, replaced atomically, records which segments exist and how full they are.
+
+    Writers are serialized by a lock. Searches work on an immutable snapshot of the segment
+    list and never wait for writers: appends publish new segment descriptors instead of
+    changing the row counts of published ones. Tombstones are shared, so a delete is visible
+    to searches already running.
+    """
+
+    def __init__(self, directory: Union[str, Path], dim: Optional[int] = None, segment_capacity: int = 65536):
+        self.directory = Path(directory)
+        self.segment_capacity = segment_capacity
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._segments: Tuple[Segment, ...] = ()
+        self._next_id = 0
+        self._next_segment = 0
+        self._compactions = 0
+        self._open()
+
+    def __len__(self) -> int:
+        return sum(segment.live for segment in self._segments)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Append vectors (normalized on the way in)
+
+        Returns:
+            The ids assigned to the new vectors, in order
+        """
+        vectors = np.atleast_2d(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+            vectors = _normalize(vectors)
+            ids = np.arange(self._next_id, self._next_id + len(vectors), dtype=np.int64)
+            segments = list(self._segments)
+            written = 0
+            while written < len(vectors):
+                if not segments or segments[-1].full:
+                    segments.append(self._new_segment())
+                segment = segments[-1]
+                take = min(segment.capacity - segment.count, len(vectors) - written)
+                segment.vectors[segment.count:segment.count + take] = vectors[written:written + take]
+                segment.ids[segment.count:segment.count + take] = ids[written:written + take]
+                segment.deleted[segment.count:segment.count + take] = False
+                segment.flush()
+                # Replaced rather than bumped in place: searches holding the previous
+                # snapshot keep the row count they started with
+                segments[-1] = segment.extended(take)
+                written += take
+            self._next_id += len(vectors)
+            self._commit(segments)
+            return ids
+
+    def delete(self, ids: Sequence[int]) -> int:
+        """Tombstone the given ids; returns how many live vectors were deleted"""
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        deleted = 0
+        with self._lock:
+            for segment in self._segments:
+                if not segment.count or not len(ids):
+                    continue
+                candidates = ids[(ids >= segment.first_id) & (ids <= segment.last_id)]
+                rows = segment.rows_of(candidates)
+                rows = rows[~segment.deleted[rows]]
+                if len(rows):
+                    segment.deleted[rows] = True
+                    segment.deleted.flush()
+                    deleted += len(rows)
+        return deleted
+
+    def live_ids(self) -> Iterator[int]:
+        for segment in self._segments:
+            live = ~segment.deleted[:segment.count]
+            yield from segment.ids[:segment.count][live].tolist()
+
+    def search(self, queries: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cosine top-k search for a batch of queries
+
+        Args:
+            queries: One query vector or a (n, dim) batch
+            k: Number of neighbours per query
+
+        Returns:
+            ``(ids, scores)``, both shaped (n, k) and sorted by descending score. Slots beyond
+            the number of live vectors hold id -1 and score -inf.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        k = max(0, k)
+        segments = self._segments
+        n = len(queries)
+        best_ids = np.full((n, k), -1, dtype=np.int64)
+        best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        if k <= 0 or not segments:
+            return best_ids, best_scores
+
+        for segment in segments:
+            if not segment.count:
+                continue
+            # (n, count): one matrix product scores the whole batch against the segment
+            scores = queries @ segment.vectors[:segment.count].T
+            deleted = segment.deleted[:segment.count]
+            if deleted.any():
+                scores[:, deleted] = -np.inf
+            take = min(k, segment.count)
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            candidate_ids = np.concatenate([best_ids, segment.ids[:segment.count][top]], axis=1)
+            keep = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+            best_ids = np.take_along_axis(candidate_ids, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        best_ids[~np.isfinite(best_scores)] = -1
+        return best_ids, best_scores
+
+    def compact(self, threshold: float = 0.3) -> int:
+        """
+        Rewrite segments whose fraction of deleted rows exceeds ``threshold``
+
+        Live rows of all selected segments are packed, in id order, into as few new segments
+        as possible; the active (last) segment is left alone.
+
+        Returns:
+            Number of segments rewritten
+        """
+        with self._lock:
+            sealed = list(self._segments[:-1])
+            selected = [
+                segment for segment in sealed
+                if segment.count and (segment.count - segment.live) / segment.count > threshold
+            ]
+            if not selected:
+                return 0
+
+            rewritten: List[Segment] = []
+            for segment in selected:
+                live = ~segment.deleted[:segment.count]
+                vectors = segment.vectors[:segment.count][live]
+                ids = segment.ids[:segment.count][live]
+                written = 0
+                while written < len(ids):
+                    if not rewritten or rewritten[-1].full:
+                        rewritten.append(self._new_segment())
+                    target = rewritten[-1]
+                    take = min(target.capacity - target.count, len(ids) - written)
+                    target.vectors[target.count:target.count + take] = vectors[written:written + take]
+                    target.ids[target.count:target.count + take] = ids[written:written + take]
+                    target.count += take
+                    written += take
+            for target in rewritten:
+                target.flush()
+
+            # The active segment stays last, since appends only ever go to the last segment
+            selected_names = {segment.name for segment in selected}
+            kept = [segment for segment in sealed if segment.name not in selected_names]
+            self._commit(kept + rewritten + [self._segments[-1]])
+            self._compactions += 1
+
+        for segment in selected:
+            for path in segment.files():
+                path.unlink(missing_ok=True)
+        logger.info(f"Compacted {len(selected)} vector segments into {len(rewritten)} in {self.directory}")
+        return len(selected)
+
+    def stats(self) -> Dict[str, int]:
+        segments = self._segments
+        vectors = sum(segment.count for segment in segments)
+        live = sum(segment.live for segment in segments)
+        return VectorStoreStats(
+            dim=self.dim or 0,
+            segments=len(segments),
+            vectors=vectors,
+            live=live,
+            deleted=vectors - live,
+            bytes=sum(segment.nbytes() for segment in segments),
+            compactions=self._compactions
+        ).to_dict()
+
+    def _new_segment(self) -> Segment:
+        name = f"segment-{self._next_segment:06d}"
+        self._next_segment += 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return Segment(self.directory, name, self.dim, self.segment_capacity, create=True)
+
+    def _commit(self, segments: List[Segment]):
+        manifest = {
+            "dim": self.dim,
+            "next_id": self._next_id,
+            "next_segment": self._next_segment,
+            "segments": [
+                {"name": segment.name, "capacity": segment.capacity, "count": segment.count}
+                for segment in segments
+            ]
+        }
+        temp = self.directory / f".{_MANIFEST}.tmp"
+        temp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(temp, self.directory / _MANIFEST)
+        self._segments = tuple(segments)
+
+    def _open(self):
+        manifest_path = self.directory / _MANIFEST
+        if not manifest_path.exists():
+            return
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        self.dim = manifest["dim"]
+        self._next_id = manifest["next_id"]
+        self._next_segment = manifest["next_segment"]
+        self._segments = tuple(
+            Segment(self.directory, entry["name"], self.dim, entry["capacity"], count=entry["count"])
+            for entry in manifest["segments"]
+        )
@@ -1,63 +1,452 @@
 import sqlite3
 from pathlib import Path
-from passlib.context import CryptContext
+from typing import Optional, List, Dict, Any, Tuple
 from uuid import uuid4
 from datetime import datetime
-import aiosqlite
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .configs.config import config as app_config
+from .db_pool import DatabasePool
+from .passwords import get_password_hasher
+import base64
+import json
+import time
 
 # Database setup
 DB_PATH = Path("backend/database.db")
 
-async def get_db():
-    return await aiosqlite.connect(str(DB_PATH))
+_pool: Optional[DatabasePool] = None
+
+async def open_pool() -> DatabasePool:
+    """Open the process-wide connection pool on DB_PATH"""
+    global _pool
+    if _pool is None or not _pool.is_open:
+        _pool = DatabasePool(DB_PATH, app_config.database)
+        await _pool.open()
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def get_pool() -> DatabasePool:
+    if _pool is None or not _pool.is_open:
+        raise RuntimeError("Database pool is not open; call init_db() first")
+    return _pool
+
+async def _add_missing_columns(conn, table: str, columns: Dict[str, str]):
+    """Bring tables created by older versions up to date"""
+    async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
 
 async def init_db():
-    conn = await get_db()
-    
-    # Create users table
-    await conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            hashed_password TEXT NOT NULL,
-            created_at TIMESTAMP NOT NULL
-        )
-    ''')
-    
-    await conn.commit()
-    await conn.close()
+    pool = await open_pool()
+
+    async with pool.writer() as conn:
+        # Create users table
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                username TEXT UNIQUE NOT NULL,
+                hashed_password TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+
+        # Create spilled session state table
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS session_state (
+                session_id TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                messages TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_upto INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP NOT NULL
+            )
+        ''')
+
+        # Create chat history tables
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS tool_calls (
+                id TEXT PRIMARY KEY,
+                message_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                tool_name TEXT NOT NULL,
+                parameters TEXT NOT NULL,
+                result TEXT,
+                status TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                uploaded_at TIMESTAMP NOT NULL,
+                content_type TEXT NOT NULL DEFAULT 'application/octet-stream',
+                size INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT NOT NULL DEFAULT ''
+            )
+        ''')
+        await _add_missing_columns(conn, "files", {
+            "content_type": "TEXT NOT NULL DEFAULT 'application/octet-stream'",
+            "size": "INTEGER NOT NULL DEFAULT 0",
+            "sha256": "TEXT NOT NULL DEFAULT ''",
+        })
+        # History is always read newest-first per session or per user, so these indexes
+        # (which implicitly end in rowid) serve the keyset pagination queries directly
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions (user_id, created_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages (session_id, created_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_calls_session_created ON tool_calls (session_id, created_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_calls_message ON tool_calls (message_id)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_files_session_uploaded ON files (session_id, uploaded_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256)")
+
+        # Create persistent tool result cache table
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS tool_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
 
 async def create_user(username: str, password: str):
-    conn = await get_db()
-    
     user_id = str(uuid4())
-    hashed_password = pwd_context.hash(password)
+    hashed_password = await get_password_hasher().hash(password)
     created_at = datetime.utcnow()
     
     try:
-        await conn.execute(
-            "INSERT INTO users (id, username, hashed_password, created_at) VALUES (?, ?, ?, ?)",
-            (user_id, username, hashed_password, created_at)
-        )
-        await conn.commit()
+        async with get_pool().writer() as conn:
+            await conn.execute(
+                "INSERT INTO users (id, username, hashed_password, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, username, hashed_password, created_at)
+            )
         return user_id
     except sqlite3.IntegrityError:
         return None
-    finally:
-        await conn.close()
 
 async def get_user(username: str):
-    conn = await get_db()
-    
-    async with conn.execute("SELECT * FROM users WHERE username = ?", (username,)) as cursor:
-        user = await cursor.fetchone()
-    
-    await conn.close()
+    async with get_pool().reader() as conn:
+        async with conn.execute("SELECT * FROM users WHERE username = ?", (username,)) as cursor:
+            user = await cursor.fetchone()
     
     return dict(user) if user else None
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password) 
\ No newline at end of file
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username)
+    if not user:
+        return None
+
+    valid, new_hash = await get_password_hasher().verify(password, user["hashed_password"])
+    if not valid:
+        return None
+    if new_hash is not None:
+        # Stored with outdated cost parameters; upgrade it now that the plain password is known
+        await update_password_hash(user["id"], new_hash)
+        user["hashed_password"] = new_hash
+    return user
+
+async def update_password_hash(user_id: str, hashed_password: str):
+    async with get_pool().writer() as conn:
+        await conn.execute("UPDATE users SET hashed_password = ? WHERE id = ?", (hashed_password, user_id))
+
+async def save_session_state(session_id: str, config: dict, messages: list, summary: str = "", summarized_upto: int = 0):
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO session_state (session_id, config, messages, summary, summarized_upto, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, json.dumps(config), json.dumps(messages), summary, summarized_upto, datetime.utcnow())
+        )
+
+async def load_session_state(session_id: str):
+    async with get_pool().reader() as conn:
+        async with conn.execute(
+            "SELECT config, messages, summary, summarized_upto FROM session_state WHERE session_id = ?", (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+    if not row:
+        return None
+    return {
+        "config": json.loads(row[0]),
+        "messages": json.loads(row[1]),
+        "summary": row[2],
+        "summarized_upto": row[3]
+    }
+
+async def delete_session_state(session_id: str):
+    async with get_pool().writer() as conn:
+        await conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+async def purge_session_state(older_than: datetime):
+    async with get_pool().writer() as conn:
+        cursor = await conn.execute("DELETE FROM session_state WHERE updated_at < ?", (older_than,))
+        return cursor.rowcount
+
+async def load_tool_cache_entry(key: str):
+    async with get_pool().reader() as conn:
+        async with conn.execute("SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)) as cursor:
+            row = await cursor.fetchone()
+
+    if not row:
+        return None
+    return {"value": json.loads(row[0]), "expires_at": row[1]}
+
+async def save_tool_cache_entry(key: str, value, expires_at: float):
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), expires_at)
+        )
+        await conn.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+
+def _timestamp(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def encode_cursor(created_at: str, rowid: int) -> str:
+    """Opaque keyset pagination cursor pointing at a row"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, rowid]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        created_at, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(created_at), int(rowid)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+async def create_session(session_id: str, user_id: str, title: str, created_at: datetime):
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            "INSERT INTO sessions (id, user_id, title, created_at) VALUES (?, ?, ?, ?)",
+            (session_id, user_id, title, _timestamp(created_at))
+        )
+
+async def get_session(session_id: str):
+    async with get_pool().reader() as conn:
+        async with conn.execute(
+            "SELECT id, user_id, title, created_at FROM sessions WHERE id = ?", (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+    return dict(row) if row else None
+
+async def list_sessions(user_id: str, limit: int = 50, before: Optional[str] = None):
+    """
+    List a user's sessions newest first
+
+    Returns:
+        The page of sessions and the cursor of the next page (None on the last page)
+    """
+    query = "SELECT rowid, id, user_id, title, created_at FROM sessions WHERE user_id = ?"
+    params: List[Any] = [user_id]
+    if before is not None:
+        query += " AND (created_at, rowid) < (?, ?)"
+        params.extend(decode_cursor(before))
+    query += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+    params.append(limit + 1)
+
+    async with get_pool().reader() as conn:
+        async with conn.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+
+    next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["rowid"]) if len(rows) > limit else None
+    sessions = [{key: row[key] for key in ("id", "user_id", "title", "created_at")} for row in rows[:limit]]
+    return sessions, next_cursor
+
+async def delete_session(session_id: str):
+    """
+    Delete a session with its messages, tool calls and file records
+
+    Returns:
+        The deleted file records, so their blobs can be released, or None if the session
+        does not exist
+    """
+    async with get_pool().writer() as conn:
+        cursor = await conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        if cursor.rowcount == 0:
+            return None
+        async with conn.execute(f"SELECT {', '.join(_FILE_COLUMNS)} FROM files WHERE session_id = ?", (session_id,)) as cursor:
+            files = [dict(row) for row in await cursor.fetchall()]
+        await conn.execute("DELETE FROM tool_calls WHERE session_id = ?", (session_id,))
+        await conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        await conn.execute("DELETE FROM files WHERE session_id = ?", (session_id,))
+        return files
+
+# SQLite caps the number of bound parameters per statement
+_MAX_VARIABLES = 32766
+
+async def _insert_rows(conn, table: str, columns: Tuple[str, ...], rows: List[tuple], verb: str = "INSERT"):
+    """Insert rows with as few multi-row INSERT statements as the parameter limit allows"""
+    row_placeholder = "(" + ", ".join("?" for _ in columns) + ")"
+    per_statement = max(1, _MAX_VARIABLES // len(columns))
+    for start in range(0, len(rows), per_statement):
+        chunk = rows[start:start + per_statement]
+        await conn.execute(
+            f"{verb} INTO {table} ({', '.join(columns)}) VALUES {', '.join(row_placeholder for _ in chunk)}",
+            [value for row in chunk for value in row]
+        )
+
+async def save_turn(session_id: str, messages: List[Dict[str, Any]], tool_calls: List[Dict[str, Any]], user_id: str = ""):
+    """Persist the messages and tool calls of a chat turn in a single transaction"""
+    await save_turns([{"session_id": session_id, "user_id": user_id, "messages": messages, "tool_calls": tool_calls}])
+
+async def save_turns(turns: List[Dict[str, Any]]):
+    """
+    Persist a batch of chat turns in a single transaction
+
+    Each turn is a dict with session_id, user_id, messages and tool_calls. Session rows are
+    created on the fly for sessions the client never registered.
+    """
+    sessions, messages, tool_calls = [], [], []
+    for turn in turns:
+        session_id = turn["session_id"]
+        if turn["messages"]:
+            first = turn["messages"][0]
+            sessions.append((session_id, turn.get("user_id", ""), first["content"][:80], _timestamp(first["created_at"])))
+        messages.extend(
+            (str(message["id"]), session_id, message["role"], message["content"], _timestamp(message["created_at"]))
+            for message in turn["messages"]
+        )
+        tool_calls.extend(
+            (
+                str(tool_call["id"]), str(tool_call["message_id"]), session_id, tool_call["tool_name"],
+                json.dumps(tool_call["parameters"], default=str), tool_call["result"], tool_call["status"],
+                _timestamp(tool_call["created_at"])
+            )
+            for tool_call in turn["tool_calls"]
+        )
+
+    # OR IGNORE keeps a retried batch idempotent
+    async with get_pool().writer() as conn:
+        await _insert_rows(conn, "sessions", ("id", "user_id", "title", "created_at"), sessions, verb="INSERT OR IGNORE")
+        await _insert_rows(
+            conn, "messages", ("id", "session_id", "role", "content", "created_at"), messages, verb="INSERT OR IGNORE"
+        )
+        await _insert_rows(
+            conn, "tool_calls",
+            ("id", "message_id", "session_id", "tool_name", "parameters", "result", "status", "created_at"),
+            tool_calls, verb="INSERT OR IGNORE"
+        )
+
+async def load_messages(session_id: str, limit: int = 50, before: Optional[str] = None):
+    """
+    Load a page of a session's messages, walking back from ``before``
+
+    Returns:
+        The page in chronological order, each message with its tool calls, and the cursor
+        of the next (older) page (None when the start of the conversation is reached)
+    """
+    query = "SELECT rowid, id, session_id, role, content, created_at FROM messages WHERE session_id = ?"
+    params: List[Any] = [session_id]
+    if before is not None:
+        query += " AND (created_at, rowid) < (?, ?)"
+        params.extend(decode_cursor(before))
+    query += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+    params.append(limit + 1)
+
+    async with get_pool().reader() as conn:
+        async with conn.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+        page = rows[:limit]
+
+        tool_calls: Dict[str, List[Dict[str, Any]]] = {}
+        if page:
+            placeholders = ", ".join("?" for _ in page)
+            async with conn.execute(
+                f"SELECT id, message_id, tool_name, parameters, result, status, created_at FROM tool_calls "
+                f"WHERE message_id IN ({placeholders}) ORDER BY created_at",
+                [row["id"] for row in page]
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    record = dict(row)
+                    record["parameters"] = json.loads(record["parameters"])
+                    tool_calls.setdefault(record["message_id"], []).append(record)
+
+    next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["rowid"]) if len(rows) > limit else None
+    messages = [
+        {
+            "id": row["id"],
+            "session_id": row["session_id"],
+            "role": row["role"],
+            "content": row["content"],
+            "created_at": row["created_at"],
+            "tool_calls": tool_calls.get(row["id"], [])
+        }
+        for row in reversed(page)
+    ]
+    return messages, next_cursor
+
+_FILE_COLUMNS = ("id", "session_id", "filename", "filepath", "uploaded_at", "content_type", "size", "sha256")
+
+async def save_file_record(record: Dict[str, Any]):
+    async with get_pool().writer() as conn:
+        await conn.execute(
+            f"INSERT INTO files ({', '.join(_FILE_COLUMNS)}) VALUES ({', '.join('?' for _ in _FILE_COLUMNS)})",
+            (
+                str(record["id"]), str(record["session_id"]), record["filename"], str(record["filepath"]),
+                _timestamp(record["uploaded_at"]), record["content_type"], record["size"], record["sha256"]
+            )
+        )
+
+async def get_file_record(file_id: str):
+    async with get_pool().reader() as conn:
+        async with conn.execute(f"SELECT {', '.join(_FILE_COLUMNS)} FROM files WHERE id = ?", (file_id,)) as cursor:
+            row = await cursor.fetchone()
+
+    return dict(row) if row else None
+
+async def list_file_records(session_id: str):
+    async with get_pool().reader() as conn:
+        async with conn.execute(
+            f"SELECT {', '.join(_FILE_COLUMNS)} FROM files WHERE session_id = ? ORDER BY uploaded_at", (session_id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+    return [dict(row) for row in rows]
+
+async def file_content_in_use(sha256: str) -> bool:
+    """Whether any file record still references the given content"""
+    async with get_pool().reader() as conn:
+        async with conn.execute("SELECT 1 FROM files WHERE sha256 = ? LIMIT 1", (sha256,)) as cursor:
+            return await cursor.fetchone() is not None
+
+async def delete_file_record(file_id: str):
+    """
+    Delete a file record
+
+    Returns:
+        The deleted record and whether other records still share its content, or (None, False)
+    """
+    async with get_pool().writer() as conn:
+        async with conn.execute(f"SELECT {', '.join(_FILE_COLUMNS)} FROM files WHERE id = ?", (file_id,)) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None, False
+        await conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        async with conn.execute("SELECT 1 FROM files WHERE sha256 = ? LIMIT 1", (row["sha256"],)) as cursor:
+            shared = await cursor.fetchone() is not None
+
+    return dict(row), shared
@@ -0,0 +1,175 @@
+from typing import AsyncIterator, Dict, List, Optional, Union
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from loguru import logger
+from .configs.config import DatabaseConfig
+import aiosqlite
+import asyncio
+import time
+
+
+class PoolTimeoutError(TimeoutError):
+    """Raised when no connection becomes available within the acquire timeout"""
+
+
+@dataclass
+class PoolMetrics:
+    """Saturation counters exposed by the connection pool"""
+    readers: int = 0
+    readers_idle: int = 0
+    read_acquires: int = 0
+    read_waits: int = 0
+    read_wait_seconds: float = 0.0
+    read_wait_max: float = 0.0
+    read_waiting: int = 0
+    write_acquires: int = 0
+    write_waits: int = 0
+    write_wait_seconds: float = 0.0
+    write_wait_max: float = 0.0
+    write_waiting: int = 0
+    timeouts: int = 0
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        return asdict(self)
+
+
+class DatabasePool:
+    """
+    Long-lived aiosqlite connections shared by the whole application.
+
+    SQLite in WAL mode allows many concurrent readers but only one writer, so the pool
+    holds one writer connection, handed out in FIFO order behind a lock, and a fixed set
+    of read-only reader connections. Connections live for the lifetime of the process, so
+    sqlite3's per-connection prepared-statement cache is reused across requests instead of
+    being thrown away with every connection.
+    """
+
+    def __init__(self, path: Union[str, Path], config: Optional[DatabaseConfig] = None):
+        self.path = str(path)
+        self.config = config if config is not None else DatabaseConfig()
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._metrics = PoolMetrics()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def open(self):
+        # The writer is opened first so that it creates the file and switches it to WAL
+        self._writer = await self._connect(read_only=False)
+        for _ in range(max(1, self.config.readers)):
+            reader = await self._connect(read_only=True)
+            self._readers.append(reader)
+            self._idle.put_nowait(reader)
+        logger.info(f"Opened database pool on {self.path} with {len(self._readers)} readers")
+
+    async def close(self):
+        if self._writer is None:
+            return
+        async with self._write_lock:
+            try:
+                await self._writer.execute("PRAGMA optimize")
+            except Exception as e:
+                logger.error(f"Failed to optimize database: {str(e)}", exc_info=True)
+            for connection in [*self._readers, self._writer]:
+                await connection.close()
+            self._readers.clear()
+            self._idle = asyncio.Queue()
+            self._writer = None
+        logger.info("Closed database pool")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection"""
+        try:
+            connection = self._idle.get_nowait()
+            self._metrics.read_acquires += 1
+        except asyncio.QueueEmpty:
+            connection = await self._wait_for_reader()
+        try:
+            yield connection
+        finally:
+            self._idle.put_nowait(connection)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Borrow the writer connection for one transaction
+
+        The transaction is committed when the block exits normally and rolled back otherwise.
+        """
+        if self._writer is None:
+            raise RuntimeError("Database pool is not open")
+        contended = self._write_lock.locked()
+        start = time.perf_counter()
+        self._metrics.write_waiting += 1
+        try:
+            await asyncio.wait_for(self._write_lock.acquire(), timeout=self.config.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._metrics.timeouts += 1
+            raise PoolTimeoutError("Timed out waiting for the database writer")
+        finally:
+            self._metrics.write_waiting -= 1
+
+        waited = time.perf_counter() - start
+        self._metrics.write_acquires += 1
+        if contended:
+            self._metrics.write_waits += 1
+            self._metrics.write_wait_seconds += waited
+            self._metrics.write_wait_max = max(self._metrics.write_wait_max, waited)
+        try:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+        finally:
+            self._write_lock.release()
+
+    def metrics(self) -> Dict[str, Union[int, float]]:
+        self._metrics.readers = len(self._readers)
+        self._metrics.readers_idle = self._idle.qsize()
+        return self._metrics.to_dict()
+
+    async def _wait_for_reader(self) -> aiosqlite.Connection:
+        if not self._readers:
+            raise RuntimeError("Database pool is not open")
+        start = time.perf_counter()
+        self._metrics.read_waiting += 1
+        try:
+            connection = await asyncio.wait_for(self._idle.get(), timeout=self.config.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._metrics.timeouts += 1
+            raise PoolTimeoutError("Timed out waiting for a database reader")
+        finally:
+            self._metrics.read_waiting -= 1
+
+        waited = time.perf_counter() - start
+        self._metrics.read_acquires += 1
+        self._metrics.read_waits += 1
+        self._metrics.read_wait_seconds += waited
+        self._metrics.read_wait_max = max(self._metrics.read_wait_max, waited)
+        return connection
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        connection = await aiosqlite.connect(self.path, cached_statements=self.config.statement_cache_size)
+        connection.row_factory = aiosqlite.Row
+        pragmas = [
+            f"PRAGMA busy_timeout = {int(self.config.busy_timeout_ms)}",
+            "PRAGMA synchronous = NORMAL",
+            "PRAGMA temp_store = MEMORY",
+            f"PRAGMA cache_size = -{int(self.config.cache_size_kb)}",
+            f"PRAGMA mmap_size = {int(self.config.mmap_size)}",
+        ]
+        if read_only:
+            pragmas.append("PRAGMA query_only = ON")
+        else:
+            pragmas.insert(0, "PRAGMA journal_mode = WAL")
+        for pragma in pragmas:
+            await connection.execute(pragma)
+        return connection
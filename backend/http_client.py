@@ -0,0 +1,122 @@
+from typing import Any, Dict, Optional
+from dataclasses import dataclass, asdict
+from loguru import logger
+from .configs.config import HTTPConfig, LLMConfig, config as app_config
+import httpx
+import litellm
+
+
+@dataclass
+class HTTPClientMetrics:
+    """Utilization of the shared HTTP connection pool"""
+    max_connections: int = 0
+    connections: int = 0
+    active: int = 0
+    idle: int = 0
+    utilization: float = 0.0
+    http2: bool = False
+    requests: int = 0
+    responses: int = 0
+    errors: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def llm_timeout(llm_config: LLMConfig, http_config: Optional[HTTPConfig] = None) -> httpx.Timeout:
+    """Per-phase timeouts for an LLM request, instead of one number for everything"""
+    http_config = http_config if http_config is not None else app_config.http
+    return httpx.Timeout(
+        connect=llm_config.connect_timeout,
+        read=llm_config.read_timeout,
+        write=http_config.write_timeout,
+        pool=http_config.pool_timeout
+    )
+
+
+class SharedHTTPClient:
+    """
+    One pooled ``httpx.AsyncClient`` for all outbound LLM traffic.
+
+    Keeping connections (and their TLS sessions) alive across requests takes the handshake
+    off the critical path of each completion. The client is installed as
+    ``litellm.aclient_session``, which LiteLLM hands to every provider SDK client it creates.
+    """
+
+    def __init__(self, http_config: HTTPConfig, llm_config: LLMConfig, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = http_config
+        self.http2 = http_config.http2 and _http2_available()
+        if http_config.http2 and not self.http2:
+            logger.info("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+        self._metrics = HTTPClientMetrics(max_connections=http_config.max_connections, http2=self.http2)
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=http_config.max_connections,
+                max_keepalive_connections=http_config.max_keepalive_connections,
+                keepalive_expiry=http_config.keepalive_expiry
+            ),
+            timeout=llm_timeout(llm_config, http_config),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            transport=transport
+        )
+
+    async def _on_request(self, request: httpx.Request):
+        self._metrics.requests += 1
+
+    async def _on_response(self, response: httpx.Response):
+        self._metrics.responses += 1
+        if response.status_code >= 400:
+            self._metrics.errors += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = self._metrics
+        # httpx does not expose pool statistics; read them from the httpcore pool if present
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        metrics.connections = len(connections)
+        metrics.idle = sum(1 for connection in connections if connection.is_idle())
+        metrics.active = metrics.connections - metrics.idle
+        metrics.utilization = metrics.active / metrics.max_connections if metrics.max_connections else 0.0
+        return metrics.to_dict()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client: Optional[SharedHTTPClient] = None
+
+
+async def open_http_client() -> SharedHTTPClient:
+    """Create the shared client and route LiteLLM through it"""
+    global _client
+    if _client is None:
+        _client = SharedHTTPClient(app_config.http, app_config.llm)
+        litellm.aclient_session = _client.client
+        logger.info(
+            f"Opened shared HTTP client (max {app_config.http.max_connections} connections, "
+            f"http2={_client.http2})"
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        if litellm.aclient_session is _client.client:
+            litellm.aclient_session = None
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> Optional[SharedHTTPClient]:
+    """The shared client, or None outside the application lifespan"""
+    return _client
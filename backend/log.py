@@ -0,0 +1,166 @@
+from typing import Any, Dict, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from loguru import logger
+import sys
+import threading
+import time
+import uuid
+
+# Correlation ids attached to every log record emitted while handling a request
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+_CONSOLE_FORMAT = (
+    "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{line} | "
+    "req={extra[request_id]} session={extra[session_id]} | {message}"
+)
+
+
+def parse_levels(spec: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Parse a level spec such as ``"INFO,backend.core.tools=DEBUG,litellm=WARNING"``
+
+    Returns:
+        The default level and a mapping of module prefixes to their own levels
+    """
+    default, modules = "INFO", {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            module, _, level = part.partition("=")
+            modules[module.strip()] = level.strip().upper()
+        else:
+            default = part.upper()
+    return default, modules
+
+
+def level_filter(spec: str) -> Dict[str, str]:
+    """Loguru filter dict applying the default level to "" and per-module levels to prefixes"""
+    default, modules = parse_levels(spec)
+    return {"": default, **modules}
+
+
+def _add_context(record: Dict[str, Any]):
+    extra = record["extra"]
+    if extra.get("request_id") is None:
+        extra["request_id"] = request_id_var.get()
+    if extra.get("session_id") is None:
+        extra["session_id"] = session_id_var.get()
+
+
+def configure_logging(level_spec: str, log_dir: Optional[Path] = None, json_logs: bool = True):
+    """
+    Install the application's log sinks
+
+    The console gets readable lines and ``log_dir/api.log`` gets one JSON object per record
+    (``serialize=True``), both filtered per module by ``level_spec``. Both sinks are
+    enqueued: records go to a background thread, so a slow disk or terminal never blocks the
+    event loop. Every record carries the current request and session ids.
+    """
+    filters = level_filter(level_spec)
+    # The sinks' own threshold is the most verbose level in the spec, so calls below every
+    # configured level return before a record is even built
+    threshold = min(logger.level(level).no for level in filters.values())
+    logger.remove()
+    logger.configure(patcher=_add_context, extra={"request_id": None, "session_id": None})
+    logger.add(sys.stderr, level=threshold, filter=filters, format=_CONSOLE_FORMAT, enqueue=True, backtrace=False)
+    if log_dir is not None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        logger.add(
+            log_dir / "api.log",
+            rotation="50 MB",
+            retention="7 days",
+            level=threshold,
+            filter=filters,
+            serialize=json_logs,
+            enqueue=True,
+            encoding="utf-8"
+        )
+
+
+@contextmanager
+def log_context(request_id: Optional[str] = None, session_id: Optional[str] = None):
+    """Tag log records emitted inside the block (and tasks started from it)"""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if session_id is not None:
+        tokens.append((session_id_var, session_id_var.set(session_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def preview(value: Any, limit: int = 200) -> str:
+    """Shortened repr for debug logs of large payloads"""
+    text = repr(value) if not isinstance(value, str) else value
+    return text if len(text) <= limit else f"{text[:limit]}... ({len(text)} chars)"
+
+
+class LogSampler:
+    """
+    Rate limiter for logs in hot loops, such as one line per streamed chunk.
+
+    ``allow()`` is true at most once per ``interval`` seconds; the calls it suppressed in
+    between are counted so the next emitted line can report them.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.suppressed = 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next:
+                self.suppressed += 1
+                return False
+            self._next = now + self.interval
+            return True
+
+    def take_suppressed(self) -> int:
+        with self._lock:
+            suppressed, self.suppressed = self.suppressed, 0
+            return suppressed
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving each HTTP request a request id for its log records
+
+    The id is taken from an incoming ``X-Request-ID`` header or generated, and echoed in the
+    response. Being plain ASGI (not BaseHTTPMiddleware), the endpoint and any streamed body
+    run in the same context, so the id also tags logs written while an SSE response streams.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_id)
@@ -0,0 +1,229 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from loguru import logger
+from .configs.config import LoopMonitorConfig, config
+from .log import LogSampler
+from .metrics import EVENT_LOOP_LAG
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+_ROOT = Path(__file__).resolve().parents[1]
+_APP_DIR = str(Path(__file__).resolve().parent)
+_STACK_LIMIT = 40
+
+
+@dataclass
+class LoopMonitorMetrics:
+    """Scheduling delay of the event loop"""
+    samples: int = 0
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+    stalls: int = 0
+    stall_seconds: float = 0.0
+    stacks_captured: int = 0
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        return asdict(self)
+
+
+@dataclass
+class BlockingSite:
+    """Code found running on the loop thread while the loop was stalled"""
+    name: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    stack: List[str] = field(default_factory=list)
+
+
+def _describe(frame: traceback.FrameSummary) -> str:
+    try:
+        filename = str(Path(frame.filename).resolve().relative_to(_ROOT))
+    except ValueError:
+        filename = frame.filename
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+
+def call_site(stack: traceback.StackSummary) -> str:
+    """
+    The frame to blame for a stall: the innermost one in application code, so a blocking
+    ``bcrypt.hashpw`` is attributed to the handler that called it, followed by the innermost
+    frame when that lies elsewhere
+    """
+    if not stack:
+        return "<unknown>"
+    innermost = stack[-1]
+    for frame in reversed(stack):
+        if frame.filename.startswith(_APP_DIR) and frame.filename != __file__:
+            if frame is innermost:
+                return _describe(frame)
+            return f"{_describe(frame)} -> {_describe(innermost)}"
+    return _describe(innermost)
+
+
+class LoopLagMonitor:
+    """
+    Samples how late the event loop runs a periodic timer.
+
+    A task sleeps ``interval`` seconds at a time and records how much later than due it woke
+    up: with nothing blocking the loop this stays well under a millisecond, while a
+    synchronous call on the loop thread shows up as a lag of its full duration. Every sample
+    goes to the ``event_loop_lag_seconds`` histogram, and lags above ``threshold`` count as
+    stalls.
+
+    With ``capture_stacks`` (on by default in debug mode) a watchdog thread also notices a
+    timer that is overdue by more than ``threshold`` while the loop is still stuck, and takes
+    the stack of the loop thread at that moment. When the stall ends its duration is credited
+    to that call site; the sites that blocked the loop longest are kept for ``/metrics``.
+    """
+
+    def __init__(self, monitor_config: Optional[LoopMonitorConfig] = None):
+        self.config = monitor_config if monitor_config is not None else LoopMonitorConfig()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # When the current timer is due, written by the loop and read by the watchdog
+        self._due = 0.0
+        # Stack taken by the watchdog during the current stall: (due, site, stack)
+        self._captured: Optional[Tuple[float, str, List[str]]] = None
+        self._sites: Dict[str, BlockingSite] = {}
+        self._lock = threading.Lock()
+        self._sampler = LogSampler(interval=5.0)
+        self._metrics = LoopMonitorMetrics()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running or not self.config.enabled:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.ensure_future(self._run())
+        if self.config.capture_stacks:
+            self._stopping.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+            self._watchdog.start()
+        logger.info(
+            "Event loop monitor started (interval {}s, threshold {}s, stacks {})",
+            self.config.interval, self.config.threshold, "on" if self.config.capture_stacks else "off"
+        )
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._watchdog is not None:
+            self._stopping.set()
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        logger.info("Event loop monitor stopped")
+
+    async def _run(self):
+        while True:
+            due = time.monotonic() + self.config.interval
+            self._due = due
+            await asyncio.sleep(self.config.interval)
+            self.record(max(0.0, time.monotonic() - due), due)
+
+    def record(self, lag: float, due: Optional[float] = None):
+        """Account one lag sample; ``due`` matches it with a stack taken during the stall"""
+        EVENT_LOOP_LAG.observe(lag)
+        self._metrics.samples += 1
+        self._metrics.last_lag_seconds = lag
+        self._metrics.max_lag_seconds = max(self._metrics.max_lag_seconds, lag)
+        if lag < self.config.threshold:
+            return
+        self._metrics.stalls += 1
+        self._metrics.stall_seconds += lag
+        with self._lock:
+            captured, self._captured = self._captured, None
+            if captured is None or captured[0] != due:
+                captured = None
+            else:
+                _, name, stack = captured
+                site = self._site(name)
+                site.count += 1
+                site.total_seconds += lag
+                site.max_seconds = max(site.max_seconds, lag)
+                site.stack = stack
+        if not self._sampler.allow():
+            return
+        suppressed = self._sampler.take_suppressed()
+        if captured is None:
+            logger.warning("Event loop blocked for {:.0f}ms ({} more stalls not logged)", lag * 1000, suppressed)
+        else:
+            logger.warning(
+                "Event loop blocked for {:.0f}ms at {} ({} more stalls not logged)\n{}",
+                lag * 1000, captured[1], suppressed, "".join(captured[2])
+            )
+
+    def _site(self, name: str) -> BlockingSite:
+        site = self._sites.get(name)
+        if site is None:
+            if len(self._sites) >= self.config.max_sites:
+                # Make room by forgetting the site that has cost the least so far
+                del self._sites[min(self._sites.values(), key=lambda entry: entry.total_seconds).name]
+            site = self._sites[name] = BlockingSite(name)
+        return site
+
+    def _watch(self):
+        poll = max(0.005, self.config.threshold / 4)
+        reported = None
+        while not self._stopping.wait(poll):
+            due = self._due
+            if not due or due == reported or time.monotonic() - due < self.config.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            # The loop may have caught up while we looked; only a still-overdue timer counts
+            if frame is None or self._due != due:
+                continue
+            stack = traceback.extract_stack(frame, limit=_STACK_LIMIT)
+            del frame
+            reported = due
+            with self._lock:
+                self._captured = (due, call_site(stack), stack.format())
+            self._metrics.stacks_captured += 1
+
+    def metrics(self) -> Dict[str, Union[int, float]]:
+        return self._metrics.to_dict()
+
+    def top_sites(self, limit: int = 10, with_stacks: bool = False) -> List[Dict[str, Any]]:
+        """Call sites that blocked the loop the longest in total"""
+        with self._lock:
+            sites = sorted(self._sites.values(), key=lambda site: site.total_seconds, reverse=True)[:limit]
+            return [
+                {key: value for key, value in asdict(site).items() if with_stacks or key != "stack"}
+                for site in sites
+            ]
+
+    def report(self, limit: int = 10) -> Dict[str, Any]:
+        """Lag percentiles, counters and the worst call sites with their stacks"""
+        return {
+            **self.metrics(),
+            "lag_p50_seconds": EVENT_LOOP_LAG.percentile(0.5),
+            "lag_p99_seconds": EVENT_LOOP_LAG.percentile(0.99),
+            "capture_stacks": self.config.capture_stacks,
+            "sites": self.top_sites(limit, with_stacks=True)
+        }
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    """Get the process-wide event loop monitor"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor(config.loop_monitor)
+    return _monitor
@@ -0,0 +1,239 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from loguru import logger
+import math
+import threading
+
+# Label values of one series, in the order of the metric's label names
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> Iterable[str]:
+        return []
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, optionally split by labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """
+    Log-linear (HDR-style) histogram.
+
+    Every power of two between ``lowest`` and ``highest`` is split into ``sub_buckets``
+    equal parts, so a bucket bound is never more than ``1 / sub_buckets`` above the values
+    it holds, whether they are microsecond token gaps or minute-long turns. Recording is a
+    binary search over a fixed bucket list; nothing grows with the number of observations.
+    """
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        lowest: float = 1e-4,
+        highest: float = 600.0,
+        sub_buckets: int = 4
+    ):
+        super().__init__(name, documentation, labelnames)
+        bounds = []
+        base = lowest
+        while base < highest:
+            bounds.extend(base * (1 + step / sub_buckets) for step in range(1, sub_buckets + 1))
+            base *= 2
+        self.bounds = [lowest] + bounds
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Values above the last bound land in the +Inf bucket
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.bounds) + 1)
+            series.counts[index] += 1
+            series.sum += value
+            series.count += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series.count if series is not None else 0
+
+    def percentile(self, fraction: float, **labels) -> Optional[float]:
+        """Upper bound of the bucket holding the given quantile, or None without data"""
+        series = self._series.get(self._key(labels))
+        if series is None or not series.count:
+            return None
+        rank = fraction * series.count
+        seen = 0
+        for index, count in enumerate(series.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else math.inf
+        return math.inf
+
+    def _samples(self) -> Iterable[str]:
+        with self._lock:
+            snapshot = [(key, list(series.counts), series.sum, series.count) for key, series in self._series.items()]
+        for key, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket in zip(self.bounds + [math.inf], counts):
+                cumulative += bucket
+                # Empty leading buckets carry no information; skip them to keep scrapes small
+                if not cumulative and not math.isinf(bound):
+                    continue
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    """Metrics rendered by the ``/metrics`` endpoint in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, prefix: str, collect: Callable[[], Any]):
+        """
+        Export the numeric fields of a component's ``metrics()`` dict as gauges
+
+        ``collect`` may return a dict, or a list of dicts with a ``name`` field used as a
+        label (such as the router's per-deployment metrics). It is called at scrape time;
+        returning None or raising skips the component.
+        """
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for prefix, collect in list(self._collectors.items()):
+            try:
+                data = collect()
+            except Exception as e:
+                logger.debug("Skipping metrics of {}: {}", prefix, e)
+                continue
+            lines.extend(_render_collected(prefix, data))
+        return "\n".join(lines) + "\n"
+
+
+def _render_collected(prefix: str, data: Any) -> Iterable[str]:
+    if data is None:
+        return
+    rows = data if isinstance(data, list) else [data]
+    gauges: Dict[str, List[str]] = {}
+    for row in rows:
+        label = ("name", str(row["name"])) if isinstance(data, list) and "name" in row else None
+        for field, value in row.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)) or field == "name":
+                continue
+            labels = _format_labels((), (), label)
+            gauges.setdefault(f"{prefix}_{field}", []).append(f"{prefix}_{field}{labels} {_format_value(value)}")
+    for name, samples in gauges.items():
+        yield f"# TYPE {name} gauge"
+        yield from samples
+
+
+REGISTRY = Registry()
+
+LLM_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "llm_queue_wait_seconds", "Time an LLM request waited for a deployment concurrency slot", ["deployment"]
+))
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a completion to its first streamed token", ["model"]
+))
+LLM_INTER_TOKEN_GAP = REGISTRY.register(Histogram(
+    "llm_inter_token_gap_seconds", "Time between consecutive streamed chunks", ["model"], lowest=1e-5
+))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "llm_tokens_per_second", "Completion tokens per second after the first token", ["model"], lowest=0.1, highest=1e5
+))
+TOOL_LATENCY = REGISTRY.register(Histogram(
+    "tool_latency_seconds", "Wall time of tool calls", ["tool", "status"]
+))
+CHAT_TURN_DURATION = REGISTRY.register(Histogram(
+    "chat_turn_seconds", "Total wall time of an agent turn", ["status"]
+))
+SSE_TIME_TO_FIRST_FRAME = REGISTRY.register(Histogram(
+    "sse_time_to_first_frame_seconds", "Time from starting an SSE response to its first data frame"
+))
+SSE_STREAM_DURATION = REGISTRY.register(Histogram(
+    "sse_stream_seconds", "Duration of SSE responses", ["outcome"]
+))
+EVENT_LOOP_LAG = REGISTRY.register(Histogram(
+    "event_loop_lag_seconds", "Delay of the event loop in running a timer after it was due", lowest=1e-5
+))
@@ -0,0 +1,119 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from passlib.context import CryptContext
+from loguru import logger
+from .configs.config import AuthConfig, config
+import asyncio
+import threading
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised when the hashing pool and its queue are full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing is saturated")
+        self.retry_after = retry_after
+
+
+@dataclass
+class PasswordHasherMetrics:
+    """Counters exposed by the password hasher"""
+    hashes: int = 0
+    verifications: int = 0
+    rehashes: int = 0
+    rejected: int = 0
+    pending: int = 0
+    max_pending: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def create_password_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a small dedicated thread pool.
+
+    bcrypt is deliberately slow and releases the GIL while it works, so a few threads keep
+    it off the event loop. At most ``hash_workers + hash_queue_size`` operations are accepted
+    at a time; beyond that callers are rejected immediately instead of queueing behind an
+    auth storm.
+    """
+
+    def __init__(self, auth_config: Optional[AuthConfig] = None, context: Optional[CryptContext] = None):
+        self.config = auth_config if auth_config is not None else AuthConfig()
+        self.context = context if context is not None else create_password_context(self.config.bcrypt_rounds)
+        self._limit = max(1, self.config.hash_workers) + max(0, self.config.hash_queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._metrics = PasswordHasherMetrics()
+
+    async def hash(self, password: str) -> str:
+        self._metrics.hashes += 1
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password against its stored hash
+
+        Returns:
+            Whether the password matches, and a replacement hash if the stored one was made
+            with outdated parameters (None otherwise)
+        """
+        self._metrics.verifications += 1
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        if valid and new_hash is not None:
+            self._metrics.rehashes += 1
+        return valid, new_hash
+
+    def metrics(self) -> Dict[str, int]:
+        return self._metrics.to_dict()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._metrics.pending >= self._limit:
+                self._metrics.rejected += 1
+                logger.warning(f"Rejecting password operation, {self._metrics.pending} already pending")
+                raise PasswordHasherBusyError(self.config.retry_after)
+            self._metrics.pending += 1
+            self._metrics.max_pending = max(self._metrics.max_pending, self._metrics.pending)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, self.config.hash_workers),
+                    thread_name_prefix="password-hash"
+                )
+            # Released when the work itself finishes, not when the caller stops waiting for it
+            future = self._executor.submit(func, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _):
+        with self._lock:
+            self._metrics.pending -= 1
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the process-wide password hasher"""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(config.auth)
+    return _hasher
+
+
+def shutdown_password_hasher():
+    global _hasher
+    if _hasher is not None:
+        _hasher.shutdown()
+        _hasher = None
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from uuid import uuid4
-from backend.database import create_user, get_user, verify_password
+from backend.database import create_user, authenticate_user
+from backend.passwords import PasswordHasherBusyError
 from backend.types import User
 
 router = APIRouter()
@@ -17,9 +18,20 @@ class RegisterRequest(BaseModel):
     password: str
 
 
+def _too_busy(error: PasswordHasherBusyError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
 @router.post("/register")
 async def register(data: RegisterRequest):
-    user_id = await create_user(data.username, data.password)
+    try:
+        user_id = await create_user(data.username, data.password)
+    except PasswordHasherBusyError as e:
+        raise _too_busy(e)
     if not user_id:
         raise HTTPException(status_code=400, detail="Username already exists")
     return {"message": "User created successfully"}
@@ -27,8 +39,11 @@ async def register(data: RegisterRequest):
 
 @router.post("/login")
 async def login(data: LoginRequest):
-    user = await get_user(data.username)
-    if not user or not verify_password(data.password, user["hashed_password"]):
+    try:
+        user = await authenticate_user(data.username, data.password)
+    except PasswordHasherBusyError as e:
+        raise _too_busy(e)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     return {"message": "Login successful"}
     
\ No newline at end of file
@@ -1,42 +1,89 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from uuid import uuid4
+from fastapi import APIRouter, Request, HTTPException
+from uuid import UUID, uuid4
 from datetime import datetime
+from loguru import logger
 from ..types import FileRecord
+from ..configs.config import config
+from ..core.files import (
+    UploadError, UploadTooLargeError, receive_upload, commit_upload, discard_upload, blob_lock, get_file_index
+)
+from .. import database
+import asyncio
 import os
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
+
+async def remove_blob(filepath: str):
+    """Delete a stored blob; callers hold its ``blob_lock`` and know it is unreferenced"""
+    try:
+        await asyncio.to_thread(os.remove, filepath)
+    except FileNotFoundError:
+        logger.warning(f"Stored file already missing: {filepath}")
+
 
 @router.post("/upload/{session_id}")
-async def upload_file(session_id: str, file: UploadFile = File(...)):
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR)
-        
-    file_id = str(uuid4())
-    file_path = os.path.join(UPLOAD_DIR, f"{file_id}_{file.filename}")
-    
-    # Save the file
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
-    
-    file_record = FileRecord(
-        id=file_id,
-        session_id=session_id,
-        filename=file.filename,
-        filepath=file_path,
-        uploaded_at=datetime.now()
-    )
-    
+async def upload_file(session_id: UUID, request: Request):
+    """Stream a multipart upload (form field "file") to disk"""
+    content_length = request.headers.get("content-length")
+    try:
+        upload = await receive_upload(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            config.files,
+            content_length=int(content_length) if content_length and content_length.isdigit() else None
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The blob must not be unlinked by a delete between deduplicating onto it and recording
+    # the new reference
+    async with blob_lock(upload.sha256):
+        try:
+            file_path = await commit_upload(upload, config.files)
+        except Exception:
+            await discard_upload(upload)
+            raise
+
+        file_record = FileRecord(
+            id=uuid4(),
+            session_id=session_id,
+            filename=upload.filename,
+            filepath=str(file_path),
+            uploaded_at=datetime.utcnow(),
+            content_type=upload.content_type,
+            size=upload.size,
+            sha256=upload.sha256
+        )
+        await database.save_file_record(file_record.model_dump())
+    # Extraction, chunking and embedding happen in the background
+    get_file_index().schedule(file_record.model_dump())
     return file_record
 
 @router.get("/{session_id}")
 async def list_files(session_id: str):
-    # TODO: Implement file listing with proper user validation
-    return []
+    # TODO: Validate that the session belongs to the current user
+    return await database.list_file_records(session_id)
 
 @router.delete("/{file_id}")
 async def delete_file(file_id: str):
-    # TODO: Implement file deletion with proper user validation
+    # TODO: Validate that the file belongs to the current user
+    existing = await database.get_file_record(file_id)
+    if existing is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    async with blob_lock(existing["sha256"]):
+        record, shared = await database.delete_file_record(file_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        if not shared:
+            await remove_blob(record["filepath"])
+    index = get_file_index()
+    if await index.remove_file(record["session_id"], file_id):
+        # Identical content uploaded again to the session was not indexed twice; index it now
+        for other in await database.list_file_records(record["session_id"]):
+            if other["sha256"] == record["sha256"]:
+                index.schedule(other)
+                break
     return {"status": "success"}
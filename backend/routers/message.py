@@ -1,25 +1,48 @@
-from fastapi import APIRouter, Request, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from uuid import uuid4
-from typing import Optional, List, Dict, Any
-import json
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional
 from loguru import logger
+from ..configs.config import config
 from ..core.agents.chat_agent import ChatAgent
+from ..log import session_id_var
+from ..metrics import SSE_STREAM_DURATION, SSE_TIME_TO_FIRST_FRAME
+from .session import CURRENT_USER_ID
+from .sse import SSEWriter, HEARTBEAT_FRAME
+import time
 
 router = APIRouter()
 
+
+async def _measured(
+    frames: AsyncIterator[str],
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+) -> AsyncGenerator[str, None]:
+    """Record time to the first data frame and total duration of an SSE response"""
+    started = time.perf_counter()
+    first = True
+    # The server cancels or closes the response when the client goes away mid-frame
+    outcome = "disconnected"
+    try:
+        async for frame in frames:
+            if first and frame != HEARTBEAT_FRAME:
+                SSE_TIME_TO_FIRST_FRAME.observe(time.perf_counter() - started)
+                first = False
+            yield frame
+        # The writer also ends the stream early when it notices a disconnect itself
+        if is_disconnected is None or not await is_disconnected():
+            outcome = "completed"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        SSE_STREAM_DURATION.observe(time.perf_counter() - started, outcome=outcome)
+
+
 class MessageRequest(BaseModel):
     session_id: str
     content: str
-
-class ThinkingStep(BaseModel):
-    type: str  # "thinking" or "tool_call"
-    content: str
-    tool_name: Optional[str] = None
-    tool_args: Optional[Dict[str, Any]] = None
-    tool_result: Optional[str] = None
+    use_cache: bool = True
 
 @router.options("/")
 async def options_message():
@@ -35,61 +58,26 @@ async def options_message():
     )
 
 @router.post("/")
-async def send_message(request: MessageRequest):
+async def send_message(request: MessageRequest, http_request: Request):
     try:
-        logger.debug(f"Starting message processing for session {request.session_id}")
-        message_id = str(uuid4())
+        # Tags every log record of this turn, including those written while the response streams
+        session_id_var.set(request.session_id)
+        logger.debug("Starting message processing")
         agent = ChatAgent()  # Get the singleton instance
-        llm_instance = agent.get_session(request.session_id)  # Get or create session
-        logger.debug(f"Retrieved/created session for {request.session_id}")
-        
-        async def generate():
-            current_step = None
-            buffer = ""
-            
-            try:
-                logger.debug(f"Starting message generation for session {request.session_id}")
-                async for chunk in llm_instance.chat(request.content):
-                    if chunk.startswith("THINKING:"):
-                        if current_step:
-                            yield f"data: {json.dumps(current_step.dict())}\n\n"
-                        current_step = ThinkingStep(type="thinking", content=chunk[9:].strip())
-                    elif chunk.startswith("TOOL_CALL:"):
-                        if current_step:
-                            yield f"data: {json.dumps(current_step.dict())}\n\n"
-                        tool_data = json.loads(chunk[10:])
-                        logger.debug(f"Tool call detected: {tool_data['name']}")
-                        current_step = ThinkingStep(
-                            type="tool_call",
-                            tool_name=tool_data["name"],
-                            tool_args=tool_data["args"],
-                            content=f"Calling tool: {tool_data['name']}"
-                        )
-                    elif chunk.startswith("TOOL_RESULT:"):
-                        if current_step and current_step.type == "tool_call":
-                            current_step.tool_result = chunk[12:].strip()
-                            logger.debug(f"Tool result received for {current_step.tool_name}")
-                            yield f"data: {json.dumps(current_step.dict())}\n\n"
-                    else:
-                        buffer += chunk
-                        if buffer.endswith("\n"):
-                            if current_step:
-                                yield f"data: {json.dumps(current_step.dict())}\n\n"
-                            current_step = ThinkingStep(type="thinking", content=buffer.strip())
-                            buffer = ""
-                
-                if buffer:
-                    if current_step:
-                        yield f"data: {json.dumps(current_step.dict())}\n\n"
-                    yield f"data: {json.dumps(ThinkingStep(type='thinking', content=buffer.strip()).dict())}\n\n"
-                logger.debug(f"Message generation completed for session {request.session_id}")
-            except Exception as e:
-                logger.error(f"Error in message generation: {str(e)}", exc_info=True)
-                error_step = ThinkingStep(type="thinking", content=f"Error: {str(e)}")
-                yield f"data: {json.dumps(error_step.dict())}\n\n"
+        writer = SSEWriter(config.sse)
+
+        events = agent.chat(
+            request.content,
+            session_id=request.session_id,
+            use_cache=request.use_cache,
+            user_id=CURRENT_USER_ID
+        )
         
         return StreamingResponse(
-            generate(),
+            _measured(
+                writer.stream(events, is_disconnected=http_request.is_disconnected),
+                is_disconnected=http_request.is_disconnected
+            ),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
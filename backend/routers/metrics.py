@@ -0,0 +1,48 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from ..metrics import REGISTRY
+from ..database import get_pool
+from ..http_client import get_http_client
+from ..loop_monitor import get_loop_monitor
+from ..passwords import get_password_hasher
+from ..turn_writer import get_turn_writer
+from ..core.agents.chat_agent import ChatAgent
+from ..core.files import get_file_index
+from ..core.generator.router import all_llm_routers
+from ..core.generator.response_cache import get_response_cache
+from ..core.generator.retry import retry_metrics
+
+router = APIRouter()
+
+
+def _response_cache_metrics():
+    # An empty cache is falsy, so compare with None rather than testing truthiness
+    cache = get_response_cache()
+    return cache.metrics() if cache is not None else None
+
+
+# Component counters are read at scrape time; a component that is not running is skipped
+REGISTRY.register_collector("db_pool", lambda: get_pool().metrics())
+REGISTRY.register_collector("http_client", lambda: get_http_client().metrics() if get_http_client() else None)
+REGISTRY.register_collector("llm_deployment", lambda: [entry for llm_router in all_llm_routers() for entry in llm_router.metrics()])
+REGISTRY.register_collector("llm_retry", retry_metrics)
+REGISTRY.register_collector("llm_response_cache", _response_cache_metrics)
+REGISTRY.register_collector("session_store", lambda: ChatAgent().sessions.metrics())
+REGISTRY.register_collector("tool_cache", lambda: ChatAgent().tool_registry.cache_metrics())
+REGISTRY.register_collector("turn_writer", lambda: get_turn_writer().metrics())
+REGISTRY.register_collector("file_index", lambda: get_file_index().metrics())
+REGISTRY.register_collector("password_hasher", lambda: get_password_hasher().metrics())
+REGISTRY.register_collector("event_loop", lambda: get_loop_monitor().metrics())
+REGISTRY.register_collector("event_loop_blocking", lambda: get_loop_monitor().top_sites())
+
+
+@router.get("", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of latency histograms and component counters"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/loop")
+async def loop_report():
+    """Event loop lag and the call sites that blocked it longest, with their stacks"""
+    return JSONResponse(get_loop_monitor().report())
@@ -1,37 +1,66 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from uuid import uuid4
-from typing import List
-from ..types import Session
+from typing import Optional
+from .. import database
+from ..core.agents.chat_agent import ChatAgent
+from ..core.files import blob_lock, get_file_index
+from .file import remove_blob
 from datetime import datetime
 
 router = APIRouter()
 
+# This should be replaced with actual user ID from auth
+CURRENT_USER_ID = "current_user_id"
+
 class CreateSessionRequest(BaseModel):
     title: str
 
 @router.post("/")
 async def create_session(request: CreateSessionRequest):
     session_id = str(uuid4())
-    session = Session(
-        id=session_id,
-        user_id="current_user_id",  # This should be replaced with actual user ID from auth
-        title=request.title,
-        created_at=datetime.now()
-    )
-    return session
+    await database.create_session(session_id, CURRENT_USER_ID, request.title, datetime.utcnow())
+    return await database.get_session(session_id)
 
 @router.get("/")
-async def list_sessions():
-    # TODO: Implement session listing with proper user filtering
-    return []
+async def list_sessions(
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None
+):
+    try:
+        sessions, next_cursor = await database.list_sessions(CURRENT_USER_ID, limit=limit, before=before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sessions": sessions, "next_cursor": next_cursor}
 
 @router.get("/{session_id}")
-async def get_session(session_id: str):
-    # TODO: Implement session retrieval with proper user validation
-    return {}
+async def get_session(
+    session_id: str,
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None
+):
+    """Get a session with one page of its history, newest page first"""
+    session = await database.get_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        messages, next_cursor = await database.load_messages(session_id, limit=limit, before=before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"session": session, "messages": messages, "next_cursor": next_cursor}
 
 @router.delete("/{session_id}")
 async def delete_session(session_id: str):
-    # TODO: Implement session deletion with proper user validation
+    # TODO: Validate that the session belongs to the current user
+    files = await database.delete_session(session_id)
+    if files is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # The conversation also lives in the session store and the uploads in the file index
+    # and blob store; a later chat under the same id must not see any of it
+    await ChatAgent().remove_session(session_id)
+    await get_file_index().remove_session(session_id)
+    for sha256, filepath in {record["sha256"]: record["filepath"] for record in files}.items():
+        async with blob_lock(sha256):
+            if not await database.file_content_in_use(sha256):
+                await remove_blob(filepath)
     return {"status": "success"}
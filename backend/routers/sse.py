@@ -0,0 +1,129 @@
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, List, Optional
+from contextlib import suppress
+from loguru import logger
+from ..configs.config import SSEConfig
+from ..core.events import AgentEvent, TextDelta, ErrorEvent
+import asyncio
+import json
+
+# Text frames are by far the most frequent, so their JSON envelope is written once here
+# and only the content string is encoded per frame
+_TEXT_FRAME_PREFIX = 'data: {"type": "text", "content": '
+_TEXT_FRAME_SUFFIX = "}\n\n"
+HEARTBEAT_FRAME = ": keep-alive\n\n"
+
+_END = object()
+
+
+def text_frame(content: str) -> str:
+    return f"{_TEXT_FRAME_PREFIX}{json.dumps(content)}{_TEXT_FRAME_SUFFIX}"
+
+
+def event_frame(event: AgentEvent) -> str:
+    if isinstance(event, TextDelta):
+        return text_frame(event.content)
+    return f"data: {json.dumps(event.to_payload())}\n\n"
+
+
+class SSEWriter:
+    """
+    Turns an agent event stream into server-sent event frames.
+
+    Text deltas are coalesced and flushed every ``flush_interval_ms`` or ``flush_bytes``,
+    whichever comes first; other events flush pending text and are written immediately.
+    Events are pulled through a bounded queue, so a slow client applies backpressure to the
+    agent instead of buffering without limit. Idle streams get heartbeat comments, and when
+    the client disconnects the producer is cancelled, which cancels the upstream completion.
+    """
+
+    def __init__(self, config: Optional[SSEConfig] = None):
+        self.config = config if config is not None else SSEConfig()
+
+    async def stream(
+        self,
+        events: AsyncIterator[AgentEvent],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncGenerator[str, None]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.config.queue_size))
+        producer = asyncio.create_task(self._produce(events, queue))
+
+        flush_interval = self.config.flush_interval_ms / 1000
+        text_parts: List[str] = []
+        text_bytes = 0
+        text_deadline = 0.0
+        last_write = last_check = loop.time()
+
+        try:
+            while True:
+                try:
+                    event = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    now = loop.time()
+                    deadlines = [last_write + self.config.heartbeat_interval]
+                    if text_parts:
+                        deadlines.append(text_deadline)
+                    if is_disconnected is not None:
+                        deadlines.append(last_check + self.config.disconnect_poll_interval)
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout=max(0.0, min(deadlines) - now))
+                    except asyncio.TimeoutError:
+                        event = None
+
+                now = loop.time()
+                if is_disconnected is not None and now - last_check >= self.config.disconnect_poll_interval:
+                    last_check = now
+                    if await is_disconnected():
+                        logger.info("Client disconnected, cancelling upstream generation")
+                        return
+
+                if event is None:
+                    if text_parts and now >= text_deadline:
+                        yield text_frame("".join(text_parts))
+                        text_parts, text_bytes, last_write = [], 0, now
+                    elif now - last_write >= self.config.heartbeat_interval:
+                        yield HEARTBEAT_FRAME
+                        last_write = now
+                    continue
+
+                if event is _END:
+                    if text_parts:
+                        yield text_frame("".join(text_parts))
+                    return
+
+                if isinstance(event, TextDelta):
+                    if not text_parts:
+                        text_deadline = now + flush_interval
+                    text_parts.append(event.content)
+                    text_bytes += len(event.content)
+                    if text_bytes >= self.config.flush_bytes or flush_interval <= 0:
+                        yield text_frame("".join(text_parts))
+                        text_parts, text_bytes, last_write = [], 0, now
+                    continue
+
+                if text_parts:
+                    yield text_frame("".join(text_parts))
+                    text_parts, text_bytes = [], 0
+                yield event_frame(event)
+                last_write = now
+        finally:
+            if not producer.done():
+                producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+
+    async def _produce(self, events: AsyncIterator[AgentEvent], queue: asyncio.Queue):
+        try:
+            async for event in events:
+                await queue.put(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in message generation: {str(e)}", exc_info=True)
+            await queue.put(ErrorEvent(f"Error: {str(e)}"))
+        finally:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                with suppress(Exception):
+                    await aclose()
+        await queue.put(_END)
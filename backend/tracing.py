@@ -0,0 +1,51 @@
+from typing import Any, Optional
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:  # Tracing is optional; spans are no-ops without the OpenTelemetry API
+    _otel_trace = None
+
+
+class _NoopSpan:
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_exception(self, exception: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_span(name: str, parent: Optional[Any] = None, **attributes) -> Any:
+    """
+    Start an OpenTelemetry span, as a child of ``parent`` if given
+
+    Spans are started explicitly rather than made current, because agent turns are async
+    generators whose steps interleave with other requests on the loop. They are exported by
+    whatever OpenTelemetry SDK the deployment installs; with only the API (or nothing)
+    installed this costs next to nothing. Call ``end()`` on the result.
+    """
+    if _otel_trace is None:
+        return _NOOP_SPAN
+    context = _otel_trace.set_span_in_context(parent) if parent is not None and parent is not _NOOP_SPAN else None
+    return _otel_trace.get_tracer("backend").start_span(
+        name,
+        context=context,
+        attributes={key: value for key, value in attributes.items() if value is not None}
+    )
+
+
+def end_span(span: Any, error: Optional[BaseException] = None, **attributes):
+    """Set final attributes, record an error if any, and end the span"""
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+    if error is not None:
+        span.record_exception(error)
+        if _otel_trace is not None and span is not _NOOP_SPAN:
+            span.set_status(_otel_trace.Status(_otel_trace.StatusCode.ERROR, str(error)))
+    span.end()
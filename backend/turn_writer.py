@@ -0,0 +1,164 @@
+from typing import Any, Dict, List, Optional, Set, Union
+from dataclasses import dataclass, asdict, field
+from loguru import logger
+from .configs.config import PersistenceConfig, config
+from . import database
+import asyncio
+import time
+
+
+@dataclass
+class TurnRecord:
+    """Everything a finished chat turn writes to the database"""
+    session_id: str
+    messages: List[Dict[str, Any]]
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+    user_id: str = ""
+
+
+@dataclass
+class TurnWriterMetrics:
+    """Counters exposed by the write-behind queue"""
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    submitted: int = 0
+    flushes: int = 0
+    flushed_turns: int = 0
+    flush_seconds: float = 0.0
+    last_flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+    retries: int = 0
+    failed_turns: int = 0
+    overflows: int = 0
+
+    def to_dict(self) -> Dict[str, Union[int, float]]:
+        return asdict(self)
+
+
+_STOP = object()
+
+
+class TurnWriter:
+    """
+    Write-behind queue for chat turns.
+
+    The agent only enqueues finished turns; a background task batches them and writes each
+    batch with multi-row inserts in one transaction, flushing when ``batch_size`` turns are
+    waiting or ``flush_interval`` seconds after the first one arrived. Stopping the writer
+    drains everything that was queued before it.
+    """
+
+    def __init__(self, persistence_config: Optional[PersistenceConfig] = None):
+        self.config = persistence_config if persistence_config is not None else PersistenceConfig()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self._metrics = TurnWriterMetrics()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=max(1, self.config.max_queue))
+        self._task = asyncio.ensure_future(self._run())
+        logger.info("Turn writer started")
+
+    async def stop(self):
+        """Flush everything queued so far and stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=self.config.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Turn writer did not drain within {self.config.drain_timeout}s, {self._queue.qsize()} turns lost")
+            self._task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        self._task = None
+        logger.info("Turn writer stopped")
+
+    def submit(self, turn: TurnRecord):
+        """Queue a turn for persistence without waiting for the database"""
+        self._metrics.submitted += 1
+        if self.running:
+            try:
+                self._queue.put_nowait(turn)
+                self._metrics.queue_depth = self._queue.qsize()
+                self._metrics.max_queue_depth = max(self._metrics.max_queue_depth, self._metrics.queue_depth)
+                return
+            except asyncio.QueueFull:
+                self._metrics.overflows += 1
+        # Not started (or full): write this turn on its own rather than lose it
+        task = asyncio.ensure_future(self._flush([turn]))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def metrics(self) -> Dict[str, Union[int, float]]:
+        self._metrics.queue_depth = self._queue.qsize() if self._queue is not None else 0
+        return self._metrics.to_dict()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            turn = await self._queue.get()
+            if turn is _STOP:
+                break
+            batch = [turn]
+            deadline = loop.time() + self.config.flush_interval
+            while len(batch) < self.config.batch_size:
+                try:
+                    turn = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        turn = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if turn is _STOP:
+                    stopping = True
+                    break
+                batch.append(turn)
+            self._metrics.queue_depth = self._queue.qsize()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[TurnRecord]):
+        records = [asdict(turn) for turn in batch]
+        for attempt in range(self.config.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await database.save_turns(records)
+            except Exception as e:
+                if attempt < self.config.max_retries:
+                    self._metrics.retries += 1
+                    logger.warning(f"Failed to persist {len(batch)} turns (attempt {attempt + 1}): {str(e)}")
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                    continue
+                self._metrics.failed_turns += len(batch)
+                logger.error(f"Dropping {len(batch)} turns after {attempt + 1} attempts: {str(e)}", exc_info=True)
+                return
+            elapsed = time.perf_counter() - started
+            self._metrics.flushes += 1
+            self._metrics.flushed_turns += len(batch)
+            self._metrics.flush_seconds += elapsed
+            self._metrics.last_flush_seconds = elapsed
+            self._metrics.max_flush_seconds = max(self._metrics.max_flush_seconds, elapsed)
+            logger.debug("Persisted {} turns in {:.1f}ms", len(batch), elapsed * 1000)
+            return
+
+
+_writer: Optional[TurnWriter] = None
+
+
+def get_turn_writer() -> TurnWriter:
+    """Get the process-wide turn writer"""
+    global _writer
+    if _writer is None:
+        _writer = TurnWriter(config.persistence)
+    return _writer
@@ -52,3 +52,6 @@ class FileRecord(BaseModel):
     filename: str
     filepath: str
     uploaded_at: datetime
+    content_type: str = "application/octet-stream"
+    size: int = 0
+    sha256: str = ""
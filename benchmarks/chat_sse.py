@@ -0,0 +1,311 @@
+"""
+End-to-end chat streaming benchmark that needs no network access.
+
+Usage:
+    python -m benchmarks.chat_sse --clients 1 10 50 --turns 3
+    python -m benchmarks.chat_sse --clients 50 --check          # fail on regressions
+    python -m benchmarks.chat_sse --clients 1 10 50 --save-baseline
+    python -m benchmarks.chat_sse --clients 50 --stacks         # where the loop blocked
+
+The FastAPI app from backend/api.py is served by uvicorn on a loopback port in a
+background thread. LiteLLM is replaced by a mock provider that answers the first step of
+every turn with a search tool call and the next one with ``--tokens`` content tokens, after
+``--ttft-ms`` and at ``--token-rate`` tokens per second. The search tool is a stub that
+sleeps ``--tool-ms``. N concurrent clients each create a session and send ``--turns``
+messages to ``/api/messages/``, reading the SSE stream as a browser would.
+
+Reported per client count: turns/s, streamed tokens/s, client-side time to first text
+frame (p50/p95/p99), turn latency p95, the server event loop's scheduling lag (p99, max)
+and resident memory growth per session. Results are compared against
+benchmarks/baselines/chat_sse.json; metrics worse than ``--tolerance`` are flagged.
+"""
+from pathlib import Path
+from types import SimpleNamespace
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+# Use LiteLLM's bundled model cost map instead of fetching it at import time
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import httpx  # noqa: E402
+import litellm  # noqa: E402
+import uvicorn  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "chat_sse.json"
+# Whether a larger value is better, for regression checks
+HIGHER_IS_BETTER = {"turns_per_s": True, "tokens_per_s": True}
+# Millisecond metrics must also move by this much to count, so scheduler jitter on small
+# values (a 2 ms lag becoming 4 ms) is not reported as a regression
+MIN_DELTA_MS = 10.0
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _chunk(content=None, tool_call=None, usage=None):
+    delta = SimpleNamespace(content=content, tool_calls=[tool_call] if tool_call else None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)] if usage is None else [], usage=usage)
+
+
+def mock_provider(ttft: float, token_rate: float, tokens: int):
+    """A stand-in for ``litellm.acompletion`` streaming tool calls and tokens on a schedule"""
+    interval = 1 / token_rate if token_rate > 0 else 0.0
+
+    async def acompletion(**kwargs):
+        messages = kwargs.get("messages") or []
+        query = next((message.get("content") for message in reversed(messages) if message.get("role") == "user"), "")
+
+        async def stream():
+            await asyncio.sleep(ttft)
+            if kwargs.get("tool_choice") == "required":
+                function = SimpleNamespace(name="search_duckduckgo", arguments=json.dumps({"query": query}))
+                yield _chunk(tool_call=SimpleNamespace(index=0, id=None, function=function))
+                yield _chunk(usage=SimpleNamespace(prompt_tokens=len(messages) * 50, completion_tokens=10))
+                return
+            for index in range(tokens):
+                if index and interval:
+                    await asyncio.sleep(interval)
+                yield _chunk(content=f"tok{index} ")
+            yield _chunk(usage=SimpleNamespace(prompt_tokens=len(messages) * 50, completion_tokens=tokens))
+
+        return stream()
+
+    return acompletion
+
+
+def stub_search(latency: float):
+    async def search_duckduckgo(query: str, max_results: int = 5):
+        await asyncio.sleep(latency)
+        return [{"title": f"Result {i} for {query}", "link": f"https://example.com/{i}", "snippet": "stub"} for i in range(max_results)]
+
+    return search_duckduckgo
+
+
+class LagProbe:
+    """Measures how late a periodic timer fires on the server's event loop"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def reset(self):
+        self.samples = []
+
+
+class Server:
+    """The application served by uvicorn on its own event loop in a background thread"""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+        self.probe = LagProbe()
+        self.thread = threading.Thread(target=self._run, name="benchmark-server", daemon=True)
+
+    def _run(self):
+        async def serve():
+            self.probe.start()
+            await self.server.serve()
+
+        asyncio.run(serve())
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Benchmark server did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+async def run_client(client: httpx.AsyncClient, turns: int, results: dict):
+    response = await client.post("/api/sessions/", json={"title": "benchmark"})
+    response.raise_for_status()
+    session_id = response.json()["id"]
+    for turn in range(turns):
+        started = time.perf_counter()
+        first_text = None
+        text = []
+        payload = {"session_id": session_id, "content": f"question {turn}", "use_cache": False}
+        async with client.stream("POST", "/api/messages/", json=payload) as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                frame = json.loads(line[6:])
+                if frame["type"] == "text":
+                    if first_text is None:
+                        first_text = time.perf_counter() - started
+                    text.append(frame["content"])
+                elif frame["type"] == "error":
+                    results["errors"] += 1
+        results["turn_latency"].append(time.perf_counter() - started)
+        if first_text is not None:
+            results["ttft"].append(first_text)
+        results["tokens"] += len("".join(text).split())
+
+
+async def run_scenario(port: int, clients: int, turns: int) -> dict:
+    results = {"ttft": [], "turn_latency": [], "tokens": 0, "errors": 0}
+    limits = httpx.Limits(max_connections=clients + 10, max_keepalive_connections=clients + 10)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_client(client, turns, results) for _ in range(clients)))
+        results["wall"] = time.perf_counter() - started
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def scenario_key(args, clients: int) -> str:
+    return f"clients={clients},turns={args.turns},tokens={args.tokens},rate={args.token_rate:g},ttft_ms={args.ttft_ms:g},tool_ms={args.tool_ms:g}"
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Names of metrics that got worse than the baseline by more than ``tolerance``"""
+    regressions = []
+    for name, reference in baseline.items():
+        value = result.get(name)
+        if value is None or not reference:
+            continue
+        change = (value - reference) / reference
+        if HIGHER_IS_BETTER.get(name, False):
+            change = -change
+        if name.endswith("_ms") and value - reference < MIN_DELTA_MS:
+            continue
+        if change > tolerance:
+            regressions.append(f"{name} {reference:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-rate", type=float, default=500.0, help="Mock provider tokens per second")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Mock provider time to first token")
+    parser.add_argument("--tool-ms", type=float, default=50.0, help="Stub search tool latency")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any metric regressed")
+    parser.add_argument("--stacks", action="store_true", help="Report the call sites that blocked the server loop")
+    args = parser.parse_args()
+    if args.stacks:
+        os.environ["LOOP_MONITOR_STACKS"] = "true"
+
+    # Imported late: the app reads its configuration from the environment at import time
+    from backend import api, database
+    from backend.core.agents.chat_agent import ChatAgent
+    from backend.loop_monitor import get_loop_monitor
+    from backend.log import configure_logging
+
+    configure_logging("WARNING")
+    workdir = tempfile.TemporaryDirectory(prefix="chat-bench-")
+    database.DB_PATH = Path(workdir.name) / "benchmark.db"
+    litellm.acompletion = mock_provider(args.ttft_ms / 1000, args.token_rate, args.tokens)
+    ChatAgent().tool_registry.register("search_duckduckgo", stub_search(args.tool_ms / 1000))
+
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    regressed = False
+    port = free_port()
+    os.chdir(ROOT)  # the app serves ./frontend
+    print(
+        f"{'clients':>7} {'turns/s':>8} {'tokens/s':>9} {'ttft p50':>9} {'ttft p95':>9} {'ttft p99':>9} "
+        f"{'turn p95':>9} {'lag p99':>8} {'lag max':>8} {'rss/sess':>9} {'errors':>6}"
+    )
+    with Server(api.app, port) as server:
+        # One untimed turn pays for lazy imports, database setup and index creation
+        asyncio.run(run_scenario(port, 1, 1))
+        for clients in args.clients:
+            server.probe.reset()
+            rss_before = rss_bytes()
+            results = asyncio.run(run_scenario(port, clients, args.turns))
+            lag = list(server.probe.samples)
+            summary = {
+                "turns_per_s": len(results["turn_latency"]) / results["wall"],
+                "tokens_per_s": results["tokens"] / results["wall"],
+                "ttft_p50_ms": percentile(results["ttft"], 0.5) * 1000,
+                "ttft_p95_ms": percentile(results["ttft"], 0.95) * 1000,
+                "ttft_p99_ms": percentile(results["ttft"], 0.99) * 1000,
+                "turn_p95_ms": percentile(results["turn_latency"], 0.95) * 1000,
+                "loop_lag_p99_ms": percentile(lag, 0.99) * 1000,
+                "loop_lag_max_ms": max(lag, default=0.0) * 1000,
+                "rss_per_session_kb": max(0, rss_bytes() - rss_before) / clients / 1024,
+            }
+            print(
+                f"{clients:>7} {summary['turns_per_s']:>8.2f} {summary['tokens_per_s']:>9.0f} "
+                f"{summary['ttft_p50_ms']:>9.1f} {summary['ttft_p95_ms']:>9.1f} {summary['ttft_p99_ms']:>9.1f} "
+                f"{summary['turn_p95_ms']:>9.1f} {summary['loop_lag_p99_ms']:>8.1f} {summary['loop_lag_max_ms']:>8.1f} "
+                f"{summary['rss_per_session_kb']:>9.1f} {results['errors']:>6}"
+            )
+
+            key = scenario_key(args, clients)
+            if key in baselines:
+                # Memory growth is too noisy between runs to gate on
+                reference = {name: value for name, value in baselines[key].items() if name != "rss_per_session_kb"}
+                regressions = compare(summary, reference, args.tolerance)
+                if regressions:
+                    regressed = True
+                    print(f"  REGRESSION vs baseline: {'; '.join(regressions)}")
+            if args.save_baseline:
+                baselines[key] = {name: round(value, 3) for name, value in summary.items()}
+            if results["errors"]:
+                regressed = True
+
+        if args.stacks:
+            print("Call sites that blocked the server loop (total ms, stalls, max ms):")
+            for site in get_loop_monitor().top_sites(10):
+                print(f"  {site['total_seconds'] * 1000:>8.1f} {site['count']:>4} {site['max_seconds'] * 1000:>8.1f}  {site['name']}")
+
+    if args.save_baseline:
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {BASELINE_PATH.relative_to(ROOT)}")
+    workdir.cleanup()
+    if args.check and regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
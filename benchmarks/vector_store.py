@@ -0,0 +1,82 @@
+"""
+Query latency of the memory-mapped vector store against corpus size.
+
+Usage:
+    python -m benchmarks.vector_store --sizes 10000 100000 1000000 --dim 384
+
+Each corpus is appended in batches to a fresh store in a temporary directory, then timed
+for single queries (p50/p95) and batched queries (per-query cost). Disk needed is roughly
+size * dim * 4 bytes per corpus.
+"""
+from pathlib import Path
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.core.vectors import VectorStore  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(size: int, dim: int, k: int, queries: int, batch: int, segment_capacity: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory(prefix="vector-bench-") as directory:
+        store = VectorStore(directory, dim=dim, segment_capacity=segment_capacity)
+        started = time.perf_counter()
+        for start in range(0, size, 50_000):
+            store.add(rng.standard_normal((min(50_000, size - start), dim), dtype=np.float32))
+        build = time.perf_counter() - started
+
+        probes = rng.standard_normal((queries, dim), dtype=np.float32)
+        store.search(probes[0], k)  # warm the page cache
+        single = []
+        for probe in probes:
+            started = time.perf_counter()
+            store.search(probe, k)
+            single.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        for start in range(0, queries, batch):
+            store.search(probes[start:start + batch], k)
+        batched = (time.perf_counter() - started) * 1000 / queries
+
+        return {
+            "size": size,
+            "segments": store.stats()["segments"],
+            "build_s": build,
+            "p50_ms": statistics.median(single),
+            "p95_ms": percentile(single, 0.95),
+            "batched_ms_per_query": batched,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--segment-capacity", type=int, default=65536)
+    args = parser.parse_args()
+
+    print(f"{'vectors':>10} {'segments':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'batched ms/q':>13}")
+    for size in args.sizes:
+        result = run(size, args.dim, args.k, args.queries, args.batch, args.segment_capacity)
+        print(
+            f"{result['size']:>10} {result['segments']:>8} {result['build_s']:>8.2f} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['batched_ms_per_query']:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
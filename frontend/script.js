@@ -171,28 +171,41 @@ async function sendMessage() {
         const thinkingSteps = assistantMessage.querySelector('.thinking-steps');
         const messageText = assistantMessage.querySelector('.message-text');
         let finalResponse = '';
+        let pending = '';
+        const toolSteps = {};
         
         while (true) {
             const {value, done} = await reader.read();
             if (done) break;
             
-            const chunk = decoder.decode(value);
-            console.log('Received chunk:', chunk);
-            
-            const lines = chunk.split('\n');
+            // A network read can end in the middle of a line; keep the tail for the next read
+            pending += decoder.decode(value, {stream: true});
+            const lines = pending.split('\n');
+            pending = lines.pop();
             
             for (const line of lines) {
                 if (line.startsWith('data: ')) {
                     try {
                         const data = JSON.parse(line.slice(6));
-                        console.log('Parsed data:', data);
                         
-                        if (data.type === 'thinking' || data.type === 'tool_call') {
-                            const stepElement = createThinkingStepElement(data);
-                            thinkingSteps.appendChild(stepElement);
-                        } else {
+                        if (data.type === 'text') {
                             finalResponse += data.content;
                             messageText.textContent = finalResponse;
+                        } else if (data.type === 'tool_call') {
+                            const stepElement = createThinkingStepElement(data);
+                            toolSteps[data.id] = {step: data, element: stepElement};
+                            thinkingSteps.appendChild(stepElement);
+                        } else if (data.type === 'tool_result') {
+                            const toolStep = toolSteps[data.id];
+                            const step = toolStep ? toolStep.step : {type: 'tool_call', tool_name: data.tool_name, tool_args: {}};
+                            const stepElement = createThinkingStepElement({...step, tool_result: data.tool_result});
+                            if (toolStep) {
+                                toolStep.element.replaceWith(stepElement);
+                            } else {
+                                thinkingSteps.appendChild(stepElement);
+                            }
+                        } else if (data.type === 'error') {
+                            thinkingSteps.appendChild(createThinkingStepElement({type: 'thinking', content: data.content}));
                         }
                     } catch (e) {
                         console.error('Error parsing message:', e, 'Line:', line);
@@ -0,0 +1,5 @@
+import os
+
+# The backend configuration refuses to load without an API key; tests never hit the provider
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
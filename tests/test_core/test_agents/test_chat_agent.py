@@ -0,0 +1,142 @@
+import asyncio
+from backend.configs.config import LLMConfig, ResponseCacheConfig
+from backend.core.agents import chat_agent as chat_agent_module
+from backend.core.agents.chat_agent import ChatAgent
+from backend.core.generator.embedding import HashingEmbedder
+from backend.core.generator.response_cache import ResponseCache
+from backend.core.events import TextDelta, ToolCallEvent, ToolResultEvent, DoneEvent
+
+
+class FakeLLM:
+    """Stands in for LLMInstance and records the prompts it receives"""
+
+    def __init__(self, reply: str):
+        self.config = LLMConfig()
+        self.reply = reply
+        self.prompts = []
+
+    async def stream_acomplete(self, messages, **kwargs):
+        self.prompts.append(messages)
+        for token in self.reply.split(" "):
+            await asyncio.sleep(0)
+            yield token + " "
+
+
+async def consume(agent: ChatAgent, content: str, session_id: str) -> str:
+    return "".join([
+        event.content async for event in agent.chat(content, session_id=session_id)
+        if isinstance(event, TextDelta)
+    ])
+
+
+def test_history_is_isolated_per_session():
+    async def run():
+        agent = ChatAgent()
+        fakes = {}
+        for session_id in ["session-a", "session-b"]:
+            await agent.remove_session(session_id)
+            state = await agent._get_state(session_id)
+            fakes[session_id] = state.llm = FakeLLM(f"reply for {session_id}")
+
+        await asyncio.gather(
+            consume(agent, "hello from a", "session-a"),
+            consume(agent, "hello from b", "session-b"),
+        )
+        await consume(agent, "second from a", "session-a")
+
+        history_a = await agent.get_messages("session-a")
+        history_b = await agent.get_messages("session-b")
+        assert [m["content"] for m in history_a] == [
+            "hello from a", "reply for session-a ", "second from a", "reply for session-a ",
+        ]
+        assert [m["content"] for m in history_b] == ["hello from b", "reply for session-b "]
+
+        # The second prompt of session a never contains session b's messages
+        last_prompt = fakes["session-a"].prompts[-1]
+        assert all("from b" not in m["content"] for m in last_prompt)
+        assert len(last_prompt) == 4  # system + user + assistant + user
+
+    asyncio.run(run())
+
+
+class ScriptedLLM:
+    """Requests a search on the first step and answers from the results on the second"""
+
+    def __init__(self):
+        self.config = LLMConfig()
+        self.calls = []
+
+    async def stream_acomplete(self, messages, stats=None, **kwargs):
+        self.calls.append({"messages": list(messages), "tool_choice": kwargs.get("tool_choice")})
+        if not any(message["role"] == "tool" for message in messages):
+            yield ToolCallEvent(id="call_1", name="search_duckduckgo", args={"query": "paris"})
+            yield ToolCallEvent(id="call_2", name="search_duckduckgo", args={"query": "france"})
+        else:
+            yield "Paris is the capital."
+
+
+def test_tool_results_are_sent_back_to_the_model(monkeypatch):
+    async def fake_search(query: str, max_results: int = 5):
+        return [{"title": "Paris", "link": "https://example.com", "snippet": f"about {query}"}]
+
+    async def run():
+        agent = ChatAgent()
+        monkeypatch.setitem(agent.tool_registry.tools, "search_duckduckgo", fake_search)
+        await agent.remove_session("tools")
+        state = await agent._get_state("tools")
+        state.llm = ScriptedLLM()
+
+        events = [event async for event in agent.chat("capital of France?", session_id="tools")]
+
+        assert len(state.llm.calls) == 2
+        assert state.llm.calls[0]["tool_choice"] == "required"
+        assert state.llm.calls[1]["tool_choice"] == "auto"
+        assistant_message, *tool_messages = state.llm.calls[1]["messages"][-3:]
+        assert [call["id"] for call in assistant_message["tool_calls"]] == ["call_1", "call_2"]
+        assert [message["tool_call_id"] for message in tool_messages] == ["call_1", "call_2"]
+        assert "about paris" in tool_messages[0]["content"] and "about france" in tool_messages[1]["content"]
+        assert [type(event) for event in events] == [
+            ToolCallEvent, ToolCallEvent, ToolResultEvent, ToolResultEvent, TextDelta, DoneEvent,
+        ]
+        assert [event.status for event in events[2:4]] == ["completed", "completed"]
+        assert events[4].content == "Paris is the capital."
+        assert events[5].steps == 2
+
+        history = await agent.get_messages("tools")
+        assert history[-1]["role"] == "assistant" and history[-1]["content"] == "Paris is the capital."
+        assert [step.index for step in state.last_trace.steps] == [0, 1]
+        assert state.last_trace.steps[0].tool_calls == ["search_duckduckgo", "search_duckduckgo"]
+
+    asyncio.run(run())
+
+
+def test_near_duplicate_question_is_answered_from_cache(monkeypatch):
+    async def fake_search(query: str, max_results: int = 5):
+        return [{"title": "Paris", "link": "https://example.com", "snippet": f"about {query}"}]
+
+    cache = ResponseCache(
+        ResponseCacheConfig(enabled=True, semantic=True, similarity_threshold=0.8), embedder=HashingEmbedder()
+    )
+    monkeypatch.setattr(chat_agent_module, "get_response_cache", lambda: cache)
+
+    async def run():
+        agent = ChatAgent()
+        monkeypatch.setitem(agent.tool_registry.tools, "search_duckduckgo", fake_search)
+        llms = {}
+        for session_id in ["cached-first", "cached-second"]:
+            await agent.remove_session(session_id)
+            state = await agent._get_state(session_id)
+            llms[session_id] = state.llm = ScriptedLLM()
+
+        await consume(agent, "What is the capital of France?", "cached-first")
+        events = [event async for event in agent.chat("what is the capital of france", session_id="cached-second")]
+
+        # The final answer is replayed; neither the model nor the search tool runs again
+        assert len(llms["cached-first"].calls) == 2 and llms["cached-second"].calls == []
+        assert "".join(event.content for event in events if isinstance(event, TextDelta)) == "Paris is the capital."
+        assert isinstance(events[-1], DoneEvent) and events[-1].steps == 0
+        history = await agent.get_messages("cached-second")
+        assert [message["content"] for message in history] == ["what is the capital of france", "Paris is the capital."]
+        assert cache.metrics()["semantic_hits"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+import asyncio
+from backend.configs.config import LLMConfig
+from backend.configs.prompt import PromptManager
+from backend.core.agents.context_window import ContextWindow
+from backend.core.session import SessionState
+
+
+class FakeLLM:
+    def __init__(self):
+        self.config = LLMConfig()
+        self.prompts = []
+
+    async def acomplete(self, messages, **kwargs):
+        self.prompts.append(messages[0]["content"])
+        return "short summary"
+
+
+def make_window(budget: int) -> ContextWindow:
+    config = LLMConfig()
+    config.context_budget_tokens = budget
+    config.context_summary_ratio = 0.75
+    return ContextWindow(config, PromptManager(config.model_name))
+
+
+def make_state(turns: int) -> SessionState:
+    state = SessionState(session_id="ctx", llm=FakeLLM())
+    for index in range(turns):
+        state.messages.append({"role": "user", "content": f"question {index} " + "word " * 40})
+        state.messages.append({"role": "assistant", "content": f"answer {index} " + "word " * 40})
+    state.messages.append({"role": "user", "content": "latest question"})
+    return state
+
+
+def test_token_counts_are_cached_on_messages():
+    window = make_window(100000)
+    state = make_state(2)
+    window.build(state, "system")
+    assert all("tokens" in message for message in state.messages)
+
+    prompt = window.build(state, "system")
+    assert all("tokens" not in message for message in prompt)
+    assert len(prompt) == len(state.messages) + 1
+
+
+def test_prompt_is_trimmed_to_budget_and_summarized():
+    async def run():
+        window = make_window(300)
+        state = make_state(10)
+
+        async with state.lock:
+            prompt = window.build(state, "system")
+        total = sum(window.count_tokens(dict(message), "gpt-4.1-mini") for message in prompt)
+        assert total <= 300
+        assert prompt[-1]["content"] == "latest question"
+
+        await window.wait(state.session_id)
+        assert state.summary == "short summary"
+        assert state.summarized_upto > 0
+        assert state.messages[state.summarized_upto]["role"] == "user"
+        assert "Please summarize" in state.llm.prompts[0]
+
+        async with state.lock:
+            prompt = window.build(state, "system")
+        assert "short summary" in prompt[0]["content"]
+
+    asyncio.run(run())
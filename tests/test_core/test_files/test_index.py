@@ -0,0 +1,119 @@
+import asyncio
+from backend.configs.config import FileConfig
+from backend.core.files import FileIndex, chunk_text
+from backend.core.tools.tool_registry import ToolRegistry
+
+
+def test_chunk_text_overlaps_and_respects_size():
+    text = " ".join(f"word{i}" for i in range(2000))
+    pieces = [text[i:i + 1000] for i in range(0, len(text), 1000)]
+    chunks = chunk_text(pieces, chunk_chars=300, overlap=50)
+
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert chunks[0].startswith("word0 ") and chunks[-1].endswith("word1999")
+    # Consecutive chunks share their boundary text
+    assert chunks[1].split()[0] in chunks[0]
+
+
+def write_file(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def make_record(path, file_id, session_id="s1", sha256=None):
+    return {
+        "id": file_id, "session_id": session_id, "filename": path.name, "filepath": str(path),
+        "content_type": "text/plain", "sha256": sha256 or file_id
+    }
+
+
+def test_ingest_and_search_per_session(tmp_path):
+    config = FileConfig(index_dir=str(tmp_path / "index"), chunk_chars=200, chunk_overlap=20)
+    fruit = write_file(tmp_path, "fruit.txt", "Bananas are yellow and rich in potassium. " * 20)
+    rockets = write_file(tmp_path, "rockets.md", "Liquid rocket engines burn kerosene with liquid oxygen. " * 20)
+
+    async def run():
+        index = FileIndex(config)
+        try:
+            index.schedule(make_record(fruit, "f1"))
+            index.schedule(make_record(rockets, "f2"))
+            await index.wait()
+            hits = await index.search("s1", "which engines burn kerosene", k=3)
+            other_session = await index.search("s2", "kerosene")
+
+            removed = await index.remove_file("s1", "f2")
+            after_removal = await index.search("s1", "kerosene", k=3)
+
+            # A fresh instance reopens the memory-mapped index from disk
+            reopened = await FileIndex(config).search("s1", "bananas potassium", k=1)
+            return hits, other_session, removed, after_removal, reopened, index.metrics()
+        finally:
+            index.shutdown()
+
+    hits, other_session, removed, after_removal, reopened, metrics = asyncio.run(run())
+    assert [hit["filename"] for hit in hits] == ["rockets.md"] * 3
+    assert hits[0]["score"] >= hits[-1]["score"]
+    assert other_session == []
+    assert removed > 0 and all(hit["file_id"] == "f1" for hit in after_removal)
+    assert reopened[0]["filename"] == "fruit.txt"
+    assert metrics["ingested_files"] == 2 and metrics["pending"] == 0
+
+
+def test_duplicate_content_is_indexed_once(tmp_path):
+    config = FileConfig(index_dir=str(tmp_path / "index"))
+    path = write_file(tmp_path, "notes.txt", "same content")
+
+    async def run():
+        index = FileIndex(config)
+        try:
+            # Concurrent uploads of the same bytes both pass the early check
+            counts = await asyncio.gather(*(index.ingest(make_record(path, name, sha256="abc")) for name in "ab"))
+            later = await index.ingest(make_record(path, "c", sha256="abc"))
+            async with index._session_index("s1") as session_index:
+                return sorted(counts), later, len(session_index)
+        finally:
+            index.shutdown()
+
+    assert asyncio.run(run()) == ([0, 1], 0, 1)
+
+
+def test_indexes_in_use_are_not_evicted(tmp_path):
+    config = FileConfig(index_dir=str(tmp_path / "index"))
+
+    async def run():
+        index = FileIndex(config, max_open=1)
+        try:
+            async with index._session_index("s1") as first:
+                async with index._session_index("s2"):
+                    pass
+                async with index._session_index("s1") as again:
+                    assert again is first
+            # Once released, the least recently used index is closed
+            async with index._session_index("s3"):
+                pass
+            return list(index._indexes)
+        finally:
+            index.shutdown()
+
+    assert asyncio.run(run()) == ["s3"]
+
+
+def test_registry_passes_session_to_session_aware_tools():
+    registry = ToolRegistry()
+
+    async def scoped(query: str, session_id=None):
+        return f"{session_id}:{query}"
+
+    registry.register("scoped", scoped)
+
+    async def run():
+        outcomes = await registry.run_tools(
+            [{"name": "scoped", "parameters": {"query": "q", "session_id": "spoofed"}}], session_id="s1"
+        )
+        return outcomes[0]
+
+    outcome = asyncio.run(run())
+    assert outcome.result == "s1:q"
+    # The recorded parameters are the model's, untouched
+    assert outcome.parameters == {"query": "q", "session_id": "spoofed"}
@@ -0,0 +1,51 @@
+import numpy as np
+from backend.core.files import BM25Index, SessionIndex, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("Got ERR-4012 from sku_77.1") == ["got", "err-4012", "err", "4012", "from", "sku_77.1", "sku", "77", "1"]
+
+
+def test_bm25_ranks_deletes_and_rebuilds():
+    index = BM25Index()
+    index.add([10, 11, 12], [
+        "the printer shows ERR-4012 after a paper jam",
+        "the printer is out of toner",
+        "restart the router to fix the network",
+    ])
+
+    assert [chunk_id for chunk_id, _ in index.search("ERR-4012 printer", k=3)] == [10, 11]
+    assert index.search("4012", k=3)[0][0] == 10
+    assert index.search("nothing matches", k=3) == []
+
+    index.delete([10])
+    assert [chunk_id for chunk_id, _ in index.search("printer", k=3)] == [11]
+    assert len(index) == 2
+
+    before = index.nbytes()
+    index.rebuild([(11, "the printer is out of toner"), (12, "restart the router to fix the network")])
+    assert index.nbytes() < before
+    assert [chunk_id for chunk_id, _ in index.search("router printer", k=1)] in ([11], [12])
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert [chunk_id for chunk_id, _ in fused] == [1, 3, 2, 4]
+    assert reciprocal_rank_fusion([[1, 2], [2]], limit=1)[0][0] == 2
+
+
+def test_hybrid_search_finds_exact_codes_vectors_miss(tmp_path):
+    index = SessionIndex(tmp_path / "session")
+    texts = [f"routine log line number {i}" for i in range(30)] + ["fatal error ERR-4012 in the payment service"]
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((len(texts), 16), dtype=np.float32)
+    index.add("f1", "log.txt", "abc", texts, vectors)
+
+    # A query embedding unrelated to the target chunk: only the keyword ranking can find it
+    hits = index.search("ERR-4012", -vectors[-1], k=3, candidates=5)
+    match = next(hit for hit in hits if hit["text"].startswith("fatal error"))
+    assert match["lexical_score"] > 0 and match["semantic_score"] is None
+
+    # Postings are rebuilt from chunks.jsonl when the index is reopened
+    reopened = SessionIndex(tmp_path / "session")
+    assert any(hit["text"].startswith("fatal error") for hit in reopened.search("ERR-4012", -vectors[-1], k=3, candidates=5))
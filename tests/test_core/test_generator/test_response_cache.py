@@ -0,0 +1,162 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from backend.configs.config import LLMConfig, ResponseCacheConfig
+from backend.core.generator import llm as llm_module
+from backend.core.generator.embedding import HashingEmbedder
+from backend.core.generator.llm import LLMInstance, StreamStats
+from backend.core.generator.response_cache import ResponseCache
+from backend.core.events import ToolCallEvent
+
+
+def fake_chunk(content=None, usage=None):
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=usage)
+
+
+def install_fake_provider(monkeypatch, reply: str):
+    requests = []
+
+    async def fake_acompletion(**kwargs):
+        requests.append(kwargs)
+
+        async def stream():
+            for word in reply.split(" "):
+                yield fake_chunk(word + " ")
+            yield SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=10, completion_tokens=3))
+
+        return stream()
+
+    monkeypatch.setattr(llm_module.litellm, "acompletion", fake_acompletion)
+    return requests
+
+
+def use_cache(monkeypatch, **overrides) -> ResponseCache:
+    cache = ResponseCache(ResponseCacheConfig(**{"enabled": True, **overrides}), embedder=HashingEmbedder())
+    monkeypatch.setattr(llm_module, "get_response_cache", lambda: cache)
+    return cache
+
+
+async def collect(generator):
+    return "".join([chunk async for chunk in generator])
+
+
+def prompt(question: str):
+    return [{"role": "system", "content": "You are helpful."}, {"role": "user", "content": question}]
+
+
+def test_exact_hit_replays_the_stream_without_a_provider_call(monkeypatch):
+    requests = install_fake_provider(monkeypatch, "Paris is the capital")
+    cache = use_cache(monkeypatch)
+    instance = LLMInstance(LLMConfig())
+
+    async def run():
+        first = await collect(instance.stream_acomplete(prompt("Capital of France?")))
+        stats = StreamStats()
+        second = await collect(instance.stream_acomplete(prompt("Capital of France?"), stats=stats))
+        return first, second, stats
+
+    first, second, stats = asyncio.run(run())
+    assert first == second == "Paris is the capital "
+    assert len(requests) == 1
+    assert stats.time_to_first_token is not None
+    assert cache.metrics()["exact_hits"] == 1
+
+
+def test_bypass_and_different_parameters_miss(monkeypatch):
+    requests = install_fake_provider(monkeypatch, "answer")
+    use_cache(monkeypatch)
+    instance = LLMInstance(LLMConfig())
+
+    async def run():
+        await collect(instance.stream_acomplete(prompt("q")))
+        await collect(instance.stream_acomplete(prompt("q"), use_cache=False))
+        await collect(instance.stream_acomplete(prompt("q"), temperature=0.1))
+
+    asyncio.run(run())
+    assert len(requests) == 3
+
+
+def test_semantic_hit_requires_same_context(monkeypatch):
+    requests = install_fake_provider(monkeypatch, "Paris")
+    cache = use_cache(monkeypatch, semantic=True, similarity_threshold=0.8)
+    instance = LLMInstance(LLMConfig())
+
+    async def run():
+        await collect(instance.stream_acomplete(prompt("What is the capital of France?")))
+        near = await collect(instance.stream_acomplete(prompt("what is the capital of france")))
+        other_context = [{"role": "system", "content": "Be terse."}, {"role": "user", "content": "What is the capital of France?"}]
+        await collect(instance.stream_acomplete(other_context))
+        await collect(instance.stream_acomplete(prompt("How tall is Mount Everest?")))
+        return near
+
+    assert asyncio.run(run()) == "Paris "
+    assert len(requests) == 3
+    assert cache.metrics()["semantic_hits"] == 1
+
+
+def test_tool_call_responses_are_not_matched_semantically():
+    async def run():
+        cache = ResponseCache(ResponseCacheConfig(enabled=True, semantic=True, similarity_threshold=0.8), embedder=HashingEmbedder())
+        call = ToolCallEvent(id="call_1", name="search_duckduckgo", args={"query": "capital of france"})
+        await cache.store("key", "", [call], scope="scope", text="What is the capital of France?")
+        return cache.get("key"), await cache.get_similar("scope", "what is the capital of france")
+
+    exact, similar = asyncio.run(run())
+    assert exact is not None and similar is None
+
+
+def test_cache_is_bounded_and_recycles_semantic_rows():
+    async def run():
+        cache = ResponseCache(ResponseCacheConfig(enabled=True, max_entries=2, semantic=True), embedder=HashingEmbedder())
+        for index in range(5):
+            await cache.store(f"key-{index}", f"answer {index}", [], scope="scope", text=f"question number {index}")
+        return cache
+
+    cache = asyncio.run(run())
+    assert len(cache) == 2
+    assert cache.metrics()["evictions"] == 3
+    assert sorted(key for key in cache._row_keys if key) == ["key-3", "key-4"]
+
+
+class SlowEmbedder(HashingEmbedder):
+    async def embed(self, texts):
+        await asyncio.sleep(0.01)
+        return await super().embed(texts)
+
+
+def test_concurrent_stores_at_capacity_stay_bounded():
+    async def run():
+        cache = ResponseCache(ResponseCacheConfig(enabled=True, max_entries=3, semantic=True), embedder=SlowEmbedder())
+        await asyncio.gather(*(
+            cache.store(f"key-{index}", f"answer {index}", [], scope="scope", text=f"question {index}")
+            for index in range(10)
+        ))
+        return cache
+
+    cache = asyncio.run(run())
+    assert len(cache) == 3 and cache.metrics()["stores"] == 10
+    # Every cached entry kept its semantic row
+    assert all(entry.row is not None for entry in cache._entries.values())
+    assert sorted(key for key in cache._row_keys if key) == sorted(cache._entries)
+
+
+def test_missing_usage_is_counted_off_the_event_loop(monkeypatch):
+    async def fake_acompletion(**kwargs):
+        async def stream():
+            yield fake_chunk("Paris")
+        return stream()
+
+    counted_on = []
+
+    def fake_token_counter(model, messages=None, text=None):
+        counted_on.append(threading.get_ident())
+        return 12 if messages is not None else 1
+
+    monkeypatch.setattr(llm_module.litellm, "acompletion", fake_acompletion)
+    monkeypatch.setattr(llm_module.litellm, "token_counter", fake_token_counter)
+    monkeypatch.setattr(llm_module, "get_response_cache", lambda: None)
+    stats = StreamStats()
+    assert asyncio.run(collect(LLMInstance(LLMConfig()).stream_acomplete(prompt("q"), stats=stats))) == "Paris"
+    assert (stats.prompt_tokens, stats.completion_tokens) == (12, 1)
+    assert counted_on and threading.get_ident() not in counted_on
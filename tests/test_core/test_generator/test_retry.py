@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from backend.configs.config import LLMConfig
+from backend.core.generator.retry import RetryBudget, RetryMetrics, RetryPolicy, retry_after
+
+
+class Transient(Exception):
+    status_code = 503
+
+    def __init__(self, retry_after=None):
+        super().__init__("unavailable")
+        self.retry_after = retry_after
+
+
+def make_policy(attempts=3, budget=None, max_delay=1.0):
+    config = LLMConfig(retry_attempts=attempts, retry_base_delay=0.001, retry_max_delay=max_delay)
+    return RetryPolicy(config, budget=budget or RetryBudget(), metrics=RetryMetrics())
+
+
+def flaky(failures, result="ok", error=Transient):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error()
+        return result
+
+    return call, calls
+
+
+def test_retries_transient_errors_up_to_the_limit():
+    policy = make_policy(attempts=3)
+    call, calls = flaky(2)
+    assert asyncio.run(policy.call(call)) == "ok"
+    assert len(calls) == 3 and policy.metrics.retries == 2
+
+    call, calls = flaky(10)
+    with pytest.raises(Transient):
+        asyncio.run(policy.call(call))
+    assert len(calls) == 4 and policy.metrics.exhausted == 1
+
+
+def test_request_errors_are_not_retried():
+    policy = make_policy()
+    call, calls = flaky(1, error=ValueError)
+    with pytest.raises(ValueError):
+        asyncio.run(policy.call(call))
+    assert len(calls) == 1
+
+
+def test_retry_after_is_honoured_or_too_long():
+    policy = make_policy(max_delay=1.0)
+    assert policy.next_delay(Transient(retry_after=0.5), 0) == 0.5
+    assert policy.next_delay(Transient(retry_after=30), 0) is None
+
+    headers = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "2"}))
+    assert retry_after(headers) == 2.0
+    assert retry_after(Exception()) is None
+
+
+def test_budget_limits_retries_across_calls():
+    policy = make_policy(budget=RetryBudget(ratio=0.0, min_retries=1))
+    call, calls = flaky(5)
+    with pytest.raises(Transient):
+        asyncio.run(policy.call(call))
+    # One retry fits the budget, the next is rejected
+    assert len(calls) == 2 and policy.metrics.budget_rejections == 1
+
+
+def test_streams_restart_only_before_output():
+    policy = make_policy()
+    attempts = []
+
+    def factory(fail_after):
+        async def stream():
+            attempts.append(1)
+            for index, token in enumerate(["a", "b", "c"]):
+                if index == fail_after and len(attempts) == 1:
+                    raise Transient()
+                yield token
+        return stream
+
+    async def collect(generator):
+        return [token async for token in generator]
+
+    assert asyncio.run(collect(policy.stream(factory(0)))) == ["a", "b", "c"]
+    assert len(attempts) == 2
+
+    attempts.clear()
+    received = []
+
+    async def partial():
+        async for token in policy.stream(factory(2)):
+            received.append(token)
+
+    with pytest.raises(Transient):
+        asyncio.run(partial())
+    assert received == ["a", "b"] and len(attempts) == 1
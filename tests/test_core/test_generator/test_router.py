@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from litellm.exceptions import BadRequestError, RateLimitError
+from backend.configs.config import LLMConfig
+from backend.core.generator import router as router_module
+from backend.core.generator.router import LLMRouter, NoDeploymentAvailableError, parse_deployments
+
+
+def rate_limited(model):
+    return RateLimitError(message="slow down", llm_provider="openai", model=model)
+
+
+def install_provider(monkeypatch, behaviour):
+    """behaviour(model) returns a list of chunks to stream, or raises"""
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs["model"])
+        chunks = behaviour(kwargs["model"])
+
+        async def stream():
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if chunk == "stall":
+                    await asyncio.sleep(10)
+                yield SimpleNamespace(text=chunk)
+
+        return stream() if kwargs.get("stream") else SimpleNamespace(text="".join(chunks))
+
+    monkeypatch.setattr(router_module.litellm, "acompletion", fake_acompletion)
+    return calls
+
+
+async def collect(router):
+    return [chunk.text async for chunk in router.stream(messages=[])]
+
+
+def test_parse_deployments_shorthand_and_json():
+    assert [(d.model, d.weight) for d in parse_deployments(LLMConfig(deployments="a=3, b"))] == [("a", 3.0), ("b", 1.0)]
+    parsed = parse_deployments(LLMConfig(deployments='[{"model": "a", "api_base": "http://x", "max_concurrency": 2}]'))
+    assert parsed[0].api_base == "http://x" and parsed[0].max_concurrency == 2
+    assert parse_deployments(LLMConfig(model_name="m"))[0].model == "m"
+
+
+def test_fails_over_on_rate_limit_and_opens_breaker(monkeypatch):
+    config = LLMConfig(deployments="primary=1000,backup=1", breaker_failures=2, breaker_cooldown=60)
+    calls = install_provider(monkeypatch, lambda model: (_ for _ in ()).throw(rate_limited(model)) if model == "primary" else ["ok"])
+    router = LLMRouter(config)
+
+    async def run():
+        return [await collect(router) for _ in range(4)]
+
+    assert asyncio.run(run()) == [["ok"]] * 4
+    # After two consecutive failures the breaker stops sending traffic to the primary
+    assert calls.count("primary") == 2 and calls.count("backup") == 4
+    states = {entry["name"]: entry for entry in router.metrics()}
+    assert states["primary"]["state"] == "open" and states["backup"]["ewma_ttft"] is not None
+
+
+def test_first_token_timeout_fails_over(monkeypatch):
+    config = LLMConfig(deployments="slow=1000,fast=1", first_token_timeout=0.05)
+    install_provider(monkeypatch, lambda model: ["stall"] if model == "slow" else ["a", "b"])
+    router = LLMRouter(config)
+    assert asyncio.run(collect(router)) == ["a", "b"]
+
+
+def test_errors_after_output_are_not_retried(monkeypatch):
+    config = LLMConfig(deployments="one,two")
+    calls = install_provider(monkeypatch, lambda model: ["partial", rate_limited(model)])
+    router = LLMRouter(config)
+    received = []
+
+    async def run():
+        async for chunk in router.stream(messages=[]):
+            received.append(chunk.text)
+
+    with pytest.raises(RateLimitError):
+        asyncio.run(run())
+    assert received == ["partial"] and len(calls) == 1
+
+
+def test_request_errors_are_raised_without_failover(monkeypatch):
+    calls = install_provider(
+        monkeypatch, lambda model: (_ for _ in ()).throw(BadRequestError(message="bad", model=model, llm_provider="openai"))
+    )
+    router = LLMRouter(LLMConfig(deployments="one,two"))
+    with pytest.raises(BadRequestError):
+        asyncio.run(router.acompletion(messages=[]))
+    assert len(calls) == 1
+
+
+def test_all_breakers_open(monkeypatch):
+    install_provider(monkeypatch, lambda model: (_ for _ in ()).throw(rate_limited(model)))
+    router = LLMRouter(LLMConfig(deployments="one", breaker_failures=1, breaker_cooldown=60))
+    with pytest.raises(RateLimitError):
+        asyncio.run(router.acompletion(messages=[]))
+    with pytest.raises(NoDeploymentAvailableError) as raised:
+        asyncio.run(router.acompletion(messages=[]))
+    assert raised.value.retry_after > 50
+
+
+def test_concurrency_limit(monkeypatch):
+    active, peak = 0, 0
+
+    async def fake_acompletion(**kwargs):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return SimpleNamespace(text="ok")
+
+    monkeypatch.setattr(router_module.litellm, "acompletion", fake_acompletion)
+    router = LLMRouter(LLMConfig(deployments='[{"model": "m", "max_concurrency": 2}]'))
+
+    async def run():
+        await asyncio.gather(*(router.acompletion(messages=[]) for _ in range(6)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_cancelled_half_open_probe_releases_deployment(monkeypatch):
+    outcomes = iter([rate_limited("one"), "stall", "ok"])
+    closed = []
+
+    async def fake_acompletion(**kwargs):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+
+        async def stream():
+            try:
+                if outcome == "stall":
+                    await asyncio.sleep(10)
+                yield SimpleNamespace(text=outcome)
+            finally:
+                closed.append(outcome)
+
+        return stream()
+
+    monkeypatch.setattr(router_module.litellm, "acompletion", fake_acompletion)
+    router = LLMRouter(LLMConfig(deployments="one", breaker_failures=1, breaker_cooldown=0.01))
+
+    async def run():
+        with pytest.raises(RateLimitError):
+            await collect(router)
+        await asyncio.sleep(0.02)
+        # The half-open probe hangs and its caller goes away
+        probe = asyncio.ensure_future(collect(router))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await collect(router)
+
+    assert asyncio.run(run()) == ["ok"]
+    assert closed == ["stall", "ok"]
+    assert router.metrics()[0]["state"] == "closed"
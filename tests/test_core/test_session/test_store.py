@@ -0,0 +1,187 @@
+import asyncio
+import time
+from backend import database
+from backend.configs.config import LLMConfig, SessionConfig
+from backend.core.generator.llm import LLMInstance
+from backend.core.session import SessionState, LRUSessionStore, SessionSpill, SQLiteSessionSpill
+
+
+def make_state(session_id: str, content: str = "") -> SessionState:
+    state = SessionState(session_id=session_id, llm=LLMInstance(LLMConfig()))
+    if content:
+        state.messages.append({"role": "user", "content": content})
+    return state
+
+
+class GatedSpill(SessionSpill):
+    """In-memory spill tier whose saves wait until the gate opens"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.records = {}
+
+    async def save(self, state):
+        await self.gate.wait()
+        self.records[state.session_id] = state.to_record()
+
+    async def load(self, session_id):
+        record = self.records.get(session_id)
+        return SessionState.from_record(session_id, record) if record is not None else None
+
+    async def delete(self, session_id):
+        self.records.pop(session_id, None)
+
+
+def test_lru_eviction_by_count():
+    async def run():
+        store = LRUSessionStore(SessionConfig(max_sessions=2, max_bytes=10**9, idle_ttl=0, spill_to_disk=False))
+        for session_id in ["a", "b"]:
+            await store.put(make_state(session_id))
+        await store.get("a")  # "b" is now least recently used
+        await store.put(make_state("c"))
+
+        assert "a" in store and "c" in store and "b" not in store
+        assert await store.get("b") is None
+        assert store.metrics()["evictions_lru"] == 1
+
+    asyncio.run(run())
+
+
+def test_eviction_by_bytes_keeps_current_session():
+    async def run():
+        store = LRUSessionStore(SessionConfig(max_sessions=100, max_bytes=5000, idle_ttl=0, spill_to_disk=False))
+        await store.put(make_state("a", "x" * 2000))
+        await store.put(make_state("b", "x" * 2000))
+
+        state = await store.get("b")
+        state.messages.append({"role": "assistant", "content": "y" * 2000})
+        await store.update(state)
+
+        assert "b" in store and "a" not in store
+        assert store.metrics()["evictions_bytes"] == 1
+        assert store.metrics()["bytes"] == state.size_bytes()
+
+    asyncio.run(run())
+
+
+def test_idle_ttl_eviction():
+    async def run():
+        store = LRUSessionStore(SessionConfig(max_sessions=100, max_bytes=10**9, idle_ttl=60, spill_to_disk=False))
+        await store.put(make_state("old"))
+        store._entries["old"].last_access = time.monotonic() - 120
+        await store.put(make_state("new"))
+
+        assert "old" not in store and "new" in store
+        assert store.metrics()["evictions_ttl"] == 1
+
+    asyncio.run(run())
+
+
+def test_get_or_create_is_single_flight():
+    async def run():
+        store = LRUSessionStore(SessionConfig(max_sessions=10, max_bytes=10**9, idle_ttl=0, spill_to_disk=False))
+        created = []
+
+        def factory():
+            created.append(1)
+            return make_state("s")
+
+        states = await asyncio.gather(*(store.get_or_create("s", factory) for _ in range(5)))
+        assert len(created) == 1
+        assert all(state is states[0] for state in states)
+
+    asyncio.run(run())
+
+
+def test_spill_and_rehydrate(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+
+    async def run():
+        await database.init_db()
+        try:
+            store = LRUSessionStore(
+                SessionConfig(max_sessions=1, max_bytes=10**9, idle_ttl=0, spill_to_disk=True),
+                spill=SQLiteSessionSpill()
+            )
+            await store.put(make_state("a", "hello"))
+            await store.put(make_state("b"))
+            assert "a" not in store
+
+            state = await store.get("a")
+            assert state is not None
+            assert state.messages == [{"role": "user", "content": "hello"}]
+            assert store.metrics()["spills"] >= 1
+            assert store.metrics()["rehydrations"] == 1
+            assert await database.load_session_state("a") is None
+        finally:
+            await database.close_pool()
+
+    asyncio.run(run())
+
+
+def test_access_during_a_slow_spill_keeps_the_history():
+    async def run():
+        spill = GatedSpill()
+        store = LRUSessionStore(SessionConfig(max_sessions=1, max_bytes=10**9, idle_ttl=0), spill=spill)
+        await store.put(make_state("a", "hello"))
+        # Evicting "a" starts a save that blocks on the gate
+        evicting = asyncio.create_task(store.put(make_state("b")))
+        await asyncio.sleep(0)
+        assert "a" not in store
+
+        reaccess = asyncio.create_task(store.get_or_create("a", lambda: make_state("a")))
+        await asyncio.sleep(0.01)
+        spill.gate.set()
+        state = await reaccess
+        await evicting
+
+        # The re-access waited for the save instead of creating an empty session
+        assert state.messages == [{"role": "user", "content": "hello"}]
+        assert "a" in store and set(spill.records) == {"b"}
+
+    asyncio.run(run())
+
+
+def test_sessions_in_use_are_not_evicted():
+    async def run():
+        spill = GatedSpill()
+        spill.gate.set()
+        store = LRUSessionStore(SessionConfig(max_sessions=1, max_bytes=10**9, idle_ttl=0), spill=spill)
+        state = await store.get_or_create("a", lambda: make_state("a"), pin=True)
+        await store.put(make_state("b"))
+        assert "a" in store and "b" in store
+
+        state.messages.append({"role": "assistant", "content": "kept"})
+        await store.update(state)
+        store.unpin(state)
+        await store.put(make_state("c"))
+        assert "a" not in store
+        assert spill.records["a"]["messages"] == [{"role": "assistant", "content": "kept"}]
+
+    asyncio.run(run())
+
+
+def test_records_never_contain_deployment_keys():
+    keyed = '[{"model": "a", "api_key": "sk-secret"}, {"model": "b"}]'
+    record = SessionState(session_id="s", llm=LLMInstance(LLMConfig(deployments=keyed))).to_record()
+    assert "sk-secret" not in str(record) and "api_key" not in record["config"]
+    assert SessionState.from_record("s", record).llm.config.deployments == LLMConfig().deployments
+
+    plain = SessionState(session_id="s", llm=LLMInstance(LLMConfig(deployments="a=3,b"))).to_record()
+    assert plain["config"]["deployments"] == "a=3,b"
+
+
+def test_background_sweep_expires_idle_sessions():
+    async def run():
+        store = LRUSessionStore(SessionConfig(max_sessions=100, max_bytes=10**9, idle_ttl=60, sweep_interval=0.01, spill_to_disk=False))
+        await store.put(make_state("idle"))
+        store._entries["idle"].last_access = time.monotonic() - 120
+        store.start()
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            await store.stop()
+        assert "idle" not in store
+        assert store.metrics()["evictions_ttl"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from backend.core.tools import search_tool
+
+
+class FakeDDGS:
+    instances = 0
+
+    def __init__(self):
+        FakeDDGS.instances += 1
+
+    def text(self, query, max_results=5):
+        time.sleep(0.2)  # blocking HTTP round trip
+        return [{"title": query, "href": "https://example.com", "body": "snippet"}][:max_results]
+
+
+def test_search_runs_off_the_event_loop_with_reused_clients(monkeypatch):
+    monkeypatch.setattr(search_tool, "DDGS", FakeDDGS)
+    search_tool.shutdown_search_pool()
+    search_tool._clients = search_tool.threading.local()
+
+    async def run():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        first = await search_tool.search_duckduckgo("hello")
+        results = await asyncio.gather(*(search_tool.search_duckduckgo("hello") for _ in range(3)))
+        beat.cancel()
+        return first, results, ticks
+
+    first, results, ticks = asyncio.run(run())
+    search_tool.shutdown_search_pool()
+
+    assert first == [{"title": "hello", "link": "https://example.com", "snippet": "snippet"}]
+    assert all(result == first for result in results)
+    assert ticks >= 20  # the loop kept running while searches were in flight
+    assert FakeDDGS.instances <= search_tool.config.tools.search_workers
@@ -0,0 +1,136 @@
+import asyncio
+import gc
+from backend import database
+from backend.configs.config import ToolConfig
+from backend.core.tools.tool_cache import ToolCache, normalize_parameters
+from backend.core.tools.tool_registry import ToolRegistry
+
+
+def make_registry(**overrides) -> ToolRegistry:
+    calls = []
+
+    async def search(query: str, max_results: int = 5):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return [{"title": query, "n": max_results}]
+
+    registry = ToolRegistry(ToolConfig(**overrides))
+    registry.register("search", search, cache_ttl=60)
+    return registry, calls
+
+
+def test_normalization_folds_case_and_whitespace():
+    assert normalize_parameters({"query": "  Python   3.12 "}) == normalize_parameters({"query": "python 3.12"})
+    assert normalize_parameters({"a": 1, "b": 2}) == normalize_parameters({"b": 2, "a": 1})
+
+
+def test_cache_hits_include_default_parameters():
+    async def run():
+        registry, calls = make_registry()
+        await registry.run_tool("search", {"query": "Python"})
+        await registry.run_tool("search", {"query": "python ", "max_results": 5})
+        await registry.run_tool("search", {"query": "python", "max_results": 3})
+        return registry, calls
+
+    registry, calls = asyncio.run(run())
+    assert calls == ["Python", "python"]
+    metrics = registry.cache_metrics()
+    assert metrics["hits"] == 1 and metrics["misses"] == 2
+
+
+def test_concurrent_identical_calls_are_coalesced():
+    async def run():
+        registry, calls = make_registry()
+        results = await asyncio.gather(*(registry.run_tool("search", {"query": "same"}) for _ in range(5)))
+        return registry, calls, results
+
+    registry, calls, results = asyncio.run(run())
+    assert calls == ["same"]
+    assert all(result == results[0] for result in results)
+    assert registry.cache_metrics()["coalesced"] == 4
+
+
+def test_errors_are_not_cached_and_entries_are_bounded():
+    async def run():
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("upstream down")
+            return "ok"
+
+        cache = ToolCache(max_entries=2)
+        try:
+            await cache.get_or_run("k", 60, flaky)
+        except RuntimeError:
+            pass
+        assert await cache.get_or_run("k", 60, flaky) == "ok"
+
+        for key in ["a", "b", "c"]:
+            await cache.get_or_run(key, 60, flaky)
+        return cache
+
+    cache = asyncio.run(run())
+    assert len(cache) == 2
+    assert cache.metrics()["evictions"] == 2
+
+
+def test_expired_entries_are_refreshed():
+    async def run():
+        cache = ToolCache()
+        values = iter(["first", "second"])
+
+        async def produce():
+            return next(values)
+
+        assert await cache.get_or_run("k", -1, produce) == "first"
+        assert await cache.get_or_run("k", 60, produce) == "second"
+        return cache
+
+    assert asyncio.run(run()).metrics()["expirations"] == 1
+
+
+def test_persistent_cache_survives_a_new_registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+
+    async def run():
+        await database.init_db()
+        try:
+            first, first_calls = make_registry(cache_persist=True)
+            await first.run_tool("search", {"query": "persisted"})
+            await asyncio.gather(*first.cache._background)
+
+            second, second_calls = make_registry(cache_persist=True)
+            result = await second.run_tool("search", {"query": "Persisted"})
+            return first_calls, second_calls, second, result
+        finally:
+            await database.close_pool()
+
+    first_calls, second_calls, second, result = asyncio.run(run())
+    assert first_calls == ["persisted"] and second_calls == []
+    assert result == [{"title": "persisted", "n": 5}]
+    assert second.cache_metrics()["persistent_hits"] == 1
+
+
+def test_failed_run_without_waiters_is_retired_quietly():
+    cache = ToolCache()
+
+    async def run():
+        unhandled = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unhandled.append(context))
+
+        async def failing():
+            await asyncio.sleep(0.02)
+            raise RuntimeError("upstream down")
+
+        caller = asyncio.ensure_future(cache.get_or_run("key", 60, failing))
+        await asyncio.sleep(0.005)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        gc.collect()
+        return unhandled
+
+    assert asyncio.run(run()) == []
+    assert cache._inflight == {}
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from backend.configs.config import ToolConfig
+from backend.core.tools.tool_registry import ToolRegistry
+
+
+async def slow_tool(delay: float, fail: bool = False):
+    await asyncio.sleep(delay)
+    if fail:
+        raise RuntimeError("boom")
+    return delay
+
+
+def make_registry(max_concurrency: int = 4, timeout: float = 5) -> ToolRegistry:
+    registry = ToolRegistry(ToolConfig(max_concurrency=max_concurrency, timeout=timeout))
+    registry.register("slow", slow_tool)
+    return registry
+
+
+def test_run_tools_latency_is_the_max_not_the_sum():
+    registry = make_registry()
+    calls = [{"name": "slow", "parameters": {"delay": 0.2}} for _ in range(3)]
+
+    started = time.perf_counter()
+    results = asyncio.run(registry.run_tools(calls))
+    elapsed = time.perf_counter() - started
+
+    assert [result.result for result in results] == [0.2, 0.2, 0.2]
+    assert elapsed < 0.5
+
+
+def test_run_tools_respects_concurrency_cap():
+    registry = make_registry(max_concurrency=1)
+    calls = [{"name": "slow", "parameters": {"delay": 0.1}} for _ in range(3)]
+
+    started = time.perf_counter()
+    asyncio.run(registry.run_tools(calls))
+    assert time.perf_counter() - started >= 0.3
+
+
+def test_run_tools_reports_partial_failures_and_timeouts():
+    registry = make_registry(timeout=0.2)
+    calls = [
+        {"name": "slow", "parameters": {"delay": 0.01}},
+        {"name": "slow", "parameters": {"delay": 0.01, "fail": True}},
+        {"name": "slow", "parameters": {"delay": 1}},
+        {"name": "missing", "parameters": {}},
+    ]
+
+    ok, failed, timed_out, missing = asyncio.run(registry.run_tools(calls))
+
+    assert ok.ok and ok.result == 0.01
+    assert not failed.ok and str(failed.error) == "boom"
+    assert timed_out.timed_out
+    assert isinstance(missing.error, ValueError)
+
+
+def test_blocking_async_tool_is_detected():
+    async def blocking_tool():
+        time.sleep(0.15)
+        return "done"
+
+    async def polite_tool():
+        await asyncio.sleep(0.15)
+        return "done"
+
+    registry = make_registry()
+    registry.config.block_threshold_ms = 50
+    registry.register("blocking", blocking_tool)
+    registry.register("polite", polite_tool)
+
+    assert asyncio.run(registry.run_tool("blocking", {})) == "done"
+    assert asyncio.run(registry.run_tool("polite", {})) == "done"
+
+    assert registry.blocking_tools.keys() == {"blocking"}
+    assert registry.blocking_tools["blocking"] >= 0.15
+
+
+def test_watched_tool_still_propagates_errors_and_timeouts():
+    registry = make_registry(timeout=0.05)
+    failed, timed_out = asyncio.run(registry.run_tools([
+        {"name": "slow", "parameters": {"delay": 0, "fail": True}},
+        {"name": "slow", "parameters": {"delay": 1}},
+    ]))
+    assert str(failed.error) == "boom"
+    assert timed_out.timed_out
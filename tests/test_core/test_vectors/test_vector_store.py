@@ -0,0 +1,79 @@
+import numpy as np
+from backend.core.vectors import VectorStore
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def brute_force(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:k]
+
+
+def test_batched_search_matches_brute_force_across_segments(tmp_path):
+    vectors = random_vectors(250)
+    store = VectorStore(tmp_path, segment_capacity=64)
+    ids = store.add(vectors[:100])
+    ids = np.concatenate([ids, store.add(vectors[100:])])
+
+    found, scores = store.search(vectors[[3, 150, 249]], k=5)
+
+    assert store.stats()["segments"] == 4
+    for row, query in enumerate([3, 150, 249]):
+        assert found[row].tolist() == ids[brute_force(vectors, vectors[query], 5)].tolist()
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_appends_do_not_rewrite_sealed_segments(tmp_path):
+    store = VectorStore(tmp_path, segment_capacity=32)
+    store.add(random_vectors(40))
+    sealed = tmp_path / "segment-000000.f32"
+    before = sealed.stat().st_mtime_ns
+
+    store.add(random_vectors(10, seed=1))
+
+    assert sealed.stat().st_mtime_ns == before
+
+
+def test_tombstones_compaction_and_reopen(tmp_path):
+    vectors = random_vectors(100)
+    store = VectorStore(tmp_path, segment_capacity=25)
+    ids = store.add(vectors)
+
+    assert store.delete(ids[:60]) == 60
+    assert store.delete(ids[:60]) == 0
+    found, _ = store.search(vectors[10], k=3)
+    assert not set(found[0].tolist()) & set(ids[:60].tolist())
+
+    assert store.compact(threshold=0.3) == 3
+    stats = store.stats()
+    assert stats["live"] == 40 and stats["deleted"] == 0
+    assert not (tmp_path / "segment-000000.f32").exists()
+
+    reopened = VectorStore(tmp_path)
+    assert len(reopened) == 40
+    assert sorted(reopened.live_ids()) == ids[60:].tolist()
+    found, scores = reopened.search(vectors[70], k=1)
+    assert found[0, 0] == ids[70] and scores[0, 0] > 0.99
+    # Ids keep increasing after a reopen
+    assert reopened.add(vectors[:1])[0] == 100
+
+
+def test_search_pads_when_fewer_vectors_than_k(tmp_path):
+    store = VectorStore(tmp_path)
+    assert store.search(random_vectors(1)[0], k=3)[0].tolist() == [[-1, -1, -1]]
+    store.add(random_vectors(2))
+    found, scores = store.search(random_vectors(1, seed=2)[0], k=3)
+    assert found[0, 2] == -1 and scores[0, 2] == -np.inf
+
+
+def test_appends_do_not_change_a_taken_snapshot(tmp_path):
+    store = VectorStore(tmp_path, segment_capacity=64)
+    store.add(random_vectors(10))
+    snapshot = store._segments
+
+    store.add(random_vectors(5, seed=1))
+
+    assert [segment.count for segment in snapshot] == [10]
+    assert [segment.count for segment in store._segments] == [15]
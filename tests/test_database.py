@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from backend import database
+from backend.api import app
+
+
+def make_turn(index: int, start: datetime):
+    user = {"id": f"u{index}", "role": "user", "content": f"question {index}", "created_at": start + timedelta(seconds=2 * index)}
+    assistant = {"id": f"a{index}", "role": "assistant", "content": f"answer {index}", "created_at": start + timedelta(seconds=2 * index + 1)}
+    tool_call = {
+        "id": f"t{index}", "message_id": f"a{index}", "tool_name": "search_duckduckgo",
+        "parameters": {"query": f"q{index}"}, "result": "[]", "status": "completed", "created_at": assistant["created_at"]
+    }
+    return [user, assistant], [tool_call]
+
+
+def test_turns_round_trip_with_keyset_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+    start = datetime(2024, 1, 1)
+
+    async def run():
+        await database.init_db()
+        try:
+            for index in range(5):
+                messages, tool_calls = make_turn(index, start)
+                await database.save_turn("s1", messages, tool_calls)
+
+            pages, cursor = [], None
+            while True:
+                page, cursor = await database.load_messages("s1", limit=4, before=cursor)
+                pages.append(page)
+                if cursor is None:
+                    return pages, await database.get_session("s1")
+        finally:
+            await database.close_pool()
+
+    pages, session = asyncio.run(run())
+    assert [len(page) for page in pages] == [4, 4, 2]
+    # Pages walk backwards in time, each page is chronological
+    assert [message["id"] for message in pages[0]] == ["u3", "a3", "u4", "a4"]
+    assert [message["id"] for page in reversed(pages) for message in page] == [
+        f"{role}{index}" for index in range(5) for role in ("u", "a")
+    ]
+    assert pages[0][-1]["tool_calls"][0]["parameters"] == {"query": "q4"}
+    assert pages[0][0]["tool_calls"] == []
+    assert session["title"] == "question 0"
+
+
+def test_history_query_uses_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+
+    async def run():
+        await database.init_db()
+        try:
+            async with database.get_pool().reader() as conn:
+                async with conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT rowid FROM messages WHERE session_id = ? "
+                    "AND (created_at, rowid) < (?, ?) ORDER BY created_at DESC, rowid DESC LIMIT 10",
+                    ("s1", "2024", 1)
+                ) as cursor:
+                    return " ".join(row[-1] for row in await cursor.fetchall())
+        finally:
+            await database.close_pool()
+
+    plan = asyncio.run(run())
+    assert "idx_messages_session_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_session_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+
+    with TestClient(app) as client:
+        created = client.post("/api/sessions/", json={"title": "Research"}).json()
+        listed = client.get("/api/sessions/").json()
+        fetched = client.get(f"/api/sessions/{created['id']}").json()
+        bad_cursor = client.get(f"/api/sessions/{created['id']}", params={"before": "nope"})
+        deleted = client.delete(f"/api/sessions/{created['id']}")
+        missing = client.get(f"/api/sessions/{created['id']}")
+
+    assert [session["id"] for session in listed["sessions"]] == [created["id"]]
+    assert fetched["session"]["title"] == "Research" and fetched["messages"] == []
+    assert fetched["next_cursor"] is None
+    assert bad_cursor.status_code == 400
+    assert deleted.status_code == 200 and missing.status_code == 404
@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from passlib.context import CryptContext
+from backend import database, passwords
+from backend.configs.config import DatabaseConfig
+from backend.db_pool import DatabasePool, PoolTimeoutError
+
+
+def test_pool_uses_wal_and_read_only_readers(tmp_path):
+    async def run():
+        pool = DatabasePool(tmp_path / "pool.db", DatabaseConfig(readers=2))
+        await pool.open()
+        try:
+            async with pool.writer() as conn:
+                await conn.execute("CREATE TABLE t (v INTEGER)")
+                await conn.execute("INSERT INTO t VALUES (1)")
+            async with pool.reader() as conn:
+                async with conn.execute("PRAGMA journal_mode") as cursor:
+                    mode = (await cursor.fetchone())[0]
+                async with conn.execute("SELECT v FROM t") as cursor:
+                    rows = [tuple(row) for row in await cursor.fetchall()]
+                with pytest.raises(Exception):
+                    await conn.execute("INSERT INTO t VALUES (2)")
+            return mode, rows
+        finally:
+            await pool.close()
+
+    mode, rows = asyncio.run(run())
+    assert mode == "wal"
+    assert rows == [(1,)]
+
+
+def test_writer_rolls_back_on_error(tmp_path):
+    async def run():
+        pool = DatabasePool(tmp_path / "pool.db", DatabaseConfig(readers=1))
+        await pool.open()
+        try:
+            async with pool.writer() as conn:
+                await conn.execute("CREATE TABLE t (v INTEGER)")
+            with pytest.raises(ValueError):
+                async with pool.writer() as conn:
+                    await conn.execute("INSERT INTO t VALUES (1)")
+                    raise ValueError("abort")
+            async with pool.reader() as conn:
+                async with conn.execute("SELECT COUNT(*) FROM t") as cursor:
+                    return (await cursor.fetchone())[0]
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == 0
+
+
+def test_saturation_is_measured_and_bounded(tmp_path):
+    async def run():
+        pool = DatabasePool(tmp_path / "pool.db", DatabaseConfig(readers=1, acquire_timeout=0.05))
+        await pool.open()
+        try:
+            async with pool.reader():
+                with pytest.raises(PoolTimeoutError):
+                    async with pool.reader():
+                        pass
+
+            async def hold():
+                async with pool.reader():
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(hold(), hold(), hold())
+            return pool.metrics()
+        finally:
+            await pool.close()
+
+    metrics = asyncio.run(run())
+    assert metrics["timeouts"] == 1
+    assert metrics["read_waits"] == 2
+    assert metrics["read_waiting"] == 0 and metrics["readers_idle"] == 1
+
+
+def test_users_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+    # Hashing cost is irrelevant here
+    context = CryptContext(schemes=["sha256_crypt"], sha256_crypt__rounds=1000)
+    monkeypatch.setattr(passwords, "_hasher", passwords.PasswordHasher(context=context))
+
+    async def run():
+        await database.init_db()
+        try:
+            user_id = await database.create_user("alice", "secret")
+            duplicate = await database.create_user("alice", "other")
+            user = await database.authenticate_user("alice", "secret")
+            wrong = await database.authenticate_user("alice", "wrong")
+            return user_id, duplicate, user, wrong
+        finally:
+            await database.close_pool()
+
+    user_id, duplicate, user, wrong = asyncio.run(run())
+    assert user_id and duplicate is None
+    assert user["id"] == user_id and wrong is None
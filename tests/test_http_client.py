@@ -0,0 +1,39 @@
+import asyncio
+import httpx
+import litellm
+from backend import http_client
+from backend.configs.config import HTTPConfig, LLMConfig
+from backend.http_client import SharedHTTPClient, llm_timeout
+
+
+def test_llm_timeout_splits_phases():
+    timeout = llm_timeout(LLMConfig(connect_timeout=2, read_timeout=45), HTTPConfig(write_timeout=7, pool_timeout=3))
+    assert (timeout.connect, timeout.read, timeout.write, timeout.pool) == (2, 45, 7, 3)
+
+
+def test_metrics_count_requests_and_errors():
+    transport = httpx.MockTransport(lambda request: httpx.Response(429 if request.url.path == "/limited" else 200))
+    shared = SharedHTTPClient(HTTPConfig(max_connections=8, http2=False), LLMConfig(), transport=transport)
+
+    async def run():
+        await shared.client.get("http://provider/ok")
+        await shared.client.get("http://provider/limited")
+        metrics = shared.metrics()
+        await shared.aclose()
+        return metrics
+
+    metrics = asyncio.run(run())
+    assert metrics["requests"] == 2 and metrics["responses"] == 2 and metrics["errors"] == 1
+    assert metrics["max_connections"] == 8 and metrics["utilization"] == 0.0
+
+
+def test_lifespan_installs_client_for_litellm():
+    async def run():
+        shared = await http_client.open_http_client()
+        installed = litellm.aclient_session is shared.client
+        assert await http_client.open_http_client() is shared
+        await http_client.close_http_client()
+        return installed
+
+    assert asyncio.run(run())
+    assert litellm.aclient_session is None and http_client.get_http_client() is None
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from loguru import logger
+from backend import log
+from backend.log import LogSampler, RequestContextMiddleware, log_context, parse_levels, preview
+
+
+def test_parse_levels_with_module_overrides():
+    assert parse_levels("warning, backend.core.tools=debug,litellm=ERROR") == (
+        "WARNING", {"backend.core.tools": "DEBUG", "litellm": "ERROR"}
+    )
+    assert parse_levels("") == ("INFO", {})
+
+
+def test_records_carry_request_and_session_ids():
+    records = []
+    sink = logger.add(lambda message: records.append(message.record["extra"]), level="INFO")
+    tagged = logger.patch(log._add_context)
+    try:
+        with log_context(request_id="req-1", session_id="s-1"):
+            tagged.info("inside")
+        tagged.info("outside")
+    finally:
+        logger.remove(sink)
+    assert (records[0]["request_id"], records[0]["session_id"]) == ("req-1", "s-1")
+    assert records[1]["request_id"] is None
+
+
+def test_sampler_limits_and_counts_suppressed_lines():
+    sampler = LogSampler(interval=0.05)
+    allowed = [sampler.allow() for _ in range(100)]
+    assert allowed.count(True) == 1 and sampler.take_suppressed() == 99
+    time.sleep(0.06)
+    assert sampler.allow()
+    assert preview("x" * 500, limit=10).startswith("xxxxxxxxxx... (500 chars)")
+
+
+def test_middleware_propagates_and_echoes_request_id():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(log.request_id_var.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def run(headers):
+        await RequestContextMiddleware(app)({"type": "http", "headers": headers}, None, send)
+
+    asyncio.run(run([(b"x-request-id", b"abc")]))
+    asyncio.run(run([]))
+    assert seen[0] == "abc" and len(seen[1]) == 32
+    assert (b"x-request-id", b"abc") in sent[0]["headers"]
+    assert log.request_id_var.get() is None
@@ -0,0 +1,45 @@
+import asyncio
+import time
+from backend.configs.config import LoopMonitorConfig
+from backend.loop_monitor import LoopLagMonitor
+from backend.metrics import EVENT_LOOP_LAG
+
+
+def _block(seconds: float):
+    time.sleep(seconds)
+
+
+def test_monitor_blames_blocking_call_site():
+    monitor = LoopLagMonitor(LoopMonitorConfig(interval=0.01, threshold=0.05, capture_stacks=True))
+    samples_before = EVENT_LOOP_LAG.count()
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        _block(0.25)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(run())
+    metrics = monitor.metrics()
+    assert metrics["stalls"] == 1 and metrics["max_lag_seconds"] >= 0.2
+    assert EVENT_LOOP_LAG.count() - samples_before == metrics["samples"]
+    [site] = monitor.top_sites(with_stacks=True)
+    assert "_block" in site["name"] and site["count"] == 1
+    assert any("time.sleep" in line for line in site["stack"])
+
+
+def test_monitor_without_stacks_only_counts_stalls():
+    monitor = LoopLagMonitor(LoopMonitorConfig(interval=0.01, threshold=0.05, capture_stacks=False))
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.03)
+        _block(0.1)
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+    asyncio.run(run())
+    assert monitor.metrics()["stalls"] == 1 and monitor.metrics()["stacks_captured"] == 0
+    assert monitor.top_sites() == []
+    assert monitor.report()["capture_stacks"] is False
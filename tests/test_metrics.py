@@ -0,0 +1,86 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.configs.config import ResponseCacheConfig
+from backend.core.generator.embedding import HashingEmbedder
+from backend.core.generator.response_cache import ResponseCache
+from backend.metrics import Histogram, Registry, TOOL_LATENCY
+from backend.core.tools.tool_registry import ToolRegistry
+from backend.routers import metrics as metrics_router
+from backend.tracing import start_span, end_span
+
+
+def test_histogram_bounds_relative_error_and_percentiles():
+    histogram = Histogram("latency_seconds", "test", ["route"], lowest=0.001, highest=10, sub_buckets=4)
+    # Consecutive bounds differ by at most a quarter of the lower one
+    assert all(upper / lower <= 1.25 + 1e-9 for lower, upper in zip(histogram.bounds[1:], histogram.bounds[2:]))
+    for value in [0.01] * 90 + [2.0] * 10:
+        histogram.observe(value, route="chat")
+    assert 0.01 <= histogram.percentile(0.5, route="chat") <= 0.0125
+    assert 2.0 <= histogram.percentile(0.99, route="chat") <= 2.5
+    assert histogram.percentile(0.5, route="other") is None
+    histogram.observe(1e6, route="chat")
+    assert histogram.percentile(1.0, route="chat") == float("inf")
+
+
+def test_prometheus_rendering_and_collectors():
+    registry = Registry()
+    histogram = registry.register(Histogram("turn_seconds", "Turn time", ["status"]))
+    histogram.observe(0.5, status="ok")
+    registry.register_collector("pool", lambda: {"active": 2, "label": "ignored", "healthy": True})
+    registry.register_collector("broken", lambda: 1 / 0)
+    registry.register_collector("deployments", lambda: [{"name": 'a"b', "in_flight": 3}])
+    text = registry.render()
+
+    assert "# TYPE turn_seconds histogram" in text
+    assert 'turn_seconds_bucket{status="ok",le="+Inf"} 1' in text
+    assert 'turn_seconds_count{status="ok"} 1' in text and 'turn_seconds_sum{status="ok"} 0.5' in text
+    assert "pool_active 2" in text and "pool_healthy 1" in text and "label" not in text
+    assert 'deployments_in_flight{name="a\\"b"} 3' in text
+
+
+def test_tool_latency_is_recorded_per_tool_and_status():
+    registry = ToolRegistry()
+
+    async def fails():
+        raise RuntimeError("boom")
+
+    async def works():
+        return 1
+
+    registry.register("metrics_fails", fails)
+    registry.register("metrics_works", works)
+
+    async def run():
+        await registry.run_tool("metrics_works", {})
+        try:
+            await registry.run_tool("metrics_fails", {})
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    assert TOOL_LATENCY.count(tool="metrics_works", status="ok") == 1
+    assert TOOL_LATENCY.count(tool="metrics_fails", status="error") == 1
+
+
+def test_metrics_endpoint_and_spans(monkeypatch):
+    app = FastAPI()
+    app.include_router(metrics_router.router, prefix="/metrics")
+    client = TestClient(app)
+    monkeypatch.setattr(metrics_router, "get_response_cache", lambda: None)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE llm_time_to_first_token_seconds histogram" in response.text
+    assert "session_store_hits " in response.text and "tool_cache_coalesced " in response.text
+    # A disabled response cache is skipped
+    assert "llm_response_cache_" not in response.text
+
+    cache = ResponseCache(ResponseCacheConfig(enabled=True), embedder=HashingEmbedder())
+    monkeypatch.setattr(metrics_router, "get_response_cache", lambda: cache)
+    assert "llm_response_cache_semantic_hits 0" in client.get("/metrics").text
+
+    span = start_span("chat.turn", session_id="s1", missing=None)
+    child = start_span("llm.stream", parent=span, step=0)
+    end_span(child, completion_tokens=3)
+    end_span(span, error=RuntimeError("failed"))
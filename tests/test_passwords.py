@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from backend.api import app
+from backend.configs.config import AuthConfig
+from backend.passwords import PasswordHasher, PasswordHasherBusyError
+
+
+def make_context(rounds: int = 1000) -> CryptContext:
+    return CryptContext(schemes=["sha256_crypt"], sha256_crypt__rounds=rounds)
+
+
+def test_hash_and_verify_off_the_loop():
+    hasher = PasswordHasher(AuthConfig(hash_workers=2), context=make_context())
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return hashed, await hasher.verify("secret", hashed), await hasher.verify("nope", hashed)
+
+    try:
+        hashed, good, bad = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert good == (True, None)
+    assert bad == (False, None)
+    assert hasher.metrics()["pending"] == 0
+
+
+def test_outdated_cost_is_rehashed():
+    old = PasswordHasher(context=make_context(1000))
+    new = PasswordHasher(context=make_context(2000))
+
+    async def run():
+        hashed = await old.hash("secret")
+        return await new.verify("secret", hashed)
+
+    try:
+        valid, new_hash = asyncio.run(run())
+    finally:
+        old.shutdown()
+        new.shutdown()
+    assert valid and new_hash is not None and "rounds=2000" in new_hash
+    assert new.metrics()["rehashes"] == 1
+
+
+def test_rejects_when_saturated():
+    release = threading.Event()
+    hasher = PasswordHasher(AuthConfig(hash_workers=1, hash_queue_size=1, retry_after=3), context=make_context())
+
+    async def run():
+        blocked = [asyncio.ensure_future(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHasherBusyError) as error:
+            await hasher.hash("secret")
+        release.set()
+        await asyncio.gather(*blocked)
+        return error.value.retry_after
+
+    try:
+        assert asyncio.run(run()) == 3
+    finally:
+        hasher.shutdown()
+    assert hasher.metrics()["rejected"] == 1
+    assert hasher.metrics()["max_pending"] == 2
+
+
+def test_login_returns_429_when_saturated(monkeypatch):
+    async def busy(username, password):
+        raise PasswordHasherBusyError(retry_after=2)
+
+    monkeypatch.setattr("backend.routers.auth.authenticate_user", busy)
+    response = TestClient(app).post("/api/auth/login", json={"username": "a", "password": "b"})
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from uuid import uuid4
+from fastapi.testclient import TestClient
+import httpx
+from backend import database
+from backend.api import app
+from backend.configs.config import config
+from backend.core.files import shutdown_file_index
+
+
+def setup_storage(tmp_path, monkeypatch, max_bytes=1024 * 1024, chunk_size=1024):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+    monkeypatch.setattr(config.files, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(config.files, "index_dir", str(tmp_path / "index"))
+    monkeypatch.setattr(config.files, "max_upload_bytes", max_bytes)
+    monkeypatch.setattr(config.files, "chunk_size", chunk_size)
+
+
+def test_upload_streams_to_content_addressed_file(tmp_path, monkeypatch):
+    setup_storage(tmp_path, monkeypatch)
+    session_id = str(uuid4())
+    content = b"hello world\n" * 5000
+
+    with TestClient(app) as client:
+        first = client.post(
+            f"/api/files/upload/{session_id}",
+            files={"file": ("C:\\docs\\notes.txt", content, "text/plain")},
+            data={"note": "ignored"}
+        ).json()
+        second = client.post(f"/api/files/upload/{session_id}", files={"file": ("copy.txt", content, "text/plain")}).json()
+        listed = client.get(f"/api/files/{session_id}").json()
+
+        digest = hashlib.sha256(content).hexdigest()
+        assert first["sha256"] == second["sha256"] == digest
+        assert first["size"] == len(content)
+        assert first["filename"] == "notes.txt" and first["content_type"] == "text/plain"
+        # Identical uploads share one blob, and no temporary files are left behind
+        assert first["filepath"] == second["filepath"]
+        assert Path(first["filepath"]).read_bytes() == content
+        assert [path.name for path in (tmp_path / "uploads").rglob("*") if path.is_file()] == [digest]
+        assert [record["id"] for record in listed] == [first["id"], second["id"]]
+
+        # The blob is removed with the last record referencing it
+        assert client.delete(f"/api/files/{first['id']}").status_code == 200
+        assert Path(second["filepath"]).exists()
+        assert client.delete(f"/api/files/{second['id']}").status_code == 200
+        assert not Path(second["filepath"]).exists()
+        assert client.delete(f"/api/files/{second['id']}").status_code == 404
+
+
+def test_upload_over_limit_is_rejected_while_streaming(tmp_path, monkeypatch):
+    setup_storage(tmp_path, monkeypatch, max_bytes=10_000)
+    session_id = str(uuid4())
+
+    with TestClient(app) as client:
+        response = client.post(f"/api/files/upload/{session_id}", files={"file": ("big.bin", b"x" * 20_000)})
+        missing_file = client.post(f"/api/files/upload/{session_id}", data={"note": "no file"})
+
+    assert response.status_code == 413
+    assert missing_file.status_code == 400
+    assert not [path for path in (tmp_path / "uploads").rglob("*") if path.is_file()]
+
+
+def test_upload_during_delete_keeps_its_blob(tmp_path, monkeypatch):
+    setup_storage(tmp_path, monkeypatch)
+    session_id = str(uuid4())
+    content = b"shared bytes\n" * 100
+    delete_file_record = database.delete_file_record
+
+    async def slow_delete_file_record(file_id):
+        # The delete has decided the blob is unshared; give an upload time to dedup onto it
+        result = await delete_file_record(file_id)
+        await asyncio.sleep(0.2)
+        return result
+
+    async def run():
+        await database.init_db()
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                upload = {"file": ("a.txt", content, "text/plain")}
+                first = (await client.post(f"/api/files/upload/{session_id}", files=upload)).json()
+                monkeypatch.setattr(database, "delete_file_record", slow_delete_file_record)
+                deleting = asyncio.ensure_future(client.delete(f"/api/files/{first['id']}"))
+                await asyncio.sleep(0.05)
+                second = (await client.post(f"/api/files/upload/{session_id}", files=upload)).json()
+                assert (await deleting).status_code == 200
+                return second
+        finally:
+            shutdown_file_index()
+            await database.close_pool()
+
+    second = asyncio.run(run())
+    assert Path(second["filepath"]).read_bytes() == content
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from backend import database
+from backend.api import app
+from backend.configs.config import LLMConfig
+from backend.core.agents.chat_agent import ChatAgent
+from backend.core.events import TextDelta, ToolCallEvent, ToolResultEvent, DoneEvent
+from backend.metrics import SSE_STREAM_DURATION
+from backend.routers.message import _measured
+from backend.routers.session import CURRENT_USER_ID
+
+
+def parse_frames(body: str):
+    return [json.loads(line[6:]) for line in body.split("\n") if line.startswith("data: ")]
+
+
+def test_send_message_streams_agent_events(monkeypatch):
+    seen = {}
+
+    async def fake_chat(self, content, role=None, session_id=None, use_cache=True, user_id=""):
+        seen.update(content=content, session_id=session_id, use_cache=use_cache, user_id=user_id)
+        yield ToolCallEvent(id="call_1", name="search_duckduckgo", args={"query": content})
+        yield ToolResultEvent(id="call_1", name="search_duckduckgo", result="[]", status="completed")
+        yield TextDelta("Hello")
+        yield TextDelta(" world")
+        yield DoneEvent(latency=0.5, steps=2, prompt_tokens=10, completion_tokens=2)
+
+    monkeypatch.setattr(ChatAgent, "chat", fake_chat)
+    client = TestClient(app)
+    response = client.post("/api/messages/", json={"session_id": "s1", "content": "hi", "use_cache": False})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = parse_frames(response.text)
+    # Adjacent text deltas are coalesced into a single frame
+    assert [frame["type"] for frame in frames] == ["tool_call", "tool_result", "text", "done"]
+    assert frames[0]["tool_name"] == "search_duckduckgo" and frames[0]["tool_args"] == {"query": "hi"}
+    assert "".join(frame["content"] for frame in frames if frame["type"] == "text") == "Hello world"
+    assert seen == {"content": "hi", "session_id": "s1", "use_cache": False, "user_id": CURRENT_USER_ID}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.config = LLMConfig()
+
+    async def stream_acomplete(self, messages, **kwargs):
+        yield "hello"
+
+
+def test_chat_turn_session_is_listed(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "test.db")
+    original_get_state = ChatAgent._get_state
+
+    async def get_state(self, session_id, config=None, pin=False):
+        state = await original_get_state(self, session_id, config, pin)
+        state.llm = FakeLLM()
+        return state
+
+    monkeypatch.setattr(ChatAgent, "_get_state", get_state)
+    session_id = str(uuid4())
+    with TestClient(app) as client:
+        response = client.post("/api/messages/", json={"session_id": session_id, "content": "first question"})
+        assert [frame["type"] for frame in parse_frames(response.text)][-1] == "done"
+        # The turn is persisted write-behind; wait for its flush
+        deadline = time.monotonic() + 5
+        while True:
+            sessions = client.get("/api/sessions/").json()["sessions"]
+            if sessions or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+    assert [(entry["id"], entry["user_id"], entry["title"]) for entry in sessions] == [
+        (session_id, CURRENT_USER_ID, "first question")
+    ]
+
+
+def test_disconnected_streams_are_not_counted_as_completed():
+    async def frames():
+        yield "data: {}\n\n"
+        yield "data: {}\n\n"
+
+    async def gone():
+        return True
+
+    async def run():
+        # The writer noticed the disconnect and ended the stream early
+        async for _ in _measured(frames(), is_disconnected=gone):
+            pass
+        # The server closed the response mid-stream
+        stream = _measured(frames())
+        await stream.__anext__()
+        await stream.aclose()
+
+    before = SSE_STREAM_DURATION.count(outcome="disconnected"), SSE_STREAM_DURATION.count(outcome="completed")
+    asyncio.run(run())
+    after = SSE_STREAM_DURATION.count(outcome="disconnected"), SSE_STREAM_DURATION.count(outcome="completed")
+    assert after[0] - before[0] == 2 and after[1] == before[1]
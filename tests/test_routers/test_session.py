@@ -0,0 +1,62 @@
+import time
+from pathlib import Path
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from backend import database
+from backend.api import app
+from backend.configs.config import LLMConfig, config
+from backend.core.agents.chat_agent import ChatAgent
+from backend.core.files import shutdown_file_index
+
+
+class RecordingLLM:
+    def __init__(self, prompts):
+        self.config = LLMConfig()
+        self.prompts = prompts
+
+    async def stream_acomplete(self, messages, **kwargs):
+        self.prompts.append([message["content"] for message in messages if message["role"] != "system"])
+        yield "answer"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_deleted_session_leaves_no_history_index_or_blobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+    monkeypatch.setattr(config.files, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(config.files, "index_dir", str(tmp_path / "index"))
+    shutdown_file_index()
+    prompts = []
+    original_get_state = ChatAgent._get_state
+
+    async def get_state(self, session_id, config=None, pin=False):
+        state = await original_get_state(self, session_id, config, pin)
+        state.llm = RecordingLLM(prompts)
+        return state
+
+    monkeypatch.setattr(ChatAgent, "_get_state", get_state)
+    session_id = str(uuid4())
+    try:
+        with TestClient(app) as client:
+            client.post("/api/messages/", json={"session_id": session_id, "content": "secret question"})
+            upload = client.post(
+                f"/api/files/upload/{session_id}", files={"file": ("notes.txt", b"private notes\n" * 50, "text/plain")}
+            ).json()
+            index_dir = tmp_path / "index" / session_id
+            wait_for(lambda: (index_dir / "chunks.jsonl").exists())
+            # The turn is persisted write-behind; the session row appears with its flush
+            wait_for(lambda: client.get(f"/api/sessions/{session_id}").status_code == 200)
+
+            assert client.delete(f"/api/sessions/{session_id}").status_code == 200
+            assert not Path(upload["filepath"]).exists() and not index_dir.exists()
+            assert client.get(f"/api/files/{session_id}").json() == []
+
+            client.post("/api/messages/", json={"session_id": session_id, "content": "new question"})
+    finally:
+        shutdown_file_index()
+    assert prompts == [["secret question"], ["new question"]]
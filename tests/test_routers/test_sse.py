@@ -0,0 +1,93 @@
+import asyncio
+import json
+import pytest
+from backend.configs.config import SSEConfig
+from backend.core.events import TextDelta, DoneEvent
+from backend.routers.sse import SSEWriter, HEARTBEAT_FRAME, text_frame
+
+
+def payloads(frames):
+    return [json.loads(frame[6:]) for frame in frames if frame.startswith("data: ")]
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+def test_text_frame_matches_payload_serialization():
+    delta = TextDelta('say "hi"\n')
+    assert text_frame(delta.content) == f"data: {json.dumps(delta.to_payload())}\n\n"
+
+
+@pytest.mark.asyncio
+async def test_coalesces_text_until_byte_threshold():
+    async def events():
+        for _ in range(10):
+            yield TextDelta("abcd")
+        yield DoneEvent(latency=0.1, steps=1, prompt_tokens=1, completion_tokens=10)
+
+    writer = SSEWriter(SSEConfig(flush_interval_ms=10_000, flush_bytes=16))
+    frames = payloads(await collect(writer.stream(events())))
+
+    assert [frame["type"] for frame in frames] == ["text", "text", "text", "done"]
+    assert [len(frame["content"]) for frame in frames[:3]] == [16, 16, 8]
+
+
+@pytest.mark.asyncio
+async def test_flushes_text_after_interval():
+    async def events():
+        yield TextDelta("first")
+        await asyncio.sleep(0.1)
+        yield TextDelta("second")
+
+    writer = SSEWriter(SSEConfig(flush_interval_ms=20, flush_bytes=1024))
+    frames = payloads(await collect(writer.stream(events())))
+
+    assert [frame["content"] for frame in frames] == ["first", "second"]
+
+
+@pytest.mark.asyncio
+async def test_sends_heartbeat_when_idle():
+    async def events():
+        await asyncio.sleep(0.12)
+        yield TextDelta("late")
+
+    writer = SSEWriter(SSEConfig(heartbeat_interval=0.05))
+    frames = await collect(writer.stream(events()))
+
+    assert HEARTBEAT_FRAME in frames
+    assert payloads(frames) == [{"type": "text", "content": "late"}]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_upstream():
+    state = {"cancelled": False}
+
+    async def events():
+        try:
+            yield TextDelta("partial")
+            await asyncio.sleep(10)
+            yield TextDelta("never")
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def is_disconnected():
+        return True
+
+    writer = SSEWriter(SSEConfig(disconnect_poll_interval=0.01))
+    frames = await asyncio.wait_for(collect(writer.stream(events(), is_disconnected=is_disconnected)), 1)
+
+    assert "never" not in "".join(frames)
+    assert state["cancelled"]
+
+
+@pytest.mark.asyncio
+async def test_producer_error_becomes_error_frame():
+    async def events():
+        yield TextDelta("ok")
+        raise RuntimeError("boom")
+
+    frames = payloads(await collect(SSEWriter().stream(events())))
+
+    assert frames == [{"type": "text", "content": "ok"}, {"type": "error", "content": "Error: boom"}]
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+from backend import database
+from backend.configs.config import PersistenceConfig
+from backend.turn_writer import TurnRecord, TurnWriter
+
+
+def make_turn(session_id: str, index: int) -> TurnRecord:
+    now = datetime.utcnow()
+    return TurnRecord(
+        session_id=session_id,
+        messages=[
+            {"id": f"{session_id}-u{index}", "role": "user", "content": "q", "created_at": now},
+            {"id": f"{session_id}-a{index}", "role": "assistant", "content": "a", "created_at": now},
+        ]
+    )
+
+
+def test_batches_turns_and_drains_on_stop(monkeypatch):
+    batches = []
+
+    async def save_turns(records):
+        batches.append([record["session_id"] for record in records])
+
+    monkeypatch.setattr(database, "save_turns", save_turns)
+
+    async def run():
+        writer = TurnWriter(PersistenceConfig(batch_size=3, flush_interval=10))
+        writer.start()
+        for index in range(7):
+            writer.submit(make_turn(f"s{index}", index))
+        await writer.stop()
+        return writer.metrics()
+
+    metrics = asyncio.run(run())
+    # Two full batches by size, the remainder flushed by the drain
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert metrics["flushed_turns"] == 7 and metrics["flushes"] == 3
+    assert metrics["queue_depth"] == 0 and metrics["max_queue_depth"] == 7
+
+
+def test_flushes_after_interval(monkeypatch):
+    async def run():
+        done = asyncio.Event()
+
+        async def save_turns(records):
+            done.set()
+
+        monkeypatch.setattr(database, "save_turns", save_turns)
+        writer = TurnWriter(PersistenceConfig(batch_size=100, flush_interval=0.05))
+        writer.start()
+        writer.submit(make_turn("s", 0))
+        await asyncio.wait_for(done.wait(), timeout=1)
+        await writer.stop()
+
+    asyncio.run(run())
+
+
+def test_retries_then_writes_to_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", tmp_path / "app.db")
+    real_save_turns = database.save_turns
+    failures = [RuntimeError("database is locked")]
+
+    async def flaky_save_turns(records):
+        if failures:
+            raise failures.pop()
+        await real_save_turns(records)
+
+    monkeypatch.setattr(database, "save_turns", flaky_save_turns)
+
+    async def run():
+        await database.init_db()
+        try:
+            writer = TurnWriter(PersistenceConfig(batch_size=10, flush_interval=0.01))
+            writer.start()
+            writer.submit(make_turn("s1", 0))
+            writer.submit(make_turn("s1", 1))
+            await writer.stop()
+            messages, _ = await database.load_messages("s1")
+            return writer.metrics(), messages
+        finally:
+            await database.close_pool()
+
+    metrics, messages = asyncio.run(run())
+    assert metrics["retries"] == 1 and metrics["failed_turns"] == 0
+    assert len(messages) == 4